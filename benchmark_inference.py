@@ -0,0 +1,266 @@
+import json
+import time
+import pickle
+import platform
+import resource
+import subprocess
+import multiprocessing
+import tensorflow as tf
+from skimage.color import gray2rgb
+from menpo_functions import *
+from logging_functions import heat_maps_to_landmarks
+from deep_heatmaps_model_fusion_net import DeepHeatmapsModel
+from pdm_clm_functions import feature_based_pdm_corr, clm_correct
+
+
+'''THIS SCRIPT BENCHMARKS THE INFERENCE PIPELINE (ECpTp) ON SYNTHETIC PORTRAITS:
+    synthetic faces with 68 landmarks are rendered to *outdir*, and landmarks are predicted using a randomly
+    initialized heatmap network and the bundled pdm/clm models. each stage (image loading, estimation, heatmaps to
+    landmarks, part-based correction, part-based tuning) is timed separately for several batch sizes and worker
+    counts. latency percentiles (per image, or per batch for the batched estimation stage), throughput and peak memory
+    are saved to a json file, so runs on different machines and commits can be compared.'''
+
+
+def render_synthetic_portrait(mean_shape, canvas_size=400, face_size=0.5, max_rot=15., random_state=None):
+    """render a synthetic face image (skin ellipse + dark facial features) with landmarks from a mean shape"""
+
+    if random_state is None:
+        random_state = np.random
+
+    # random similarity transform of the mean shape
+    theta = np.deg2rad(random_state.uniform(-max_rot, max_rot))
+    rot = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    lms = mean_shape - mean_shape.mean(axis=0)
+    lms = lms / (lms.max(axis=0) - lms.min(axis=0)).max()
+    lms = face_size * canvas_size * random_state.uniform(0.85, 1.15) * lms.dot(rot.T)
+    lms += canvas_size / 2. + random_state.uniform(-0.1, 0.1, 2) * canvas_size
+
+    yy, xx = np.mgrid[0:canvas_size, 0:canvas_size].astype('float32')
+
+    # smooth random background
+    pixels = np.ones((canvas_size, canvas_size, 3)) * random_state.uniform(0.2, 0.8, 3)
+    pixels += 0.1 * np.sin(xx / random_state.uniform(20, 60))[:, :, None]
+
+    # skin ellipse around the landmarks
+    center = lms.mean(axis=0)
+    radii = 0.6 * (lms.max(axis=0) - lms.min(axis=0))
+    face_mask = ((yy - center[0]) / radii[0]) ** 2 + ((xx - center[1]) / radii[1]) ** 2 <= 1
+    pixels[face_mask] = random_state.uniform(0.5, 0.9) * np.array([1., 0.8, 0.65])
+
+    # dark blobs on facial features
+    feature_sigma = 0.01 * canvas_size
+    for y, x in lms:
+        pixels *= 1 - 0.6 * np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / (2 * feature_sigma ** 2))[:, :, None]
+
+    pixels += random_state.normal(0, 0.02, pixels.shape)
+    img = Image.init_from_channels_at_back(np.clip(pixels, 0., 1.).astype('float32'))
+    img.landmarks['PTS'] = PointCloud(lms)
+    return img
+
+
+def create_synthetic_portraits(clm_model_path, outdir, num_images, random_seed=0):
+    """save synthetic portraits (png + pts), with landmarks based on the clm model reference shape"""
+
+    with open(clm_model_path, 'rb') as f:
+        try:
+            clm_model = pickle.load(f)
+        except UnicodeDecodeError:
+            f.seek(0)
+            clm_model = pickle.load(f, fix_imports=True, encoding="latin1")
+    mean_shape = clm_model.reference_shape.points
+
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    random_state = np.random.RandomState(random_seed)
+    for i in range(num_images):
+        img = render_synthetic_portrait(mean_shape, random_state=random_state)
+        mio.export_image(img, os.path.join(outdir, 'synthetic_%05d.png' % i), overwrite=True)
+        mio.export_landmark_file(img.landmarks['PTS'], os.path.join(outdir, 'synthetic_%05d.pts' % i),
+                                 overwrite=True)
+
+
+def correct_and_tune(task):
+    """run part-based correction + tuning stages on a single image, and time each stage"""
+
+    test_image, test_image_map, init_lms, pdm_models_dir, clm_model_path = task
+
+    t_0 = time.time()
+    p_pdm_lms = feature_based_pdm_corr(lms_init=init_lms, models_dir=pdm_models_dir, train_type='basic')
+    t_1 = time.time()
+    try:  # clm may not converge
+        pdm_clm_lms = clm_correct(
+            clm_model_path=clm_model_path, image=test_image, map=test_image_map, lms_init=p_pdm_lms)
+    except Exception:
+        pdm_clm_lms = p_pdm_lms.copy()
+    t_2 = time.time()
+
+    return pdm_clm_lms, t_1 - t_0, t_2 - t_1
+
+
+def latency_stats(times, percentiles=(50, 90, 95, 99)):
+    """mean + percentiles of stage latency (ms)"""
+
+    times_ms = 1000. * np.array(times)
+    stats = {'mean_ms': float(times_ms.mean()), 'num_samples': len(times_ms)}
+    for p, val in zip(percentiles, np.percentile(times_ms, percentiles)):
+        stats['p%d_ms' % p] = float(val)
+    return stats
+
+
+def peak_rss_mb():
+    """peak resident set size of this process and of its (finished) worker processes, in MB"""
+
+    kb_to_mb = 1. / 1024  # ru_maxrss is reported in KB on linux
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * kb_to_mb,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * kb_to_mb}
+
+
+def load_image_pixels(img):
+    """image pixels with channels at back, as a 3-channel float32 array"""
+
+    pixels = img.pixels_with_channels_at_back()
+    if img.n_channels < 3:
+        pixels = gray2rgb(np.squeeze(pixels))
+    return pixels.astype('float32')
+
+
+def benchmark_run(sess, model, pred_hm_u, img_list, batch_size, num_workers, pdm_models_dir, clm_model_path,
+                  pool=None, num_warmup_batches=1):
+    """time all inference stages over the image list, for a given batch size and pool of num_workers processes
+    (None: run correction + tuning in the main process).
+    loading, heatmaps to landmarks, correction and tuning are timed per image. estimation runs on a whole batch, so
+    it is timed per batch (together with the full pipeline)"""
+
+    image_times = {'load': [], 'heatmaps_to_landmarks': [], 'pdm_correction': [], 'clm_tuning': []}
+    batch_times = {'estimation': [], 'batch_total': []}
+    num_batches = int(np.ceil(1. * len(img_list) / batch_size))
+    num_warmup_batches = min(num_warmup_batches, num_batches - 1)  # time at least one batch
+    num_timed_images = 0
+
+    start_time = None
+    for b in range(num_batches):
+        if b == num_warmup_batches:
+            start_time = time.time()
+
+        t_0 = time.time()
+        batch_menpo_images = [img_list[i] for i in range(b * batch_size, min((b + 1) * batch_size, len(img_list)))]
+        batch_images = []
+        load_times = []
+        for img in batch_menpo_images:
+            t_img = time.time()
+            batch_images.append(load_image_pixels(img))
+            load_times.append(time.time() - t_img)
+        t_1 = time.time()
+        batch_maps = sess.run(pred_hm_u, {model.images: np.array(batch_images)})
+        t_2 = time.time()
+        batch_init_lms = []
+        hm_times = []
+        for i in range(len(batch_menpo_images)):
+            t_img = time.time()
+            batch_init_lms.append(heat_maps_to_landmarks(batch_maps[i]))
+            hm_times.append(time.time() - t_img)
+
+        tasks = [(img, batch_maps[i:i+1], batch_init_lms[i], pdm_models_dir, clm_model_path)
+                 for i, img in enumerate(batch_menpo_images)]
+        if pool is None:
+            outputs = [correct_and_tune(task) for task in tasks]
+        else:
+            outputs = pool.map(correct_and_tune, tasks)
+        t_3 = time.time()
+
+        if b >= num_warmup_batches:
+            num_timed_images += len(batch_menpo_images)
+            image_times['load'] += load_times
+            image_times['heatmaps_to_landmarks'] += hm_times
+            image_times['pdm_correction'] += [out[1] for out in outputs]
+            image_times['clm_tuning'] += [out[2] for out in outputs]
+            batch_times['estimation'].append(t_2 - t_1)
+            batch_times['batch_total'].append(t_3 - t_0)
+    total_time = time.time() - start_time if start_time is not None else 0.
+
+    return {
+        'batch_size': batch_size, 'num_workers': num_workers,
+        'num_images': num_timed_images, 'images_per_sec': num_timed_images / total_time if total_time > 0 else None,
+        'stages_per_image': dict((stage, latency_stats(times)) for stage, times in image_times.items() if times),
+        'stages_per_batch': dict((stage, latency_stats(times)) for stage, times in batch_times.items() if times),
+        'peak_rss_mb': peak_rss_mb()}
+
+
+def benchmark_inference(outdir, pdm_models_dir, clm_model_path, num_images=64, batch_sizes=(1, 4, 16),
+                        worker_counts=(0, 4), random_seed=0, out_json='benchmark_inference.json'):
+    """benchmark the ECpTp pipeline on synthetic portraits with a randomly initialized heatmap network"""
+
+    test_data = 'synthetic'
+    create_synthetic_portraits(clm_model_path, os.path.join(outdir, test_data), num_images, random_seed)
+
+    # worker processes are forked before tensorflow starts any session threads
+    pools = dict((num_workers, multiprocessing.Pool(processes=num_workers))
+                 for num_workers in set(worker_counts) if num_workers > 0)
+
+    tf.set_random_seed(random_seed)
+    model = DeepHeatmapsModel(mode='TEST', img_path=outdir, test_data=test_data, menpo_verbose=False)
+    model.add_placeholders()
+    _, _, pred_hm_u = model.heatmaps_network(model.images)
+
+    results = {
+        'machine': {'node': platform.node(), 'processor': platform.processor(),
+                    'cpu_count': multiprocessing.cpu_count(), 'python': platform.python_version(),
+                    'tensorflow': tf.__version__},
+        'commit': git_commit(), 'num_images': num_images, 'clm_model_path': clm_model_path, 'runs': []}
+
+    try:
+        with tf.Session(config=model.config) as sess:
+            tf.global_variables_initializer().run()  # random network weights
+            img_list = model.img_menpo_list
+            for num_workers in worker_counts:
+                for batch_size in batch_sizes:
+                    run = benchmark_run(sess, model, pred_hm_u, img_list, batch_size, num_workers, pdm_models_dir,
+                                        clm_model_path, pool=pools.get(num_workers))
+                    print ('batch size: [%d] workers: [%d] images/sec: [%.3f] full pipeline p50: [%.1f ms/batch]' % (
+                        batch_size, num_workers, run['images_per_sec'] or 0.,
+                        run['stages_per_batch']['batch_total']['p50_ms']))
+                    results['runs'].append(run)
+    finally:
+        for pool in pools.values():
+            pool.close()
+            pool.join()
+    results['peak_rss_mb'] = peak_rss_mb()  # includes the finished worker processes
+
+    with open(out_json, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    return results
+
+
+def git_commit():
+    """current git commit of the repository (None if unavailable)"""
+
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+
+    # data parameters
+    outdir = 'benchmark_data'  # directory for saving synthetic portraits
+    num_images = 64  # number of synthetic portraits
+    random_seed = 0  # random seed for synthetic portraits and network weights
+
+    # model paths
+    pdm_path = 'pdm_clm_models/pdm_models/'  # models for correction stage
+    clm_path = 'pdm_clm_models/clm_models/g_t_all'  # model for tuning stage
+
+    # benchmark parameters
+    batch_sizes = (1, 4, 16)  # estimation stage batch sizes
+    worker_counts = (0, 2, 4)  # number of worker processes for correction + tuning stages (0: main process)
+    out_json = 'benchmark_inference.json'  # benchmark results file
+
+    benchmark_inference(
+        outdir=outdir, pdm_models_dir=pdm_path, clm_model_path=clm_path, num_images=num_images,
+        batch_sizes=batch_sizes, worker_counts=worker_counts, random_seed=random_seed, out_json=out_json)
+
+    print ('\nsaved benchmark results to: ' + out_json)
@@ -0,0 +1,123 @@
+import multiprocessing
+from skimage.color import gray2rgb
+from menpo_functions import *
+
+
+'''THIS SCRIPT CREATES PRE-AUGMENTED DATA TO SAVE TRAINING TIME (ARTISTIC + BASIC AUGMENTATION):
+    under the folder *outdir*, it will create a separate folder for each epoch, containing packed shards of the
+    augmented images and matching landmarks. epochs and shards are generated in parallel, each shard with its own
+    random seed, so an interrupted run can be resumed (completed shards are skipped).
+    to train with the generated data, run train_heatmaps_network.py with --use_epoch_data=True and
+    --epoch_data_dir=*outdir*'''
+
+
+def augment_epoch_shard(task):
+    """augment one shard of an epoch (texture -> geometric -> basic augmentation) and save it to disk"""
+
+    (epoch, shard_ind, img_paths, epoch_dir, img_dir_ns, image_size, augment_basic, augment_texture, p_texture,
+     augment_geom, p_geom, random_seed) = task
+
+    np.random.seed([random_seed, epoch, shard_ind])  # seed depends only on (seed, epoch, shard)
+
+    images = np.zeros([len(img_paths), image_size, image_size, 3]).astype('uint8')
+    landmarks = np.zeros([len(img_paths), 68, 2]).astype('float32')
+    names = []
+
+    for ind, img_path in enumerate(img_paths):
+        img = mio.import_image(img_path)
+        if augment_texture and p_texture > 0:
+            img = augment_menpo_img_ns(img, img_dir_ns, p_ns=1. * (np.random.rand() < p_texture))
+        if augment_geom and p_geom > 0:
+            img = augment_menpo_img_geom(img, p_geom=1. * (np.random.rand() < p_geom))
+        if augment_basic:
+            img = augment_face_image(img, image_size=image_size)
+
+        img_pixels = img.pixels_with_channels_at_back()
+        if img.n_channels < 3:
+            img_pixels = gray2rgb(np.squeeze(img_pixels))
+        images[ind] = np.round(255 * np.clip(img_pixels, 0., 1.)).astype('uint8')
+        landmarks[ind] = img.landmarks[img.landmarks.group_labels[0]].points
+        names.append(img.path.stem)
+
+    save_epoch_shard(epoch_dir, shard_ind, images, landmarks, names)
+    return epoch, shard_ind
+
+
+def create_epoch_data(img_dir, train_crop_dir, img_dir_ns, outdir, num_epochs, min_epoch_to_save=0,
+                      shard_size=256, num_workers=None, image_size=256, augment_basic=True, augment_texture=False,
+                      p_texture=0., augment_geom=False, p_geom=0., random_seed=1234, debug=False,
+                      debug_data_size=15):
+    """generate pre-augmented data shards for epochs [min_epoch_to_save, num_epochs) using a process pool"""
+
+    img_paths = sorted([str(p) for p in mio.image_paths(os.path.join(img_dir, train_crop_dir, '*'))])
+    if debug:
+        img_paths = img_paths[:debug_data_size]
+    num_shards = int(np.ceil(1. * len(img_paths) / shard_size))
+
+    # collect shards that were not completed yet (resume partially generated epochs)
+    tasks = []
+    for epoch in range(min_epoch_to_save, num_epochs):
+        epoch_dir = os.path.join(outdir, str(epoch))
+        if not os.path.exists(epoch_dir):
+            os.mkdir(epoch_dir)
+        for tmp_path in glob(os.path.join(epoch_dir, '*_tmp.npy')):
+            os.remove(tmp_path)
+        for shard_ind in range(num_shards):
+            if not os.path.exists(epoch_shard_paths(epoch_dir, shard_ind)[-1]):
+                tasks.append((epoch, shard_ind, img_paths[shard_ind * shard_size:(shard_ind + 1) * shard_size],
+                              epoch_dir, img_dir_ns, image_size, augment_basic, augment_texture, p_texture,
+                              augment_geom, p_geom, random_seed))
+
+    print ('%d images, %d epochs, %d shards per epoch: %d shards left to generate' % (
+        len(img_paths), num_epochs - min_epoch_to_save, num_shards, len(tasks)))
+
+    pool = multiprocessing.Pool(processes=num_workers)
+    try:
+        for i, (epoch, shard_ind) in enumerate(pool.imap_unordered(augment_epoch_shard, tasks)):
+            print ('saved shard %d of epoch %d (%d/%d)' % (shard_ind, epoch, i + 1, len(tasks)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+
+    # parameter for calculating number of epochs
+    num_train_images = 3148  # number of training images
+    train_iter = 100000  # number of training iterations
+    batch_size = 6  # batch size in training
+    num_epochs = int(np.ceil((1. * train_iter) / (1. * num_train_images / batch_size))) + 1
+
+    # augmentation parameters
+    augment_basic = True  # use basic augmentation?
+    augment_texture = True  # use artistic texture augmentation?
+    p_texture = 0.5  # probability of artistic texture augmentation
+    augment_geom = True  # use artistic geometric augmentation?
+    p_geom = 0.5  # probability of artistic geometric augmentation
+
+    # data-sets image paths
+    img_dir = '~/landmark_detection_datasets/'
+    train_crop_dir = 'crop_gt_margin_0.25'  # directory of train images cropped to bb (+margin)
+    img_dir_ns = os.path.join(img_dir, train_crop_dir + '_ns')  # dir of train imgs cropped to bb + style transfer
+    outdir = 'epoch_data'  # directory for saving augmented data
+
+    # other parameters
+    image_size = 256  # image size
+    min_epoch_to_save = 0  # start saving images from this epoch (first epoch is 0)
+    shard_size = 256  # number of images in each shard
+    num_workers = None  # number of worker processes (None: use all cpus)
+    random_seed = 1234  # random seed for numpy
+    debug_data_size = 15
+    debug = False
+
+    if not os.path.exists(outdir):
+        os.mkdir(outdir)
+
+    create_epoch_data(
+        img_dir=img_dir, train_crop_dir=train_crop_dir, img_dir_ns=img_dir_ns, outdir=outdir,
+        num_epochs=num_epochs, min_epoch_to_save=min_epoch_to_save, shard_size=shard_size,
+        num_workers=num_workers, image_size=image_size, augment_basic=augment_basic,
+        augment_texture=augment_texture, p_texture=p_texture, augment_geom=augment_geom, p_geom=p_geom,
+        random_seed=random_seed, debug=debug, debug_data_size=debug_data_size)
+
+    print ('DONE!')
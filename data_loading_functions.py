@@ -3,29 +3,25 @@ import os
 from skimage.color import gray2rgb
 
 
-def train_val_shuffle_inds_per_epoch(valid_inds, train_inds, train_iter, batch_size, log_path, save_log=True):
-    """shuffle image indices for each training epoch and save to log"""
-    
-    np.random.seed(0)
-    num_train_images = len(train_inds)
-    num_epochs = int(np.ceil((1. * train_iter) / (1. * num_train_images / batch_size)))+1
-    epoch_inds_shuffle = np.zeros((num_epochs, num_train_images)).astype(int)
-    img_inds = np.arange(num_train_images)
-    for i in range(num_epochs):
-        np.random.shuffle(img_inds)
-        epoch_inds_shuffle[i, :] = img_inds
-
-    if save_log:
-        with open(os.path.join(log_path, "train_val_shuffle_inds.csv"), "wb") as f:
-            if valid_inds is not None:
-                f.write(b'valid inds\n')
-                np.savetxt(f, valid_inds.reshape(1, -1), fmt='%i', delimiter=",")
-            f.write(b'train inds\n')
-            np.savetxt(f, train_inds.reshape(1, -1), fmt='%i', delimiter=",")
-            f.write(b'shuffle inds\n')
-            np.savetxt(f, epoch_inds_shuffle, fmt='%i', delimiter=",")
-
-    return epoch_inds_shuffle
+def train_val_shuffle_seed_log(valid_names, train_names, shuffle_seed, log_path):
+    """save names of train/valid images (in image list order) and the random seed of epoch shuffling and
+    augmentation to log. the image order of each epoch is epoch_shuffle_inds(len(train_names), epoch, seed)"""
+
+    with open(os.path.join(log_path, "train_val_shuffle_inds.csv"), "wb") as f:
+        if valid_names is not None:
+            f.write(b'valid images\n')
+            np.savetxt(f, np.asarray(valid_names).reshape(1, -1), fmt='%s', delimiter=",")
+        f.write(b'train images\n')
+        np.savetxt(f, np.asarray(train_names).reshape(1, -1), fmt='%s', delimiter=",")
+        f.write(b'shuffle seed\n')
+        np.savetxt(f, np.array([[shuffle_seed]]), fmt='%i', delimiter=",")
+
+
+def epoch_shuffle_inds(num_train_images, epoch, shuffle_seed=0):
+    """shuffled image indices of a training epoch - derived from (shuffle_seed, epoch) only, so each epoch order
+    can be reproduced on demand (e.g. when resuming training)"""
+
+    return np.random.RandomState([shuffle_seed, epoch]).permutation(num_train_images)
 
 
 def gaussian(x, y, x0, y0, sigma=6):
@@ -113,11 +109,45 @@ def create_approx_heat_maps_alloc_once(landmarks, maps, gauss_filt=None, win_mul
             gauss_filt[min_row_gap:filt_size - 1 * max_row_gap, min_col_gap:filt_size - 1 * max_col_gap]
 
 
+def create_approx_heat_maps_batch(landmarks, maps, gauss_filt, win_size, image_size=256):
+    """ create heatmaps from input landmarks of multiple images (N, num_landmarks, 2) - all gaussian windows are
+    stamped in a single scatter operation"""
+    maps.fill(0.)
+
+    landmarks = np.minimum(landmarks, image_size - 1).astype(int)
+    win_offsets = np.arange(-win_size, win_size + 1)
+
+    rows = landmarks[:, :, 0, None] + win_offsets  # (N, num_landmarks, filt_size)
+    cols = landmarks[:, :, 1, None] + win_offsets
+    valid = np.logical_and(
+        np.logical_and(rows >= 0, rows < image_size)[:, :, :, None],
+        np.logical_and(cols >= 0, cols < image_size)[:, :, None, :])
+
+    img_inds, lms_inds, filt_rows, filt_cols = np.nonzero(valid)
+    maps[img_inds, rows[img_inds, lms_inds, filt_rows], cols[img_inds, lms_inds, filt_cols], lms_inds] =\
+        gauss_filt[filt_rows, filt_cols]
+
+
+def create_approx_heat_maps_large_small_batch(landmarks, maps, maps_small, gauss_filt_large, gauss_filt_small,
+                                              win_mult=3.5, image_size=256, sigma=6):
+    """ create heatmaps of full size + 1/4 size from input landmarks of multiple images. small-map landmarks are
+    computed with the same scale factor as menpo's image resize, without resampling the images"""
+
+    image_size_small = int(image_size / 4)
+    landmarks_small = landmarks * (image_size_small - 1.) / (image_size - 1.)
+
+    create_approx_heat_maps_batch(landmarks, maps, gauss_filt_large, int(win_mult * sigma), image_size=image_size)
+    create_approx_heat_maps_batch(landmarks_small, maps_small, gauss_filt_small, int(win_mult * (1. * sigma / 4)),
+                                  image_size=image_size_small)
+
+
 def load_images_landmarks_approx_maps_alloc_once(
         img_list, batch_inds, images, maps_small, maps, landmarks, image_size=256, num_landmarks=68,
-        scale=255, gauss_filt_large=None, gauss_filt_small=None, win_mult=3.5, sigma=6, save_landmarks=False):
+        scale=255, gauss_filt_large=None, gauss_filt_small=None, win_mult=3.5, sigma=6, save_landmarks=False,
+        timer=None):
 
-    """ load images and gt landmarks from menpo image list, and create matching heatmaps """
+    """ load images and gt landmarks from menpo image list, and create matching heatmaps. if a TrainStepTimer
+    is given, image decoding and heatmap rendering times are recorded as separate phases """
 
     batch_menpo_images = img_list[batch_inds]
     c_dim = images.shape[-1]
@@ -134,26 +164,30 @@ def load_images_landmarks_approx_maps_alloc_once(
         x_large, y_large = np.mgrid[0:2 * win_size_large + 1, 0:2 * win_size_large + 1]
         gauss_filt_large = (8. / 3) * sigma * gaussian(x_large, y_large, win_size_large, win_size_large, sigma=sigma)  # same as in ECT
 
+    num_images = len(batch_menpo_images)
+    batch_lms = np.zeros([num_images, num_landmarks, 2])
+
     for ind, img in enumerate(batch_menpo_images):
         if img.n_channels < 3 and c_dim == 3:
             images[ind, :, :, :] = gray2rgb(img.pixels_with_channels_at_back())
         else:
             images[ind, :, :, :] = img.pixels_with_channels_at_back()
 
-        lms = img.landmarks[grp_name].points
-        lms = np.minimum(lms, image_size - 1)
-        create_approx_heat_maps_alloc_once(
-            landmarks=lms, maps=maps[ind, :, :, :], gauss_filt=gauss_filt_large, win_mult=win_mult,
-            num_landmarks=num_landmarks, image_size=image_size, sigma=sigma)
+        batch_lms[ind, :, :] = img.landmarks[grp_name].points
+
+    if timer is not None:
+        timer.split('decode')
+
+    create_approx_heat_maps_large_small_batch(
+        landmarks=batch_lms, maps=maps[:num_images], maps_small=maps_small[:num_images],
+        gauss_filt_large=gauss_filt_large, gauss_filt_small=gauss_filt_small, win_mult=win_mult,
+        image_size=image_size, sigma=sigma)
 
-        lms_small = img.resize([image_size / 4, image_size / 4]).landmarks[grp_name].points
-        lms_small = np.minimum(lms_small, image_size / 4 - 1)
-        create_approx_heat_maps_alloc_once(
-            landmarks=lms_small, maps=maps_small[ind, :, :, :], gauss_filt=gauss_filt_small, win_mult=win_mult,
-            num_landmarks=num_landmarks, image_size=image_size / 4, sigma=1. * sigma / 4)
+    if timer is not None:
+        timer.split('heatmaps')
 
-        if save_landmarks:
-            landmarks[ind, :, :] = lms
+    if save_landmarks:
+        landmarks[:num_images, :, :] = np.minimum(batch_lms, image_size - 1)
 
     if scale is 255:
         images *= 255
@@ -1,5 +1,3 @@
-import scipy.io
-import scipy.misc
 from glob import glob
 import os
 import numpy as np
@@ -26,7 +24,8 @@ class DeepHeatmapsModel(object):
                  img_path='data', test_data='full', valid_data='full', valid_size=0, log_valid_every=5,
                  train_crop_dir='crop_gt_margin_0.25', img_dir_ns='crop_gt_margin_0.25_ns',
                  print_every=100, save_every=5000, sample_every=5000, sample_grid=9, sample_to_log=True,
-                 debug_data_size=20, debug=False, epoch_data_dir='epoch_data', use_epoch_data=False, menpo_verbose=True):
+                 debug_data_size=20, debug=False, epoch_data_dir='epoch_data', use_epoch_data=False, menpo_verbose=True,
+                 trace_every=0, load_data=True):
 
         # define some extra parameters
 
@@ -41,6 +40,8 @@ class DeepHeatmapsModel(object):
 
         self.compute_nme = True  # compute normalized mean error
 
+        self.shuffle_seed = 0  # random seed for shuffling image indices of each epoch and for augmentation
+
         self.config = tf.ConfigProto()
         self.config.gpu_options.allow_growth = True
 
@@ -51,6 +52,9 @@ class DeepHeatmapsModel(object):
         self.sample_grid = sample_grid  # number of training images in sample
         self.sample_to_log = sample_to_log  # sample images to log instead of disk
         self.log_valid_every = log_valid_every  # log validation loss (in epochs)
+        self.log_timing = True  # log rolling time statistics of training loop phases (every print_every steps)
+        self.timing_window = 100  # number of recent steps used for time statistics
+        self.trace_every = trace_every  # save chrome trace of a training step every X steps (0: never)
 
         self.debug = debug
         self.debug_data_size = debug_data_size
@@ -108,6 +112,12 @@ class DeepHeatmapsModel(object):
 
         # load image, bb and landmark data using menpo
         self.bb_dir = os.path.join(img_path, 'Bounding_Boxes')
+        if mode == 'TEST' and not load_data:
+            # build graph only (test images are fed from pre-loaded arrays, e.g. by evaluate_models.py)
+            self.bb_dictionary = None
+            self.img_menpo_list = None
+            return
+
         self.bb_dictionary = load_bb_dictionary(self.bb_dir, mode, test_data=self.test_data)
 
         # use pre-augmented data, to save time during training
@@ -135,6 +145,10 @@ class DeepHeatmapsModel(object):
                     self.train_inds = self.train_inds[:self.debug_data_size]
                     self.img_menpo_list = self.img_menpo_list[self.train_inds]
 
+                train_names = load_menpo_image_names(
+                    img_path, os.path.join(self.epoch_data_dir, '0') if self.use_epoch_data else train_crop_dir,
+                    mode)[self.train_inds]
+
                 if valid_size > 0:
 
                     self.valid_bb_dictionary = load_bb_dictionary(self.bb_dir, 'TEST', test_data=self.valid_data)
@@ -149,6 +163,8 @@ class DeepHeatmapsModel(object):
                     self.val_inds = self.val_inds[:self.valid_size]
 
                     self.valid_img_menpo_list = self.valid_img_menpo_list[self.val_inds]
+                    valid_names = load_menpo_image_names(
+                        img_path, None, 'TEST', test_data=self.valid_data)[self.val_inds]
 
                     self.valid_images_loaded =\
                         np.zeros([self.valid_size, self.image_size, self.image_size, self.c_dim]).astype('float32')
@@ -173,9 +189,9 @@ class DeepHeatmapsModel(object):
                         self.valid_gt_maps_small_loaded = self.valid_gt_maps_small_loaded[:self.sample_grid]
                 else:
                     self.val_inds = None
+                    valid_names = None
 
-                self.epoch_inds_shuffle = train_val_shuffle_inds_per_epoch(
-                    self.val_inds, self.train_inds, train_iter, batch_size, save_log_path)
+                train_val_shuffle_seed_log(valid_names, train_names, self.shuffle_seed, save_log_path)
 
     def add_placeholders(self):
 
@@ -427,9 +443,9 @@ class DeepHeatmapsModel(object):
         l_total = tf.summary.scalar('l_total', self.total_loss)
         self.batch_summary_op = tf.summary.merge([l2_primary,l2_fusion,l2_upsample,l_total])
 
+        # nme summary is fed from landmarks predicted by the training step, so it is kept in a separate op
         if self.compute_nme:
-            nme = tf.summary.scalar('nme', self.nme_loss)
-            self.batch_summary_op = tf.summary.merge([self.batch_summary_op, nme])
+            self.nme_summary_op = tf.summary.scalar('nme', self.nme_loss)
 
         if self.log_histograms:
             var_summary = [tf.summary.histogram(var.name,var) for var in tf.trainable_variables()]
@@ -473,7 +489,7 @@ class DeepHeatmapsModel(object):
     def train(self):
         # set random seed
         tf.set_random_seed(1234)
-        np.random.seed(1234)
+        np.random.seed(self.shuffle_seed)  # augmentation is seeded like the epoch shuffling (see log)
         # build a graph
         # add placeholders
         self.add_placeholders()
@@ -532,7 +548,7 @@ class DeepHeatmapsModel(object):
             num_train_images = len(self.img_menpo_list)
             batches_in_epoch = int(float(num_train_images) / float(self.batch_size))
             epoch = int(resume_step / batches_in_epoch)
-            img_inds = self.epoch_inds_shuffle[epoch, :]
+            img_inds = epoch_shuffle_inds(num_train_images, epoch, self.shuffle_seed)
             log_valid = True
             log_valid_images = True
 
@@ -551,15 +567,18 @@ class DeepHeatmapsModel(object):
             gaussian_filt_large = create_gaussian_filter(sigma=self.sigma, win_mult=self.win_mult)
             gaussian_filt_small = create_gaussian_filter(sigma=1.*self.sigma/4, win_mult=self.win_mult)
 
+            timer = TrainStepTimer(window=self.timing_window)
+
             # training loop
             for step in range(resume_step, self.train_iter):
 
+                timer.start()
                 j = step % batches_in_epoch  # j==0 if we finished an epoch
 
                 # if we finished an epoch and this isn't the first step
                 if step > resume_step and j == 0:
                     epoch += 1
-                    img_inds = self.epoch_inds_shuffle[epoch, :]  # get next shuffled image inds
+                    img_inds = epoch_shuffle_inds(num_train_images, epoch, self.shuffle_seed)  # next epoch inds
                     log_valid = True
                     log_valid_images = True
                     if self.use_epoch_data:  # if using pre-augmented data, load epoch directory
@@ -571,6 +590,7 @@ class DeepHeatmapsModel(object):
 
                 # get batch indices
                 batch_inds = img_inds[j * self.batch_size:(j + 1) * self.batch_size]
+                timer.split('batch_inds')
 
                 # load batch images, gt maps and landmarks
                 load_images_landmarks_approx_maps_alloc_once(
@@ -578,47 +598,59 @@ class DeepHeatmapsModel(object):
                     maps=batch_maps, landmarks=batch_lms, image_size=self.image_size,
                     num_landmarks=self.num_landmarks, scale=self.scale, gauss_filt_large=gaussian_filt_large,
                     gauss_filt_small=gaussian_filt_small, win_mult=self.win_mult, sigma=self.sigma,
-                    save_landmarks=self.compute_nme)
+                    save_landmarks=self.compute_nme, timer=timer)
 
                 feed_dict_train = {self.images: batch_images, self.heatmaps: batch_maps,
                                    self.heatmaps_small: batch_maps_small}
 
+                log_step = step == resume_step or (step + 1) % self.print_every == 0
+                sample_step = step == resume_step or (step + 1) % self.sample_every == 0
+                trace_step = self.trace_every > 0 and (step + 1) % self.trace_every == 0
+                if trace_step:
+                    run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+                    run_metadata = tf.RunMetadata()
+                else:
+                    run_options, run_metadata = None, None
+                timer.split('feed')
+
                 # train on batch
-                sess.run(train_op, feed_dict_train)
+                if log_step or sample_step:
+                    # fetch losses and predicted maps from the same forward pass used for training
+                    _, summary, l_p, l_f, l_t, batch_maps_small_pred, batch_maps_pred = sess.run(
+                        [train_op, self.batch_summary_op, self.l2_primary, self.l2_fusion, self.total_loss,
+                         self.pred_hm_p, self.pred_hm_u], feed_dict_train, options=run_options,
+                        run_metadata=run_metadata)
+                else:
+                    sess.run(train_op, feed_dict_train, options=run_options, run_metadata=run_metadata)
+                timer.split('train_op')
 
-                # save to log and print status
-                if step == resume_step or (step + 1) % self.print_every == 0:
+                if trace_step:
+                    save_chrome_trace(run_metadata, step + 1, self.save_log_path)
+                    summary_writer.add_run_metadata(run_metadata, 'step_%d' % (step + 1), step)
+                    timer.split('trace')
 
-                    # train data log
+                if log_step or sample_step:
                     if self.compute_nme:
-                        batch_maps_pred = sess.run(self.pred_hm_u, {self.images: batch_images})
-
                         batch_heat_maps_to_landmarks_alloc_once(
-                            batch_maps=batch_maps_pred,batch_landmarks=batch_lms_pred,
+                            batch_maps=batch_maps_pred, batch_landmarks=batch_lms_pred,
                             batch_size=self.batch_size, image_size=self.image_size,
                             num_landmarks=self.num_landmarks)
 
-                        train_feed_dict_log = {
-                            self.images: batch_images, self.heatmaps: batch_maps,
-                            self.heatmaps_small: batch_maps_small, self.train_lms: batch_lms,
-                            self.train_pred_lms: batch_lms_pred}
+                # save to log and print status
+                if log_step:
 
-                        summary, l_p, l_f, l_t, nme = sess.run(
-                            [self.batch_summary_op, self.l2_primary, self.l2_fusion, self.total_loss,
-                             self.nme_loss],
-                            train_feed_dict_log)
+                    # train data log
+                    if self.compute_nme:
+                        nme_summary, nme = sess.run(
+                            [self.nme_summary_op, self.nme_loss],
+                            {self.train_lms: batch_lms, self.train_pred_lms: batch_lms_pred})
+                        summary_writer.add_summary(nme_summary, step)
 
                         print (
                             'epoch: [%d] step: [%d/%d] primary loss: [%.6f] fusion loss: [%.6f]'
                             ' total loss: [%.6f] NME: [%.6f]' % (
                                 epoch, step + 1, self.train_iter, l_p, l_f, l_t, nme))
                     else:
-                        train_feed_dict_log = {self.images: batch_images, self.heatmaps: batch_maps,
-                                               self.heatmaps_small: batch_maps_small}
-
-                        summary, l_p, l_f, l_t = sess.run(
-                            [self.batch_summary_op, self.l2_primary, self.l2_fusion, self.total_loss],
-                            train_feed_dict_log)
                         print (
                             'epoch: [%d] step: [%d/%d] primary loss: [%.6f] fusion loss: [%.6f] total loss: [%.6f]'
                             % (epoch, step + 1, self.train_iter, l_p, l_f, l_t))
@@ -642,21 +674,20 @@ class DeepHeatmapsModel(object):
                             'epoch: [%d] step: [%d/%d] valid NME: [%.6f]' % (
                                 epoch, step + 1, self.train_iter, v_nme))
 
+                timer.split('logging')
+
                 # save model
                 if (step + 1) % self.save_every == 0:
                     saver.save(sess, os.path.join(self.save_model_path, 'deep_heatmaps'), global_step=step + 1)
                     print ('model/deep-heatmaps-%d saved' % (step + 1))
+                timer.split('checkpoint')
 
                 # save images
-                if step == resume_step or (step + 1) % self.sample_every == 0:
-
-                    batch_maps_small_pred = sess.run(self.pred_hm_p, {self.images: batch_images})
-                    if not self.compute_nme:
-                        batch_maps_pred = sess.run(self.pred_hm_u,  {self.images: batch_images})
-                        batch_lms_pred = None
+                if sample_step:
 
                     merged_img = merge_images_landmarks_maps_gt(
-                        batch_images.copy(), batch_maps_pred, batch_maps, landmarks=batch_lms_pred,
+                        batch_images.copy(), batch_maps_pred, batch_maps,
+                        landmarks=batch_lms_pred if self.compute_nme else None,
                         image_size=self.image_size, num_landmarks=self.num_landmarks, num_samples=self.sample_grid,
                         scale=self.scale, circle_size=2, fast=self.fast_img_gen)
 
@@ -733,6 +764,7 @@ class DeepHeatmapsModel(object):
 
                             summary_writer.add_summary(summary_img, step)
                     else:  # save heatmap images to directory
+                        import scipy.misc
                         sample_path_imgs = os.path.join(
                             self.save_sample_path, 'epoch-%d-train-iter-%d-1.png' % (epoch, step + 1))
                         sample_path_imgs_small = os.path.join(
@@ -748,6 +780,15 @@ class DeepHeatmapsModel(object):
                             scipy.misc.imsave(sample_path_ch_maps, map_per_channel)
                             scipy.misc.imsave(sample_path_ch_maps_small, map_per_channel_small)
 
+                timer.split('logging')
+                timer.end_step()
+
+                # save time statistics of training loop phases to log
+                if self.log_timing and log_step:
+                    summary_writer.add_summary(tf.Summary(value=[
+                        tf.Summary.Value(tag=tag, simple_value=value)
+                        for tag, value in timer.summary_values(self.batch_size)]), step)
+
             print('*** Finished Training ***')
 
     def get_image_maps(self, test_image, reuse=None, norm=False):
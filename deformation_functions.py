@@ -340,7 +340,7 @@ def deform_scale_face(lms, p_scale=0, pad=5, image_size=256):
 
         # check for spatial errors
         error2 = np.sum(lms_def_scale >= image_size) + np.sum(lms_def_scale < 0)
-        error1 = len(np.unique((lms_def_scale).astype('int'), axis=0)) != len(lms_def_scale)
+        error1 = check_duplicate_points(lms_def_scale)
         error = error1 + error2
         if error:
             lms_def_scale = lms.copy()
@@ -384,3 +384,360 @@ def check_deformation_spatial_errors(def_landmarks, part_inds,pad=0):
     inter_inds = part_intersection(part_to_check,points_to_compare, pad=pad)
     out = len(inter_inds) > 0
     return out
+
+
+def check_duplicate_points(def_landmarks):
+    """ check for deformed landmarks that fall on the same pixel"""
+
+    return len(np.unique(def_landmarks.astype('int'), axis=0)) != len(def_landmarks)
+
+
+# batch versions of the geometric deformations: landmarks of shape (N, 68, 2), with per-sample random parameters.
+# each batch deformation returns the deformed landmarks and a (N,) mask of samples whose sampled deformation was
+# rejected (spatial error), and fell back to the input landmarks.
+
+
+def uniform_batch(low, high):
+    """ sample uniform values per sample - non finite upper bounds fall back to the lower bound """
+    low, high = np.broadcast_arrays(low, high)
+    high = np.where(np.isfinite(high), high, low)
+    return low + (high - low) * np.random.random_sample(low.shape)
+
+
+def get_part_mean_bounds_batch(lms, part_inds):
+    """ find part mean and bounds (relative to part mean) - output shapes: (N, 2) [y, x] """
+    lms_part = lms[:, part_inds, :]
+    part_mean = np.mean(lms_part, 1)
+    lms_part_norm = lms_part - part_mean[:, None, :]
+    return part_mean, np.min(lms_part_norm, 1), np.max(lms_part_norm, 1)
+
+
+def deform_part_batch(landmarks, part_inds, scale_y=1., scale_x=1., shift_ver=0., shift_horiz=0.):
+    """ deform facial part landmarks of multiple faces - matching ibug annotations of 68 landmarks """
+
+    num_faces = landmarks.shape[0]
+    scale = np.stack([np.broadcast_to(scale_y, (num_faces,)), np.broadcast_to(scale_x, (num_faces,))], 1)
+    shift = np.stack([np.broadcast_to(shift_ver, (num_faces,)), np.broadcast_to(shift_horiz, (num_faces,))], 1)
+
+    landmarks_part = landmarks[:, part_inds, :]
+    part_mean = np.mean(landmarks_part, 1)[:, None, :]
+
+    deform_shape = landmarks.copy()
+    deform_shape[:, part_inds, :] = (landmarks_part - part_mean) * scale[:, None, :] + part_mean + shift[:, None, :]
+    return deform_shape
+
+
+def check_deformation_spatial_errors_batch(def_landmarks, part_inds, pad=0):
+    """ check for spatial errors in deformed landmarks of multiple faces - returns (N,) error mask"""
+
+    part_to_check = def_landmarks[:, part_inds, :]
+    points_to_compare = np.round(np.delete(def_landmarks, part_inds, axis=1))
+    check_min = np.round(np.min(part_to_check, 1)) + pad
+    check_max = np.round(np.max(part_to_check, 1)) - pad
+    inside = np.logical_and(points_to_compare > check_min[:, None, :], points_to_compare < check_max[:, None, :])
+    return np.any(np.all(inside, axis=2), axis=1)
+
+
+def check_duplicate_points_batch(def_landmarks):
+    """ check for landmarks of the same face that fall on the same pixel - returns (N,) error mask"""
+
+    lms_int = def_landmarks.astype('int64')
+    lms_keys = np.sort(lms_int[:, :, 0] * (2 ** 32) + lms_int[:, :, 1], axis=1)
+    return np.any(np.diff(lms_keys, axis=1) == 0, axis=1)
+
+
+def accept_deformation_batch(lms_def, lms, deform_mask, error):
+    """ keep deformed landmarks where deformation was applied without spatial errors """
+    accept = np.logical_and(deform_mask, np.logical_not(error))
+    return np.where(accept[:, None, None], lms_def, lms), np.logical_and(deform_mask, error)
+
+
+def deform_mouth_batch(lms, p_scale=0, p_shift=0, pad=5):
+    """ deform mouth landmarks of multiple faces - matching ibug annotations of 68 landmarks """
+
+    jaw_line_inds = np.arange(0, 17)
+    nose_inds = np.arange(27, 36)
+    mouth_inds = np.arange(48, 68)
+
+    part_inds = mouth_inds.copy()
+    num_faces = lms.shape[0]
+
+    # find part spatial limitations
+    jaw_pad = 4
+    jaw_inner_inds = jaw_line_inds[jaw_pad:-jaw_pad]
+    part_x_max = np.max(lms[:, part_inds, 1], 1)
+    part_x_min = np.min(lms[:, part_inds, 1], 1)
+    jaw_x_min = np.min(lms[:, jaw_inner_inds, 1], 1)
+    x_max = part_x_max + (np.max(lms[:, jaw_inner_inds, 1], 1) - part_x_max) * 0.5 - pad
+    x_min = jaw_x_min + (part_x_min - jaw_x_min) * 0.5 + pad
+    nose_y_max = np.max(lms[:, nose_inds, 0], 1)
+    y_min = nose_y_max + (np.min(lms[:, part_inds, 0], 1) - nose_y_max) * 0.5
+    max_jaw = np.minimum(np.max(lms[:, jaw_line_inds, 0], 1), lms[:, 8, 0])
+    y_max = max_jaw - (max_jaw - np.max(lms[:, part_inds, 0], 1)) * 0.5 - pad
+
+    # scale facial feature
+    scale = np.random.rand(num_faces)
+    scale_mask = np.logical_and(np.asarray(p_scale) > 0.5, scale > 0.5)
+
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms, part_inds)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale_max_y = np.minimum(
+            (y_min - part_mean[:, 0]) / part_bound_min[:, 0],
+            (y_max - part_mean[:, 0]) / part_bound_max[:, 0])
+        scale_max_x = np.minimum(
+            (x_min - part_mean[:, 1]) / part_bound_min[:, 1],
+            (x_max - part_mean[:, 1]) / part_bound_max[:, 1])
+    scale_max_y = np.minimum(scale_max_y, 1.2)
+    scale_max_x = np.minimum(scale_max_x, 1.2)
+
+    scale_y = uniform_batch(0.7, scale_max_y)
+    scale_x = uniform_batch(0.7, scale_max_x)
+
+    lms_def_scale = deform_part_batch(lms, part_inds, scale_y=scale_y, scale_x=scale_x)
+
+    # check for spatial errors
+    error = check_deformation_spatial_errors_batch(lms_def_scale, part_inds, pad=pad)
+    lms_def_scale, rejected_scale = accept_deformation_batch(lms_def_scale, lms, scale_mask, error)
+
+    # shift facial feature
+    shift_mask = np.logical_and(
+        np.asarray(p_shift) > 0.5, np.logical_or(np.random.rand(num_faces) > 0.5, scale == 0))
+
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms_def_scale, part_inds)
+
+    shift_x = uniform_batch(x_min - (part_mean[:, 1] + part_bound_min[:, 1]),
+                            x_max - (part_mean[:, 1] + part_bound_max[:, 1]))
+    shift_y = uniform_batch(y_min - (part_mean[:, 0] + part_bound_min[:, 0]),
+                            y_max - (part_mean[:, 0] + part_bound_max[:, 0]))
+
+    lms_def = deform_part_batch(lms_def_scale, part_inds, shift_ver=shift_y, shift_horiz=shift_x)
+    error = check_deformation_spatial_errors_batch(lms_def, part_inds, pad=pad)
+    lms_def, rejected_shift = accept_deformation_batch(lms_def, lms_def_scale, shift_mask, error)
+
+    return lms_def, np.logical_or(rejected_scale, rejected_shift)
+
+
+def deform_nose_batch(lms, p_scale=0, p_shift=0, pad=5):
+    """ deform nose landmarks of multiple faces - matching ibug annotations of 68 landmarks """
+
+    nose_inds = np.arange(27, 36)
+    left_eye_inds = np.arange(36, 42)
+    right_eye_inds = np.arange(42, 48)
+
+    part_inds = nose_inds.copy()
+    num_faces = lms.shape[0]
+
+    # find part spatial limitations
+    upper_x_max = np.max(lms[:, part_inds[:4], 1], 1)
+    upper_x_min = np.min(lms[:, part_inds[:4], 1], 1)
+    left_eye_x_max = np.max(lms[:, left_eye_inds, 1], 1)
+    x_max = upper_x_max + (np.min(lms[:, right_eye_inds, 1], 1) - upper_x_max) * 0.5 - pad
+    x_min = left_eye_x_max + (upper_x_min - left_eye_x_max) * 0.5 + pad
+
+    max_brows = np.max(lms[:, 21:23, 0], 1)
+    part_y_min = np.min(lms[:, part_inds, 0], 1)
+    y_min = part_y_min + (max_brows - part_y_min) * 0.5
+    y_max = np.max(lms[:, part_inds, 0], 1) - pad
+
+    # scale facial feature
+    scale = np.random.rand(num_faces)
+    scale_mask = np.logical_and(np.asarray(p_scale) > 0.5, scale > 0.5)
+
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms, part_inds)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale_max_y = np.minimum(
+            (y_min - part_mean[:, 0]) / part_bound_min[:, 0],
+            (y_max - part_mean[:, 0]) / part_bound_max[:, 0])
+    scale_y = uniform_batch(0.7, scale_max_y)
+    scale_x = uniform_batch(0.7, 1.5 * np.ones(num_faces))
+
+    lms_def_scale = deform_part_batch(lms, part_inds, scale_y=scale_y, scale_x=scale_x)
+
+    error = np.logical_or(check_deformation_spatial_errors_batch(lms_def_scale, part_inds[:4], pad=pad),
+                          check_deformation_spatial_errors_batch(lms_def_scale, part_inds[4:], pad=pad))
+    lms_def_scale, rejected_scale = accept_deformation_batch(lms_def_scale, lms, scale_mask, error)
+
+    # shift facial feature
+    shift_mask = np.logical_and(
+        np.asarray(p_shift) > 0.5, np.logical_or(np.random.rand(num_faces) > 0.5, scale == 0))
+
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms_def_scale, part_inds)
+    upper_mean, upper_bound_min, upper_bound_max = get_part_mean_bounds_batch(lms_def_scale, part_inds[:4])
+
+    # x bounds of the upper nose, relative to the mean of the whole nose
+    part_x_bound_min = upper_bound_min[:, 1] + upper_mean[:, 1] - part_mean[:, 1]
+    part_x_bound_max = upper_bound_max[:, 1] + upper_mean[:, 1] - part_mean[:, 1]
+
+    shift_x = uniform_batch(x_min - (part_mean[:, 1] + part_x_bound_min),
+                            x_max - (part_mean[:, 1] + part_x_bound_max))
+    shift_y = uniform_batch(y_min - (part_mean[:, 0] + part_bound_min[:, 0]),
+                            y_max - (part_mean[:, 0] + part_bound_max[:, 0]))
+
+    lms_def = deform_part_batch(lms_def_scale, part_inds, shift_ver=shift_y, shift_horiz=shift_x)
+
+    error = np.logical_or(check_deformation_spatial_errors_batch(lms_def, part_inds[:4], pad=pad),
+                          check_deformation_spatial_errors_batch(lms_def, part_inds[4:], pad=pad))
+    lms_def, rejected_shift = accept_deformation_batch(lms_def, lms_def_scale, shift_mask, error)
+
+    return lms_def, np.logical_or(rejected_scale, rejected_shift)
+
+
+def deform_eyes_batch(lms, p_scale=0, p_shift=0, pad=10):
+    """ deform eyes + eyebrows landmarks of multiple faces - matching ibug annotations of 68 landmarks """
+
+    nose_inds = np.arange(27, 36)
+    left_eye_inds = np.arange(36, 42)
+    right_eye_inds = np.arange(42, 48)
+    left_brow_inds = np.arange(17, 22)
+    right_brow_inds = np.arange(22, 27)
+
+    part_inds_right = np.hstack((right_brow_inds, right_eye_inds))
+    part_inds_left = np.hstack((left_brow_inds, left_eye_inds))
+    num_faces = lms.shape[0]
+
+    # find part spatial limitations
+    upper_nose_x_max = np.max(lms[:, nose_inds[:4], 1], 1)
+    upper_nose_x_min = np.min(lms[:, nose_inds[:4], 1], 1)
+
+    # right eye+eyebrow
+    right_x_max = np.max(lms[:, part_inds_right, 1], 1)
+    right_y_max = np.max(lms[:, part_inds_right, 0], 1)
+    x_max_right = right_x_max + (lms[:, 16, 1] - right_x_max) * 0.5 - pad
+    x_min_right = upper_nose_x_max + (np.min(lms[:, part_inds_right, 1], 1) - upper_nose_x_max) * 0.5 + pad
+    y_max_right = right_y_max + (lms[:, 33, 0] - right_y_max) * 0.25 - pad
+    y_min_right = 2 * pad * np.ones(num_faces)
+
+    # left eye+eyebrow
+    left_x_max = np.max(lms[:, part_inds_left, 1], 1)
+    left_x_min = np.min(lms[:, part_inds_left, 1], 1)
+    left_y_max = np.max(lms[:, part_inds_left, 0], 1)
+    x_max_left = left_x_max + (upper_nose_x_min - left_x_max) * 0.5 - pad
+    x_min_left = lms[:, 0, 1] + (left_x_min - lms[:, 0, 1]) * 0.5 + pad
+    y_max_left = left_y_max + (lms[:, 33, 0] - left_y_max) * 0.25 - pad
+    y_min_left = 2 * pad * np.ones(num_faces)
+
+    # scale facial feature
+    scale = np.random.rand(num_faces)
+    scale_mask = np.logical_and(np.asarray(p_scale) > 0.5, scale > 0.5)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # right eye+eyebrow
+        part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms, part_inds_right)
+        scale_max_y_right = np.minimum(np.minimum(
+            (y_min_right - part_mean[:, 0]) / part_bound_min[:, 0],
+            (y_max_right - part_mean[:, 0]) / part_bound_max[:, 0]), 1.5)
+        scale_max_x_right = np.minimum(np.minimum(
+            (x_min_right - part_mean[:, 1]) / part_bound_min[:, 1],
+            (x_max_right - part_mean[:, 1]) / part_bound_max[:, 1]), 1.5)
+
+        # left eye+eyebrow
+        part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms, part_inds_left)
+        scale_max_y_left = np.minimum(np.minimum(
+            (y_min_left - part_mean[:, 0]) / part_bound_min[:, 0],
+            (y_max_left - part_mean[:, 0]) / part_bound_max[:, 0]), 1.5)
+        scale_max_x_left = np.minimum(np.minimum(
+            (x_min_left - part_mean[:, 1]) / part_bound_min[:, 1],
+            (x_max_left - part_mean[:, 1]) / part_bound_max[:, 1]), 1.5)
+
+    scale_y = uniform_batch(0.8, np.minimum(scale_max_y_left, scale_max_y_right))
+    scale_x = uniform_batch(0.8, np.minimum(scale_max_x_left, scale_max_x_right))
+
+    lms_def_scale = deform_part_batch(lms, part_inds_right, scale_y=scale_y, scale_x=scale_x)
+    lms_def_scale = deform_part_batch(lms_def_scale, part_inds_left, scale_y=scale_y, scale_x=scale_x)
+
+    error = np.logical_or(check_deformation_spatial_errors_batch(lms_def_scale, part_inds_right, pad=pad),
+                          check_deformation_spatial_errors_batch(lms_def_scale, part_inds_left, pad=pad))
+    lms_def_scale, rejected_scale = accept_deformation_batch(lms_def_scale, lms, scale_mask, error)
+
+    # shift facial feature
+    shift_mask = np.logical_and(
+        np.asarray(p_shift) > 0.5, np.logical_or(np.random.rand(num_faces) > 0.5, scale == 0))
+
+    y_min_right = np.maximum(0.8 * np.min(lms_def_scale[:, part_inds_right, 0], 1), pad)
+    y_min_left = np.maximum(0.8 * np.min(lms_def_scale[:, part_inds_left, 0], 1), pad)
+
+    # right eye
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms_def_scale, part_inds_right)
+
+    shift_x = uniform_batch(x_min_right - (part_mean[:, 1] + part_bound_min[:, 1]),
+                            x_max_right - (part_mean[:, 1] + part_bound_max[:, 1]))
+    shift_y = uniform_batch(y_min_right - (part_mean[:, 0] + part_bound_min[:, 0]),
+                            y_max_right - (part_mean[:, 0] + part_bound_max[:, 0]))
+
+    lms_def_right = deform_part_batch(lms_def_scale, part_inds_right, shift_ver=shift_y, shift_horiz=shift_x)
+
+    error = check_deformation_spatial_errors_batch(lms_def_right, part_inds_right, pad=pad)
+    lms_def_right, rejected_right = accept_deformation_batch(lms_def_right, lms_def_scale, shift_mask, error)
+
+    # left eye
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms_def_scale, part_inds_left)
+
+    shift_x = uniform_batch(x_min_left - (part_mean[:, 1] + part_bound_min[:, 1]),
+                            x_max_left - (part_mean[:, 1] + part_bound_max[:, 1]))
+    shift_y = uniform_batch(y_min_left - (part_mean[:, 0] + part_bound_min[:, 0]),
+                            y_max_left - (part_mean[:, 0] + part_bound_max[:, 0]))
+
+    lms_def = deform_part_batch(lms_def_right, part_inds_left, shift_ver=shift_y, shift_horiz=shift_x)
+
+    error = check_deformation_spatial_errors_batch(lms_def, part_inds_left, pad=pad)
+    lms_def, rejected_left = accept_deformation_batch(lms_def, lms_def_right, shift_mask, error)
+
+    return lms_def, np.logical_or(rejected_scale, np.logical_or(rejected_right, rejected_left))
+
+
+def deform_scale_face_batch(lms, p_scale=0, pad=5, image_size=256):
+    """ change face landmarks scale & aspect ratio of multiple faces - matching ibug annotations of 68 landmarks """
+
+    part_inds = np.arange(68)
+
+    # find spatial limitations
+    face_x_max = np.max(lms[:, part_inds, 1], 1)
+    face_y_max = np.max(lms[:, part_inds, 0], 1)
+    x_max = face_x_max + (image_size - face_x_max) * 0.5 - pad
+    x_min = np.min(lms[:, part_inds, 1], 1) * 0.5 + pad
+
+    y_min = 2 * pad
+    y_max = face_y_max + (image_size - face_y_max) * 0.5 - pad
+
+    scale_mask = np.broadcast_to(np.asarray(p_scale) > 0.5, (lms.shape[0],))
+
+    part_mean, part_bound_min, part_bound_max = get_part_mean_bounds_batch(lms, part_inds)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale_max_y = np.minimum(
+            (y_min - part_mean[:, 0]) / part_bound_min[:, 0],
+            (y_max - part_mean[:, 0]) / part_bound_max[:, 0])
+        scale_max_x = np.minimum(
+            (x_min - part_mean[:, 1]) / part_bound_min[:, 1],
+            (x_max - part_mean[:, 1]) / part_bound_max[:, 1])
+    scale_max_y = np.minimum(scale_max_y, 1.2)
+    scale_max_x = np.minimum(scale_max_x, 1.2)
+
+    scale_y = uniform_batch(0.6, scale_max_y)
+    scale_x = uniform_batch(0.6, scale_max_x)
+
+    lms_def_scale = deform_part_batch(lms, part_inds, scale_y=scale_y, scale_x=scale_x)
+
+    # check for spatial errors
+    error = np.logical_or(np.any(np.logical_or(lms_def_scale >= image_size, lms_def_scale < 0), axis=(1, 2)),
+                          check_duplicate_points_batch(lms_def_scale))
+    return accept_deformation_batch(lms_def_scale, lms, scale_mask, error)
+
+
+def deform_face_geometric_style_batch(lms, p_scale=0, p_shift=0, return_rejected=False):
+    """ deform facial landmarks of multiple faces (N, 68, 2) - matching ibug annotations of 68 landmarks.
+    p_scale/p_shift can be scalars or (N,) arrays (per-face). if return_rejected is True, also returns (N,) mask of
+    faces where at least one sampled deformation was rejected (and the previous landmarks were kept) """
+
+    lms, rejected_scale = deform_scale_face_batch(lms.copy(), p_scale=p_scale, pad=0)
+    lms, rejected_nose = deform_nose_batch(lms, p_scale=p_scale, p_shift=p_shift, pad=0)
+    lms, rejected_mouth = deform_mouth_batch(lms, p_scale=p_scale, p_shift=p_shift, pad=0)
+    lms, rejected_eyes = deform_eyes_batch(lms, p_scale=p_scale, p_shift=p_shift, pad=0)
+
+    if return_rejected:
+        rejected = np.any([rejected_scale, rejected_nose, rejected_mouth, rejected_eyes], axis=0)
+        return lms, rejected
+    else:
+        return lms
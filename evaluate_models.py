@@ -0,0 +1,435 @@
+import os
+import json
+import time
+from glob import glob
+from skimage.color import gray2rgb
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import tensorflow as tf
+from menpo_functions import load_bb_dictionary, load_menpo_image_list
+from data_loading_functions import load_images
+from logging_functions import batch_heat_maps_to_landmarks
+from deep_heatmaps_model_fusion_net import DeepHeatmapsModel
+from menpofit.error import batch_mean_pupil_68_error, compute_statistical_measures
+from menpofit.error.stats import simps
+
+
+'''THIS SCRIPT EVALUATES AND COMPARES MULTIPLE HEATMAP NETWORK CHECKPOINTS ON A TEST SET:
+    the test set is decoded and cropped once, and cached to disk as float32 image + landmark arrays. the cached
+    arrays are memory-mapped and streamed batch-wise through each checkpoint (several checkpoints can be evaluated
+    concurrently, each in its own graph + session), and the NME (normalized by inter-pupil distance) of the
+    estimation stage is computed per image. comparing a sweep of checkpoints costs a single decoding pass.
+    a single checkpoint can also be evaluated in streaming mode on arbitrarily large test sets: per-image NME of each
+    stage of the ECpTp algorithm and runtime are appended to a chunked log, and an interrupted run resumes from the
+    last completed chunk.'''
+
+
+def test_set_cache_paths(cache_dir, test_data, image_size=256, margin=0.25, bb_type='gt', scale=1):
+    """paths of the cached image, landmark and name arrays of a test set (one set of files per crop parameters)"""
+
+    set_name = '%s_size_%d_margin_%s_bb_%s_scale_%s' % (test_data, image_size, str(margin), bb_type, str(scale))
+    return [os.path.join(cache_dir, '%s_%s.npy' % (set_name, arr_name))
+            for arr_name in ['images', 'names', 'landmarks']]
+
+
+def cache_test_set(img_path, test_data, cache_dir, image_size=256, margin=0.25, bb_type='gt', c_dim=3, scale=1,
+                   num_landmarks=68, batch_size=64, verbose=False):
+    """decode + crop the test set once, and save it as float32 arrays. the landmarks file is written last, so the
+    cache is considered complete only if it exists. returns memory-mapped images, landmarks and image names"""
+
+    img_cache_path, names_cache_path, lms_cache_path = test_set_cache_paths(
+        cache_dir, test_data, image_size=image_size, margin=margin, bb_type=bb_type, scale=scale)
+
+    if not os.path.exists(lms_cache_path):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        bb_dictionary = load_bb_dictionary(os.path.join(img_path, 'Bounding_Boxes'), 'TEST', test_data=test_data)
+        img_menpo_list = load_menpo_image_list(
+            img_path, train_crop_dir=None, img_dir_ns=None, mode='TEST', bb_dictionary=bb_dictionary,
+            image_size=image_size, margin=margin, bb_type=bb_type, test_data=test_data, augment_basic=False,
+            augment_texture=False, augment_geom=False, verbose=verbose)
+        num_images = len(img_menpo_list)
+
+        # write images directly to a memory-mapped file, so the full set is never held in memory
+        img_tmp_path = img_cache_path[:-4] + '_tmp.npy'
+        images = np.lib.format.open_memmap(
+            img_tmp_path, mode='w+', dtype='float32', shape=(num_images, image_size, image_size, c_dim))
+        landmarks = np.zeros([num_images, num_landmarks, 2]).astype('float32')
+        names = []
+
+        for start in range(0, num_images, batch_size):
+            batch_inds = np.arange(start, min(start + batch_size, num_images))
+            images[batch_inds] = load_images(img_menpo_list, batch_inds, image_size=image_size, c_dim=c_dim,
+                                             scale=scale)
+            for ind in batch_inds:
+                img = img_menpo_list[ind]
+                landmarks[ind] = img.landmarks[img.landmarks.group_labels[0]].points
+                names.append(img.path.name if hasattr(img, 'path') else 'image_%05d' % ind)
+        images.flush()
+        del images
+        os.rename(img_tmp_path, img_cache_path)
+
+        for arr, path in zip([np.array(names), landmarks], [names_cache_path, lms_cache_path]):
+            tmp_path = path[:-4] + '_tmp.npy'
+            np.save(tmp_path, arr)
+            os.rename(tmp_path, path)
+
+        print ('cached %d test images to: %s' % (num_images, cache_dir))
+
+    return np.load(img_cache_path, mmap_mode='r'), np.load(lms_cache_path), np.load(names_cache_path)
+
+
+def load_evaluation_model(model_path, image_size=256, c_dim=3, num_landmarks=68):
+    """build the heatmap network in a separate graph, and restore a checkpoint into a new session"""
+
+    graph = tf.Graph()
+    with graph.as_default():
+        model = DeepHeatmapsModel(mode='TEST', image_size=image_size, c_dim=c_dim, num_landmarks=num_landmarks,
+                                  test_model_path=model_path, load_data=False, menpo_verbose=False)
+        model.add_placeholders()
+        model.build_model()
+        sess = tf.Session(graph=graph, config=model.config)
+        saver = tf.train.Saver()
+        saver.restore(sess, model_path)
+
+    return model, sess
+
+
+def evaluate_model_on_arrays(model_path, images, landmarks, batch_size=10, image_size=256, c_dim=3,
+                             num_landmarks=68):
+    """normalized mean error (inter-pupil) of the estimation stage of a checkpoint, on pre-loaded test arrays"""
+
+    t = time.time()
+    model, sess = load_evaluation_model(model_path, image_size=image_size, c_dim=c_dim, num_landmarks=num_landmarks)
+
+    num_images = len(images)
+    errors = np.zeros(num_images).astype('float32')
+    try:
+        for start in range(0, num_images, batch_size):
+            end = min(start + batch_size, num_images)
+            batch_maps_pred = sess.run(model.pred_hm_u, {model.images: images[start:end]})
+            batch_pred_landmarks = batch_heat_maps_to_landmarks(
+                batch_maps_pred, image_size=image_size, num_landmarks=num_landmarks)
+            errors[start:end] = batch_mean_pupil_68_error(batch_pred_landmarks, landmarks[start:end])
+    finally:
+        sess.close()
+
+    print ('evaluated model: %s (%d images, %.1f sec)' % (model_path, num_images, time.time() - t))
+
+    return errors
+
+
+def evaluate_models(model_paths, images, landmarks, batch_size=10, num_parallel=1, image_size=256, c_dim=3,
+                    num_landmarks=68):
+    """per-image NME of several checkpoints on the same pre-loaded test arrays. with num_parallel > 1, several
+    checkpoints are evaluated concurrently, each in its own graph + session"""
+
+    def evaluate(model_path):
+        return evaluate_model_on_arrays(model_path, images, landmarks, batch_size=batch_size,
+                                        image_size=image_size, c_dim=c_dim, num_landmarks=num_landmarks)
+
+    if num_parallel > 1:
+        pool = ThreadPool(processes=num_parallel)
+        try:
+            model_errors = pool.map(evaluate, model_paths)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        model_errors = [evaluate(model_path) for model_path in model_paths]
+
+    return model_errors
+
+
+def compare_models(model_names, model_errors, max_error=0.08, step_error=0.0001):
+    """NME statistics (mean, std, median, mad, max, AUC, failure rate) of several models"""
+
+    measures = compute_statistical_measures([np.asarray(err) for err in model_errors], step_error, max_error)
+    measure_names = ['nme_mean', 'nme_std', 'nme_median', 'nme_mad', 'nme_max', 'auc', 'failure_rate']
+
+    return dict((name, dict((measure_name, float(measure[i]))
+                            for measure_name, measure in zip(measure_names, measures)))
+                for i, name in enumerate(model_names))
+
+
+def print_model_comparison(model_stats, test_data, max_error=0.08):
+    """print NME statistics of several models, sorted by mean NME"""
+
+    print ('\n****** NME statistics on ' + test_data + ' set (percentage of inter-pupil distance) ******\n')
+    for name, stats in sorted(model_stats.items(), key=lambda item: item[1]['nme_mean']):
+        print ('* %s: NME: %.2f AUC@%.2f: %.2f failure rate: %.2f%%' % (
+            name, 100 * stats['nme_mean'], max_error, 100 * stats['auc'], 100 * stats['failure_rate']))
+
+
+def find_model_checkpoints(models_dir):
+    """paths of all checkpoints (meta files) in a directory tree, without the .meta suffix"""
+
+    checkpoints = []
+    for root, _, _ in os.walk(models_dir):
+        checkpoints += [path[:-len('.meta')] for path in glob(os.path.join(root, '*.meta'))]
+    return sorted(checkpoints)
+
+
+
+# streaming evaluation with a resumable on-disk log
+
+EVALUATION_STAGES = ['E', 'ECp', 'ECpT', 'ECT', 'ECpTp_jaw', 'ECpTp_out']
+
+
+def evaluation_chunk_paths(log_dir, chunk_ind):
+    """paths of the image name, runtime and NME arrays of a single evaluation log chunk"""
+
+    return [os.path.join(log_dir, '%s_%05d.npy' % (arr_name, chunk_ind))
+            for arr_name in ['names', 'runtimes', 'errors']]
+
+
+def num_completed_chunks(log_dir):
+    """number of completed chunks in an evaluation log (a chunk is complete only if its errors file exists)"""
+
+    chunk_ind = 0
+    while os.path.exists(evaluation_chunk_paths(log_dir, chunk_ind)[-1]):
+        chunk_ind += 1
+    return chunk_ind
+
+
+def save_evaluation_chunk(log_dir, chunk_ind, names, runtimes, errors):
+    """save image names, runtimes and per-stage NME of a chunk. the errors file is renamed last, so an interrupted
+    chunk is evaluated again on resume"""
+
+    for arr, path in zip([np.array(names), runtimes, errors], evaluation_chunk_paths(log_dir, chunk_ind)):
+        tmp_path = path[:-4] + '_tmp.npy'
+        np.save(tmp_path, arr)
+        os.rename(tmp_path, path)
+
+
+def ecptp_stage_landmarks(test_image, test_image_map, init_lms, pdm_models_dir, clm_model_path):
+    """landmarks of the correction + tuning stages of the ECpTp algorithm (and ECT), for a single image"""
+
+    from pdm_clm_functions import feature_based_pdm_corr, clm_correct
+
+    jaw_line_inds = np.arange(0, 17)
+    brow_inds = np.arange(17, 27)
+
+    p_pdm_lms = feature_based_pdm_corr(lms_init=init_lms, models_dir=pdm_models_dir, train_type='basic')
+    try:  # clm may not converge
+        pdm_clm_lms = clm_correct(
+            clm_model_path=clm_model_path, image=test_image, map=test_image_map, lms_init=p_pdm_lms)
+    except:
+        pdm_clm_lms = p_pdm_lms.copy()
+    try:  # clm may not converge
+        ect_lms = clm_correct(clm_model_path=clm_model_path, image=test_image, map=test_image_map, lms_init=init_lms)
+    except:
+        ect_lms = p_pdm_lms.copy()
+
+    ecptp_jaw = p_pdm_lms.copy()
+    ecptp_jaw[jaw_line_inds] = pdm_clm_lms[jaw_line_inds]
+    ecptp_out = ecptp_jaw.copy()
+    ecptp_out[brow_inds] = pdm_clm_lms[brow_inds]
+
+    return {'ECp': p_pdm_lms, 'ECpT': pdm_clm_lms, 'ECT': ect_lms, 'ECpTp_jaw': ecptp_jaw, 'ECpTp_out': ecptp_out}
+
+
+def evaluate_chunk(sess, model, chunk_images, stages, batch_size=10, image_size=256, c_dim=3, scale=1,
+                   num_landmarks=68, pdm_models_dir=None, clm_model_path=None):
+    """per-stage NME and runtime (sec) of each image in a chunk of menpo images"""
+
+    num_images = len(chunk_images)
+    errors = np.zeros([num_images, len(stages)]).astype('float32')
+    runtimes = np.zeros(num_images)
+    gt_landmarks = np.array([img.landmarks[img.landmarks.group_labels[0]].points for img in chunk_images])
+    pred_landmarks = np.zeros([len(stages), num_images, num_landmarks, 2]).astype('float32')
+    batch_images = np.zeros([batch_size, image_size, image_size, c_dim]).astype('float32')
+
+    for start in range(0, num_images, batch_size):
+        end = min(start + batch_size, num_images)
+        t_0 = time.time()
+        for ind, img in enumerate(chunk_images[start:end]):
+            if img.n_channels < 3 and c_dim == 3:
+                batch_images[ind] = gray2rgb(np.squeeze(img.pixels_with_channels_at_back()))
+            else:
+                batch_images[ind] = img.pixels_with_channels_at_back()
+        if scale == 255:
+            batch_images *= 255
+        elif scale == 0:
+            batch_images[:] = 2 * batch_images - 1
+        batch_maps_pred = sess.run(model.pred_hm_u, {model.images: batch_images[:end - start]})
+        pred_landmarks[0, start:end] = batch_heat_maps_to_landmarks(
+            batch_maps_pred, image_size=image_size, num_landmarks=num_landmarks)
+        runtimes[start:end] = (time.time() - t_0) / (end - start)
+
+        if len(stages) > 1:
+            for ind in range(start, end):
+                t_0 = time.time()
+                stage_lms = ecptp_stage_landmarks(
+                    chunk_images[ind], batch_maps_pred[ind - start:ind - start + 1], pred_landmarks[0, ind],
+                    pdm_models_dir, clm_model_path)
+                for stage_ind, stage in enumerate(stages[1:]):
+                    pred_landmarks[stage_ind + 1, ind] = stage_lms[stage]
+                runtimes[ind] += time.time() - t_0
+
+    for stage_ind in range(len(stages)):
+        errors[:, stage_ind] = batch_mean_pupil_68_error(pred_landmarks[stage_ind], gt_landmarks)
+
+    return errors, runtimes
+
+
+def evaluate_model_streaming(model_path, img_path, test_data, log_dir, chunk_size=100, batch_size=10,
+                             pdm_models_dir=None, clm_model_path=None, image_size=256, margin=0.25, bb_type='gt',
+                             c_dim=3, scale=1, num_landmarks=68, max_error=0.08):
+    """evaluate a checkpoint on a (possibly very large) test set, one chunk of images at a time. per-image results
+    are appended to a chunked log in *log_dir*, and an interrupted run resumes from the last completed chunk. if
+    pdm/clm models are given, the correction + tuning stages are evaluated as well"""
+
+    if pdm_models_dir is not None and clm_model_path is not None:
+        stages = EVALUATION_STAGES
+    else:
+        stages = EVALUATION_STAGES[:1]
+
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # the log can only be resumed with the same evaluation setup
+    log_info = {'model_path': model_path, 'test_data': test_data, 'stages': stages, 'chunk_size': chunk_size,
+                'image_size': image_size, 'margin': margin, 'bb_type': bb_type}
+    log_info_path = os.path.join(log_dir, 'log_info.json')
+    if os.path.exists(log_info_path):
+        with open(log_info_path, 'r') as f:
+            if json.load(f) != json.loads(json.dumps(log_info)):
+                raise ValueError('evaluation log in %s was created with a different setup' % log_dir)
+    else:
+        with open(log_info_path, 'w') as f:
+            json.dump(log_info, f, indent=2, sort_keys=True)
+
+    # lazy image list - images are decoded and cropped only when their chunk is evaluated
+    bb_dictionary = load_bb_dictionary(os.path.join(img_path, 'Bounding_Boxes'), 'TEST', test_data=test_data)
+    img_menpo_list = load_menpo_image_list(
+        img_path, train_crop_dir=None, img_dir_ns=None, mode='TEST', bb_dictionary=bb_dictionary,
+        image_size=image_size, margin=margin, bb_type=bb_type, test_data=test_data, augment_basic=False,
+        augment_texture=False, augment_geom=False)
+    num_images = len(img_menpo_list)
+    num_chunks = int(np.ceil(1. * num_images / chunk_size))
+
+    start_chunk = num_completed_chunks(log_dir)
+    if start_chunk > 0:
+        print ('resuming evaluation from chunk %d / %d' % (start_chunk + 1, num_chunks))
+
+    if start_chunk < num_chunks:
+        model, sess = load_evaluation_model(
+            model_path, image_size=image_size, c_dim=c_dim, num_landmarks=num_landmarks)
+        try:
+            for chunk_ind in range(start_chunk, num_chunks):
+                chunk_images = list(img_menpo_list[chunk_ind * chunk_size:(chunk_ind + 1) * chunk_size])
+                errors, runtimes = evaluate_chunk(
+                    sess, model, chunk_images, stages, batch_size=batch_size, image_size=image_size, c_dim=c_dim,
+                    scale=scale, num_landmarks=num_landmarks, pdm_models_dir=pdm_models_dir,
+                    clm_model_path=clm_model_path)
+                names = [img.path.name if hasattr(img, 'path') else 'image_%05d' % (chunk_ind * chunk_size + ind)
+                         for ind, img in enumerate(chunk_images)]
+                save_evaluation_chunk(log_dir, chunk_ind, names, runtimes, errors)
+                print ('chunk %d / %d done' % (chunk_ind + 1, num_chunks))
+        finally:
+            sess.close()
+
+    return evaluation_log_statistics(log_dir, max_error=max_error)
+
+
+def evaluation_log_statistics(log_dir, max_error=0.08, step_error=0.0001):
+    """per-stage NME statistics (mean, std, max, AUC, failure rate) and mean runtime of an evaluation log. chunks
+    are read one at a time, and the CED is accumulated as a histogram, so memory does not grow with the log size"""
+
+    with open(os.path.join(log_dir, 'log_info.json'), 'r') as f:
+        stages = json.load(f)['stages']
+
+    x_axis = np.arange(0., max_error + step_error, step_error)
+    num_images = 0
+    num_valid = np.zeros(len(stages))
+    err_sum = np.zeros(len(stages))
+    err_sq_sum = np.zeros(len(stages))
+    err_max = np.zeros(len(stages))
+    ced_counts = np.zeros([len(stages), len(x_axis) + 1])
+    runtime_sum = 0.
+
+    for chunk_ind in range(num_completed_chunks(log_dir)):
+        _, runtimes_path, errors_path = evaluation_chunk_paths(log_dir, chunk_ind)
+        errors = np.load(errors_path).astype('float64')
+        valid = np.isfinite(errors)
+        num_images += len(errors)
+        num_valid += valid.sum(axis=0)
+        err_sum += np.where(valid, errors, 0.).sum(axis=0)
+        err_sq_sum += np.where(valid, errors ** 2, 0.).sum(axis=0)
+        err_max = np.maximum(err_max, np.where(valid, errors, 0.).max(axis=0))
+        runtime_sum += np.load(runtimes_path).sum()
+        for stage_ind in range(len(stages)):
+            # index of the first CED bin >= error (nan errors are counted as failures)
+            ced_counts[stage_ind] += np.bincount(
+                np.searchsorted(x_axis, errors[:, stage_ind], side='left'), minlength=len(x_axis) + 1)
+
+    if num_images == 0:
+        return None
+
+    ced = np.cumsum(ced_counts[:, :-1], axis=1) / num_images
+    err_mean = err_sum / num_valid
+    stats = {'num_images': num_images, 'runtime_mean_sec': runtime_sum / num_images, 'stages': {}}
+    for stage_ind, stage in enumerate(stages):
+        stats['stages'][stage] = {
+            'nme_mean': float(err_mean[stage_ind]),
+            'nme_std': float(np.sqrt(max(err_sq_sum[stage_ind] / num_valid[stage_ind] - err_mean[stage_ind] ** 2,
+                                         0.))),
+            'nme_max': float(err_max[stage_ind]),
+            'auc': float(simps(ced[stage_ind], x=x_axis) / max_error),
+            'failure_rate': float(1. - ced[stage_ind, -1])}
+
+    return stats
+
+
+if __name__ == '__main__':
+
+    # data parameters
+    img_path = 'data'  # landmark detection datasets directory
+    test_data = 'full'  # test set to use full/common/challenging/test/art
+    cache_dir = 'eval_cache'  # directory of cached (decoded + cropped) test sets
+    image_size = 256  # network input size
+    margin = 0.25  # margin for face crops - % of bb size
+    bb_type = 'gt'  # bb to use - 'gt': for ground truth / 'init': for face detector output
+
+    # model parameters
+    models_dir = 'output/model'  # directory tree with checkpoints to evaluate and compare
+    model_path = 'model/deep_heatmaps_model'  # checkpoint to evaluate in streaming mode
+    pdm_path = 'pdm_clm_models/pdm_models/'  # models for correction stage (streaming mode, None: estimation only)
+    clm_path = 'pdm_clm_models/clm_models/g_t_all'  # model for tuning stage (streaming mode, None: estimation only)
+
+    # evaluation parameters
+    streaming = False  # evaluate a single checkpoint with a resumable chunked log, instead of comparing checkpoints
+    log_dir = 'logs/eval_' + test_data  # evaluation log directory (streaming mode)
+    chunk_size = 100  # number of images per log chunk (streaming mode)
+    batch_size = 10  # estimation stage batch size
+    num_parallel = 1  # number of checkpoints evaluated concurrently (each in its own graph)
+    max_error = 0.08  # error threshold to be considered as failure
+    out_json = 'nme_statistics_on_' + test_data + '_set.json'  # comparison results file
+
+    if streaming:
+        stats_json = os.path.join(log_dir, 'nme_statistics.json')
+        log_stats = evaluate_model_streaming(
+            model_path, img_path, test_data, log_dir, chunk_size=chunk_size, batch_size=batch_size,
+            pdm_models_dir=pdm_path, clm_model_path=clm_path, image_size=image_size, margin=margin, bb_type=bb_type,
+            max_error=max_error)
+        with open(stats_json, 'w') as f:
+            json.dump(log_stats, f, indent=2, sort_keys=True)
+
+        print ('\nsaved evaluation statistics to: ' + stats_json)
+
+    else:
+        test_images, test_landmarks, _ = cache_test_set(
+            img_path, test_data, cache_dir, image_size=image_size, margin=margin, bb_type=bb_type)
+
+        checkpoints = find_model_checkpoints(models_dir)
+        errors = evaluate_models(checkpoints, test_images, test_landmarks, batch_size=batch_size,
+                                 num_parallel=num_parallel, image_size=image_size)
+        comparison = compare_models(checkpoints, errors, max_error=max_error)
+        print_model_comparison(comparison, test_data, max_error=max_error)
+
+        with open(out_json, 'w') as f:
+            json.dump(comparison, f, indent=2, sort_keys=True)
+
+        print ('\nsaved comparison results to: ' + out_json)
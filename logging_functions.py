@@ -1,9 +1,7 @@
 import numpy as np
 import os
-import cv2
-import matplotlib.pyplot as plt
-from scipy.ndimage import zoom
-from scipy.misc import imresize
+import time
+from collections import deque
 
 
 def print_training_params_to_file(init_locals):
@@ -16,6 +14,56 @@ def print_training_params_to_file(init_locals):
             f.write('* %s: %s\n' % (key, value))
 
 
+class TrainStepTimer(object):
+    """measure time spent in each phase of the training loop, and keep rolling statistics over the last
+    *window* steps. call start() at the beginning of a step, split(phase) at the end of each phase and end_step()
+    when the step is done. repeated splits of the same phase within a step are accumulated."""
+
+    def __init__(self, window=100):
+        self.window = window
+        self.phase_times = {}
+        self.step_phase_times = {}
+        self.last_time = None
+
+    def start(self):
+        self.step_phase_times = {}
+        self.last_time = time.time()
+
+    def split(self, phase):
+        now = time.time()
+        self.step_phase_times[phase] = self.step_phase_times.get(phase, 0.) + now - self.last_time
+        self.last_time = now
+
+    def end_step(self):
+        self.step_phase_times['total'] = sum(self.step_phase_times.values())
+        for phase, phase_time in self.step_phase_times.items():
+            if phase not in self.phase_times:
+                self.phase_times[phase] = deque(maxlen=self.window)
+            self.phase_times[phase].append(phase_time)
+
+    def summary_values(self, batch_size):
+        """(tag, value) pairs of rolling mean/p50/p95 time per phase (ms) and training throughput (images/sec)"""
+
+        values = []
+        for phase in sorted(self.phase_times.keys()):
+            phase_ms = 1000. * np.array(self.phase_times[phase])
+            p50, p95 = np.percentile(phase_ms, [50, 95])
+            values += [('timing/%s_mean_ms' % phase, phase_ms.mean()), ('timing/%s_p50_ms' % phase, p50),
+                       ('timing/%s_p95_ms' % phase, p95)]
+        if 'total' in self.phase_times:
+            values.append(('timing/images_per_sec', batch_size / np.mean(self.phase_times['total'])))
+        return values
+
+
+def save_chrome_trace(run_metadata, step, log_path):
+    """save timeline of a traced session run (tf.RunMetadata) in chrome trace format (view in chrome://tracing)"""
+
+    from tensorflow.python.client import timeline
+    trace = timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format()
+    with open(os.path.join(log_path, 'timeline_step_%d.json' % step), 'w') as f:
+        f.write(trace)
+
+
 def heat_maps_to_landmarks(maps, image_size=256, num_landmarks=68):
     """find landmarks from heatmaps (arg max on each map)"""
 
@@ -43,12 +91,23 @@ def batch_heat_maps_to_landmarks_alloc_once(batch_maps, batch_landmarks, batch_s
             num_landmarks=num_landmarks)
 
 
+def batch_heat_maps_to_landmarks(batch_maps, batch_size=None, image_size=256, num_landmarks=68):
+    """find landmarks from heatmaps (arg max on each map) - for multiple images, in a single vectorized pass"""
+
+    batch_size = len(batch_maps) if batch_size is None else batch_size
+    flat_argmax = batch_maps[:batch_size].reshape(batch_size, -1, num_landmarks).argmax(axis=1)
+    rows, cols = np.unravel_index(flat_argmax, (image_size, image_size))
+
+    return np.stack((rows, cols), axis=-1).astype('float32')
+
+
 def normalize_map(map_in):
     map_min = map_in.min()
     return (map_in - map_min) / (map_in.max() - map_min)
 
 
 def map_to_rgb(map_gray):
+    import matplotlib.pyplot as plt
     cmap = plt.get_cmap('jet')
     rgba_map_image = cmap(map_gray)
     map_rgb = np.delete(rgba_map_image, 3, 2) * 255
@@ -57,6 +116,7 @@ def map_to_rgb(map_gray):
 
 def create_img_with_landmarks(image, landmarks, image_size=256, num_landmarks=68, scale=255, circle_size=2):
     """add landmarks to a face image"""
+    import cv2
     image = image.reshape(image_size, image_size, -1)
 
     if scale is 0:
@@ -95,6 +155,8 @@ def heat_maps_to_image(maps, landmarks=None, image_size=256, num_landmarks=68):
 def merge_images_landmarks_maps_gt(images, maps, maps_gt, landmarks=None, image_size=256, num_landmarks=68,
                                    num_samples=9, scale=255, circle_size=2, fast=False):
     """create image for log - containing input face images, predicted heatmaps and GT heatmaps (if exists)"""
+    import matplotlib.pyplot as plt
+    from scipy.ndimage import zoom
 
     images = images[:num_samples]
     if maps.shape[1] is not image_size:
@@ -159,6 +221,7 @@ def merge_images_landmarks_maps_gt(images, maps, maps_gt, landmarks=None, image_
 
 def map_comapre_channels(images, maps1, maps2, image_size=64, num_landmarks=68, scale=255):
     """create image for log - present one face image, along with all its heatmaps (one for each landmark)"""
+    from scipy.ndimage import zoom
 
     map1 = maps1[0]
     if maps2 is not None:
@@ -5,6 +5,8 @@ from menpo.transform import ThinPlateSplines
 import menpo.transform as mt
 
 import menpo.io as mio
+from menpo.base import LazyList
+from menpo.image import Image
 from glob import glob
 from deformation_functions import *
 
@@ -273,7 +275,10 @@ def load_menpo_image_list(
                 out_image_list = out_image_list.map(crop_to_face_image_init)
         else:
             img_set_dir = os.path.join(img_dir, train_crop_dir)
-            out_image_list = mio.import_images(img_set_dir, verbose=verbose)
+            if len(glob(os.path.join(img_set_dir, 'landmarks_*.npy'))) > 0:
+                out_image_list = load_epoch_shards(img_set_dir)  # pre-augmented epoch data shards
+            else:
+                out_image_list = mio.import_images(img_set_dir, verbose=verbose)
 
         # perform image augmentation
         if augment_texture and p_texture > 0:
@@ -297,3 +302,66 @@ def load_menpo_image_list(
             out_image_list = out_image_list.map(crop_to_face_image_test)
 
     return out_image_list
+
+
+def load_menpo_image_names(img_dir, train_crop_dir, mode, test_data='full'):
+    """names of the images of a list created by load_menpo_image_list, in list order (images are not loaded)"""
+
+    if mode == 'TRAIN':
+        img_set_dir = os.path.join(img_dir, 'training' if train_crop_dir is None else train_crop_dir)
+        if train_crop_dir is not None and len(glob(os.path.join(img_set_dir, 'landmarks_*.npy'))) > 0:
+            names = []  # pre-augmented epoch data shards
+            shard_ind = 0
+            _, names_path, lms_path = epoch_shard_paths(img_set_dir, shard_ind)
+            while os.path.exists(lms_path):
+                names.append(np.load(names_path))
+                shard_ind += 1
+                _, names_path, lms_path = epoch_shard_paths(img_set_dir, shard_ind)
+            return np.concatenate(names)
+    else:
+        img_set_dir = os.path.join(img_dir, test_data)
+    return np.array([p.name for p in mio.image_paths(os.path.join(img_set_dir, '*'))])
+
+
+# pre-augmented epoch data shards
+
+
+def epoch_shard_paths(epoch_dir, shard_ind):
+    """paths of the image, landmark and name arrays of a single epoch data shard"""
+
+    return [os.path.join(epoch_dir, '%s_%05d.npy' % (arr_name, shard_ind))
+            for arr_name in ['images', 'names', 'landmarks']]
+
+
+def save_epoch_shard(epoch_dir, shard_ind, images, landmarks, names):
+    """save packed shard of augmented images (uint8) + landmarks. the landmarks file is renamed last, so a shard
+    is considered complete only if its landmarks file exists"""
+
+    for arr, path in zip([images, np.array(names), landmarks], epoch_shard_paths(epoch_dir, shard_ind)):
+        tmp_path = path[:-4] + '_tmp.npy'
+        np.save(tmp_path, arr)
+        os.rename(tmp_path, path)
+
+
+def load_epoch_shards(epoch_dir):
+    """load all epoch data shards in *epoch_dir* as a lazy menpo image list (shards are memory-mapped)"""
+
+    shards = []
+    shard_ind = 0
+    img_path, _, lms_path = epoch_shard_paths(epoch_dir, shard_ind)
+    while os.path.exists(lms_path):
+        shards.append((np.load(img_path, mmap_mode='r'), np.load(lms_path)))
+        shard_ind += 1
+        img_path, _, lms_path = epoch_shard_paths(epoch_dir, shard_ind)
+
+    shard_sizes = np.array([len(lms) for _, lms in shards])
+    shard_starts = np.cumsum(shard_sizes) - shard_sizes
+
+    def shard_image(ind):
+        shard_ind = np.searchsorted(shard_starts, ind, side='right') - 1
+        images, landmarks = shards[shard_ind]
+        img = Image.init_from_channels_at_back(images[ind - shard_starts[shard_ind]].astype('float32') / 255.)
+        img.landmarks['PTS'] = PointCloud(landmarks[ind - shard_starts[shard_ind]])
+        return img
+
+    return LazyList.init_from_index_callable(shard_image, int(np.sum(shard_sizes)))
@@ -1,20 +1,211 @@
 from __future__ import division
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from matplotlib.gridspec import GridSpec
+from contextlib import contextmanager
+from copy import deepcopy
 from time import time
+import threading
 import os
 
+from menpo.shape import PointCloud
+
 from menpofit.base import build_grid
-from menpofit.fitter import raise_costs_warning
+from menpofit.fitter import raise_costs_warning, ResponseMapImage
 from menpofit.result import ParametricIterativeResult
+from menpofit.clm.expert import FcnFilterExpertEnsemble
 
 import rspimage
 
 multivariate_normal = None  # expensive, from scipy.stats
 
-from scipy.stats import multivariate_normal
+
+def _import_multivariate_normal():
+    # Import multivariate normal distribution from scipy on first use
+    global multivariate_normal
+    if multivariate_normal is None:
+        from scipy.stats import multivariate_normal  # expensive
+
+
+class _FitContext(object):
+    # Mutable state of a single fit: a private copy of the shape model
+    # transform, and reusable buffers for the padded response maps and the
+    # patch responses. Contexts are reused across fits, but never shared by
+    # concurrent fits.
+    def __init__(self, transform):
+        self.transform = deepcopy(transform)
+        self.padded_maps = {}
+        self.response_buffers = {}
+
+    def response_buffer(self, n_points, grid_shape):
+        # (n_points, 1, h, w) buffer, one per search grid size
+        size = grid_shape[0]
+        if size not in self.response_buffers:
+            self.response_buffers[size] = np.empty((n_points, 1, size, size))
+        return self.response_buffers[size]
+
+    def pad_response_maps(self, image):
+        # Response maps of the image padded with (height / 2, width / 2)
+        # zeros, in a (1, n_points, 2 * height, 2 * width) buffer. The image is
+        # not modified.
+        height, width = image.shape
+        n_points = image.rspmap_data.shape[1]
+        key = (n_points, height, width)
+        if key not in self.padded_maps:
+            self.padded_maps[key] = np.zeros((1, n_points, 2 * height,
+                                              2 * width))
+        padded = self.padded_maps[key]
+        pad_h = int(height / 2)
+        pad_w = int(width / 2)
+        padded[0, :, pad_h:pad_h + height, pad_w:pad_w + width] = \
+            image.rspmap_data
+        return ResponseMapImage(image.shape, padded,
+                                path=getattr(image, 'path', None))
+
+
+class _FitContextPool(object):
+    # Thread-safe pool of fit contexts of an algorithm, which keeps the
+    # algorithm itself immutable after construction. A context is created
+    # only when all existing ones are in use.
+    def __init__(self, transform):
+        self._transform = transform
+        self._contexts = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            context = self._contexts.pop() if self._contexts else None
+        if context is None:
+            context = _FitContext(self._transform)
+        try:
+            yield context
+        finally:
+            with self._lock:
+                self._contexts.append(context)
+
+    def __getstate__(self):
+        return {'transform': self._transform}
+
+    def __setstate__(self, state):
+        self.__init__(state['transform'])
+
+
+class _TerminationStats(object):
+    # Counters of the adaptive early termination of fits: the number of fits,
+    # the number of iterations run and saved (wrt the maximum number of
+    # iterations), and the number of patch searches skipped for frozen
+    # landmarks. Each fit returns its own counters with its result, so the
+    # algorithm is not modified; the counters of several fits are summed
+    # with + (or sum()).
+    def __init__(self, n_fits=0, n_iters=0, n_iters_saved=0,
+                 n_patches_skipped=0):
+        self.n_fits = n_fits
+        self.n_iters = n_iters
+        self.n_iters_saved = n_iters_saved
+        self.n_patches_skipped = n_patches_skipped
+
+    def __add__(self, other):
+        return _TerminationStats(
+            self.n_fits + other.n_fits, self.n_iters + other.n_iters,
+            self.n_iters_saved + other.n_iters_saved,
+            self.n_patches_skipped + other.n_patches_skipped)
+
+    def __radd__(self, other):
+        # start value of sum()
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __str__(self):
+        return ('{} fits, {} iterations ({} saved), {} patch searches '
+                'skipped'.format(self.n_fits, self.n_iters, self.n_iters_saved,
+                                 self.n_patches_skipped))
+
+
+def _gather_batch_responses(rspmaps, face_inds, point_inds, origins,
+                            window_size):
+    # Gather the (window_size, window_size) windows of the landmarks point_inds
+    # of the faces face_inds (broadcast with each other and with the leading
+    # dimensions of origins) from the unpadded (n_points, height, width)
+    # response maps of each face, with an advanced index per face (the maps
+    # of the faces are not stacked). Windows are given by their top-left
+    # corners in maps padded by (height / 2, width / 2) zeros, and parts that
+    # fall in the padding are zero, as when gathering from the padded maps.
+    face_inds, point_inds = np.broadcast_arrays(face_inds, point_inds)
+    height, width = rspmaps[0].shape[-2:]
+    offsets = np.arange(window_size)
+    rows = origins[..., 0, None] - int(height / 2) + offsets
+    cols = origins[..., 1, None] - int(width / 2) + offsets
+    valid = (((rows >= 0) & (rows < height))[..., :, None] &
+             ((cols >= 0) & (cols < width))[..., None, :])
+    rows = np.clip(rows, 0, height - 1)
+    cols = np.clip(cols, 0, width - 1)
+    windows = np.empty(valid.shape, dtype=rspmaps[0].dtype)
+    for face in np.unique(face_inds):
+        mask = face_inds == face
+        windows[mask] = rspmaps[face][point_inds[mask][:, None, None],
+                                      rows[mask][:, :, None],
+                                      cols[mask][:, None, :]]
+    return np.where(valid, windows, 0.)[..., None, :, :]
+
+
+def _batch_evidence(patch_responses, rate, offset):
+    # Batched version of rspimage.calculate_evidence: the confidence of each
+    # landmark coordinate from the spread of its (N, n_points, 1, h, w)
+    # responses. Returns the (N, 2 * n_points) weights, and a (N, n_points)
+    # mask of the landmarks for which they can be computed (non-zero
+    # responses)
+    responses = patch_responses[:, :, 0]
+    y_weight = np.sum(responses, axis=-1)
+    x_weight = np.sum(responses, axis=-2)
+    prp = np.sum(responses, axis=(-1, -2))
+
+    def weighted_var(weight):
+        total = np.where(prp != 0, prp, 1.)[..., None]
+        coordinate = np.arange(weight.shape[-1])
+        mean = np.sum(coordinate * weight, axis=-1)[..., None] / total
+        return np.abs(np.sum((coordinate - mean) ** 2 * weight,
+                             axis=-1) / total[..., 0])
+
+    var = np.stack([weighted_var(y_weight), weighted_var(x_weight)], axis=-1)
+    var[var == 0] = np.finfo(float).eps
+    weight = np.repeat(prp, 2, axis=1) / np.sqrt(var.reshape(var.shape[0], -1))
+    return 1. / (1. + np.exp(-rate * (weight - offset))), prp != 0
+
+
+def _batch_pdm_targets(transform, params):
+    # Vectorised OrthoPDM reconstruction of the targets of (N, n_parameters)
+    # parameters: the model instance of the shape weights, aligned with the
+    # similarity that maps the model mean to the instance of the global
+    # weights (an exact similarity, so the alignment has a closed form)
+    n_global = transform.n_global_parameters
+    sim_model = transform.similarity_model
+    sim_mean = sim_model.instance_vector(np.zeros(n_global))
+    sim_instances = (sim_mean + params[:, :n_global].dot(
+        sim_model.components)).reshape(params.shape[0], -1, 2)
+    instances = (transform.model._mean + params[:, n_global:].dot(
+        transform.model.components)).reshape(params.shape[0], -1, 2)
+
+    source = transform.model.mean().points
+    source_mean = source.mean(axis=0)
+    source_c = source - source_mean
+    target_mean = sim_instances.mean(axis=1)
+    target_c = sim_instances - target_mean[:, None]
+    norm = np.sum(source_c ** 2)
+    a = np.sum(source_c * target_c, axis=(1, 2)) / norm
+    b = np.sum(source_c[:, 0] * target_c[..., 1] -
+               source_c[:, 1] * target_c[..., 0], axis=1) / norm
+    rotation = np.stack([np.stack([a, -b], axis=-1),
+                         np.stack([b, a], axis=-1)], axis=-2)
+    translation = target_mean - np.einsum('nij,j->ni', rotation, source_mean)
+    return np.einsum('nij,npj->npi', rotation, instances) + translation[:, None]
+
+
+def _batch_solve(J, weights, rhs_vector, prior):
+    # Solve the N weighted systems (J^T W_n J + diag(prior)) x_n = rhs_n
+    JWJ = np.einsum('ki,nk,kj->nij', J, weights, J)
+    JWJ[:, np.arange(J.shape[1]), np.arange(J.shape[1])] += prior
+    return np.linalg.solve(JWJ, rhs_vector[..., None])[..., 0]
+
 
 class GradientDescentCLMAlgorithm(object):
     r"""
@@ -29,6 +220,13 @@ class GradientDescentCLMAlgorithm(object):
         The shape model object, e.g. :map:`OrthoPDM`.
     eps : `float`, optional
         Value for checking the convergence of the optimization.
+
+    Notes
+    -----
+    The algorithm is not modified by fitting: the shape model transform is
+    only read, and the state of each fit (a copy of the transform and the
+    working buffers) is drawn from a pool of fit contexts. A single algorithm
+    can thus run concurrent fits from several threads.
     """
     def __init__(self, expert_ensemble, shape_model, eps=10**-5):
         # Set parameters
@@ -37,12 +235,12 @@ class GradientDescentCLMAlgorithm(object):
         self.eps = eps
         # Perform pre-computations
         self._precompute()
+        # Pool of per-fit states
+        self._fit_contexts = _FitContextPool(self.transform)
 
     def _precompute(self):
         # Import multivariate normal distribution from scipy
-        global multivariate_normal
-        if multivariate_normal is None:
-            from scipy.stats import multivariate_normal  # expensive
+        _import_multivariate_normal()
 
         # Build grid associated to size of the search space
         search_shape = self.expert_ensemble.search_shape
@@ -149,10 +347,16 @@ class ActiveShapeModel(GradientDescentCLMAlgorithm):
         if return_costs:
             raise_costs_warning(self)
 
+        with self._fit_contexts.acquire() as context:
+            return self._run(context.transform, image, initial_shape,
+                             gt_shape, max_iters, map_inference)
+
+    def _run(self, transform, image, initial_shape, gt_shape, max_iters,
+             map_inference):
         # Initialize transform
-        self.transform.set_target(initial_shape)
-        p_list = [self.transform.as_vector()]
-        shapes = [self.transform.target]
+        transform.set_target(initial_shape)
+        p_list = [transform.as_vector()]
+        shapes = [transform.target]
 
         # Initialize iteration counter and epsilon
         k = 0
@@ -161,7 +365,7 @@ class ActiveShapeModel(GradientDescentCLMAlgorithm):
         # Expectation-Maximisation loop
         while k < max_iters and eps > self.eps:
 
-            target = self.transform.target
+            target = transform.target
             # Obtain all landmark positions l_i = (x_i, y_i) being considered
             # ie all pixel positions in each landmark's search space
             candidate_landmarks = (target.points[:, None, None, None, :] +
@@ -190,20 +394,20 @@ class ActiveShapeModel(GradientDescentCLMAlgorithm):
 
             # Solve for increments on the shape parameters
             if map_inference:
-                Je = (self.rho2_inv_L * self.transform.as_vector() -
+                Je = (self.rho2_inv_L * transform.as_vector() -
                       self.J.T.dot(error))
                 dp = -self.inv_JJ_prior.dot(Je)
             else:
                 dp = self.pinv_J.dot(error)
 
             # Update pdm
-            s_k = self.transform.target.points
-            self.transform._from_vector_inplace(self.transform.as_vector() + dp)
-            p_list.append(self.transform.as_vector())
-            shapes.append(self.transform.target)
+            s_k = transform.target.points
+            transform._from_vector_inplace(transform.as_vector() + dp)
+            p_list.append(transform.as_vector())
+            shapes.append(transform.target)
 
             # Test convergence
-            eps = np.abs(np.linalg.norm(s_k - self.transform.target.points))
+            eps = np.abs(np.linalg.norm(s_k - transform.target.points))
 
             # Increase iteration counter
             k += 1
@@ -230,8 +434,21 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
         The shape model object, e.g. :map:`OrthoPDM`.
     kernel_covariance : `int` or `float`, optional
         The covariance of the kernel.
+    opt : `dict`, optional
+        The fitting options, e.g. ``numIter``, ``rho2``, ``pdm_rho``,
+        ``ratio1`` and ``ratio2``. Adaptive early termination is enabled by
+        ``landmark_tol`` and ``stop_tol`` (in pixels). Landmarks that move less
+        than ``landmark_tol`` in an iteration are frozen: they keep their last
+        mean shift target and weight, and are not searched anymore. The fit
+        stops when the landmark update, weighted by the landmark confidences,
+        is less than ``stop_tol``. Both are disabled if not set. The counters
+        of iterations and patch searches saved by each fit are returned in the
+        ``termination_stats`` of its result.
     eps : `float`, optional
         Value for checking the convergence of the optimization.
+    imgSize : `int`, optional
+        Unused. It is kept for backwards compatibility, as the padded response
+        maps are now allocated per image shape by the fit contexts.
 
     References
     ----------
@@ -245,9 +462,9 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
         self.kernel_idealmap = kernel_idealmap
         self.confidence_gama = confidence_gama
         self.opt = opt
+        _import_multivariate_normal()
         mvnideal = multivariate_normal(mean=np.zeros(2), cov=self.kernel_idealmap)
         self.ideal_response = mvnideal.pdf(build_grid((2 * 256, 2 * 256)))
-        self.rps_zeros = np.zeros((1, shape_model.n_points, 2*imgSize, 2*imgSize))
         #self.ideal_response = mvnideal.pdf(build_grid((2 * image.shape[0], 2 * image.shape[1])))
         super(RegularisedLandmarkMeanShift, self).__init__(
                 expert_ensemble=expert_ensemble, shape_model=shape_model,
@@ -293,12 +510,20 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
         Returns
         -------
         fitting_result : :map:`ParametricIterativeResult`
-            The parametric iterative fitting result.
+            The parametric iterative fitting result. The counters of its
+            adaptive early termination are set as its ``termination_stats``.
         """
         # costs warning
         if return_costs:
             raise_costs_warning(self)
 
+        with self._fit_contexts.acquire() as context:
+            return self._run(context, image, initial_shape, gt_shape,
+                             map_inference)
+
+    def _run(self, context, image, initial_shape, gt_shape, map_inference):
+        transform = context.transform
+
         patch_size = self.opt['ratio1']
         patch_size2 = self.opt['ratio2']
         search_ratio = [patch_size]*3+[patch_size2]*(self.opt['numIter']-3)
@@ -307,12 +532,8 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
         # np.save('/Users/arik/Desktop/test/map/' + image.path.name.rsplit('.', 1)[0], image.rspmap_data)
 
         timeFitStart = time()
-        # pad responsemaps with zeros
-        padH = int(image.shape[0]/2)
-        padW = int(image.shape[1]/2)
-        # image.rspmap_data = np.pad(image.rspmap_data, ((0, 0), (0, 0), (padH, padH), (padW, padW)), 'constant')
-        self.rps_zeros[0, :, padH:padH+image.shape[0], padW:padW+image.shape[1]] = image.rspmap_data
-        image.rspmap_data = self.rps_zeros
+        # pad responsemaps with zeros (in a buffer of the fit context)
+        padded_image = context.pad_response_maps(image)
         # cost = time() - timeFitStart
         timeFitStart = time()
 
@@ -328,42 +549,43 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
             search_grid = build_grid(np.array(search_ratio[0]*np.array(image.shape),int))
 
             # Compute patch responses
-            patch_responses = self.expert_ensemble.predict_probability(image,
-                                                                       initial_shape, search_grid.shape)
+            patch_responses = self.expert_ensemble.predict_probability(
+                padded_image, initial_shape, search_grid.shape,
+                out=context.response_buffer(numLandmarks, search_grid.shape))
 
             project_weight = rspimage.calculate_evidence(patch_responses, rate=self.confidence_gama, offset=self.kernel_idealmap).reshape((1,-1))
 
             # write project_weight
             inirho = self.opt['pdm_rho']
             # inirho = 0
-            ini_rho2_inv_prior = np.hstack((np.zeros((4,)), inirho / self.transform.model.eigenvalues))
+            ini_rho2_inv_prior = np.hstack((np.zeros((4,)), inirho / transform.model.eigenvalues))
 
-            initial_shape_mean = initial_shape.points.ravel() - self.transform.model._mean
+            initial_shape_mean = initial_shape.points.ravel() - transform.model._mean
             iniJe = - self.J.T.dot(initial_shape_mean * project_weight[0])
             iniJWJ = self.J.T.dot(np.diag(project_weight[0]).dot(self.J))
             inv_JJ = np.linalg.inv(iniJWJ + np.diag(ini_rho2_inv_prior))
             initial_p = -inv_JJ.dot(iniJe)  # self.inv_JJ_prior
 
             # Update pdm
-            self.transform._from_vector_inplace(initial_p)
-            # np.save('/Users/arik/Desktop/test/init_pdm/'+image.path.name.rsplit('.',1)[0], self.transform.target.points)
+            transform._from_vector_inplace(initial_p)
+            # np.save('/Users/arik/Desktop/test/init_pdm/'+image.path.name.rsplit('.',1)[0], transform.target.points)
         else:
-            self.transform.set_target(initial_shape)
+            transform.set_target(initial_shape)
 
         # Initialize transform
-        p_list = [self.transform.as_vector()]
+        p_list = [transform.as_vector()]
 
         #  check boundary
-        if np.any(self.transform.target.points < 0) or np.any(self.transform.target.points >= image.shape[0]):
-            self.transform.target.points[self.transform.target.points < 0] = 1
-            self.transform.target.points[self.transform.target.points >= image.shape[0]] = image.shape[0] - 2
-            self.transform.set_target(self.transform.target)
-            self.transform.target.points[self.transform.target.points < 0] = 1
-            self.transform.target.points[self.transform.target.points >= image.shape[0]] = image.shape[0] - 2
+        if np.any(transform.target.points < 0) or np.any(transform.target.points >= image.shape[0]):
+            transform.target.points[transform.target.points < 0] = 1
+            transform.target.points[transform.target.points >= image.shape[0]] = image.shape[0] - 2
+            transform.set_target(transform.target)
+            transform.target.points[transform.target.points < 0] = 1
+            transform.target.points[transform.target.points >= image.shape[0]] = image.shape[0] - 2
             # print image.path.name
             # print 'out of bound'
 
-        shapes = [self.transform.target]
+        shapes = [transform.target]
 
         # tuning step
         # Initialize iteration counter and epsilon
@@ -379,27 +601,43 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
             max_iters = 10
 
         rho2 = self.opt['rho2']
+        landmark_tol, stop_tol = self._termination_tolerances()
+
+        # landmarks that are still searched (not frozen), and the mean shift targets and weights of all landmarks
+        # (frozen landmarks keep the ones of their last search)
+        active = np.arange(numLandmarks)
+        mean_shift_points = np.zeros((numLandmarks, 2))
+        kernel_covariance = np.ones(2 * numLandmarks)
+        n_patches_skipped = 0
+        stop = False
+
         # timeFitStart = time()
-        while k < max_iters and eps > self.eps:
+        while k < max_iters and eps > self.eps and not stop:
 
-            #target = self.transform.target
+            #target = transform.target
             target = shapes[k]
 
             search_grid = build_grid(np.array(search_ratio[k]*np.array(image.shape),int))
 
             # search_grid = self.search_grid *np.array(image.shape, dtype=np.float32)/np.array(image.rspmap_data.shape)[-2:-1]
 
-            candidate_landmarks = (target.points[:, None, None, None, :] +
+            target_active = target.points[active]
+            candidate_landmarks = (target_active[:, None, None, None, :] +
                                    search_grid)
+            n_patches_skipped += numLandmarks - len(active)
 
-            # Compute patch responses
-            patch_responses = self.expert_ensemble.predict_probability(image,
-                                                                       target, search_grid.shape)
+            # Compute patch responses (of the landmarks that are not frozen)
+            patch_responses = self.expert_ensemble.predict_probability(
+                padded_image, PointCloud(target_active), search_grid.shape,
+                out=context.response_buffer(numLandmarks,
+                                            search_grid.shape)[:len(active)],
+                landmarks=active)
 
             if weighted_meanshift:
-                kernel_covariance = rspimage.calculate_evidence(patch_responses, rate=self.confidence_gama, offset=self.kernel_idealmap)
+                active_covariance = rspimage.calculate_evidence(patch_responses, rate=self.confidence_gama, offset=self.kernel_idealmap)
             else:
-                kernel_covariance = np.ones(2*patch_responses.shape[0])
+                active_covariance = np.ones(2*patch_responses.shape[0])
+            kernel_covariance.reshape(-1, 2)[active] = active_covariance.reshape(-1, 2)
 
             try:
                 smooth_rspmap = self.opt['smooth']
@@ -411,10 +649,10 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
                     patch_responses /= np.sum(patch_responses,
                                        axis=(-2, -1))[..., None, None]
                 except:
-                    print image.path.name
+                    print(image.path.name)
                     print('Normalize fail.')
 
-                mvnList = [multivariate_normal(mean=np.zeros(2), cov=2.0*rho2/(kernel_covariance[2*i] + kernel_covariance[2*i+1])) for i in range(patch_responses.shape[0])]
+                mvnList = [multivariate_normal(mean=np.zeros(2), cov=2.0*rho2/(active_covariance[2*i] + active_covariance[2*i+1])) for i in range(patch_responses.shape[0])]
                 kernel_grid = np.array([mvnList[i].pdf(search_grid)[None] for i in range(patch_responses.shape[0])])
 
                 patch_kernels = patch_responses * kernel_grid
@@ -428,37 +666,38 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
             # Compute mean shift target
             mean_shift_target = np.sum(patch_kernels[..., None] *
                                        candidate_landmarks, axis=(-3, -2))
+            mean_shift_points[active] = mean_shift_target[:, 0]
 
             # Compute shape error term
-            error = mean_shift_target.ravel() - target.as_vector()
+            error = mean_shift_points.ravel() - target.as_vector()
             errSum.append(np.sum(np.abs(error)))
             # error = error
 
             # Solve for increments on the shape parameters
             if map_inference:
                 '''
-                Je = (self.rho2_inv_L * self.transform.as_vector() -
+                Je = (self.rho2_inv_L * transform.as_vector() -
                       self.J.T.dot(error))
                 # inv_JJ_prior = np.linalg.inv(self.JJ + np.diag(self.rho2_inv_L))
                 dp = -self.inv_JJ_prior.dot(Je)     #self.inv_JJ_prior
                 '''
-                Je = (self.rho2_inv_L * self.transform.as_vector() -
+                Je = (self.rho2_inv_L * transform.as_vector() -
                       self.J.T.dot(error*kernel_covariance))
                 JWJ = self.J.T.dot(np.diag(kernel_covariance).dot(self.J))
                 inv_JJ_prior = np.linalg.inv(JWJ + np.diag(self.rho2_inv_L))
                 dp = -inv_JJ_prior.dot(Je)  # self.inv_JJ_prior
                 '''
                 sim_prior = np.zeros((4,))
-                pdm_prior = rho2 / self.transform.model.eigenvalues
+                pdm_prior = rho2 / transform.model.eigenvalues
                 rho2_inv_L = np.hstack((sim_prior, pdm_prior))
-                Je = (rho2_inv_L * self.transform.as_vector() -
+                Je = (rho2_inv_L * transform.as_vector() -
                       self.J.T.dot(error*kernel_covariance))
                 JWJ = self.J.T.dot(np.diag(kernel_covariance).dot(self.J))
                 inv_JJ_prior = np.linalg.inv(JWJ + np.diag(rho2_inv_L))
                 dp = -inv_JJ_prior.dot(Je)  # self.inv_JJ_prior
                 '''
             else:
-                J = np.rollaxis(self.transform.d_dp(target.points), -1, 1)
+                J = np.rollaxis(transform.d_dp(target.points), -1, 1)
                 J = J.reshape((-1, J.shape[-1]))
                 JJ = J.T.dot(np.diag(kernel_covariance**2).dot(J))
                 # Compute Jacobian pseudo-inverse
@@ -467,21 +706,31 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
                 print('notMAP')
 
             # Update pdm
-            s_k = self.transform.target.points
-            self.transform._from_vector_inplace(self.transform.as_vector() + dp)
-            if np.any(self.transform.target.points<0) or np.any(self.transform.target.points>=image.shape[0]):
-                self.transform.target.points[self.transform.target.points<0] =1
-                self.transform.target.points[self.transform.target.points>=image.shape[0]] = image.shape[0]-2
-                self.transform.set_target(self.transform.target)
-                self.transform.target.points[self.transform.target.points < 0] = 1
-                self.transform.target.points[self.transform.target.points >= image.shape[0]] = image.shape[0] - 2
-
-            p_list.append(self.transform.as_vector())
-            shapes.append(self.transform.target)
+            s_k = transform.target.points
+            transform._from_vector_inplace(transform.as_vector() + dp)
+            if np.any(transform.target.points<0) or np.any(transform.target.points>=image.shape[0]):
+                transform.target.points[transform.target.points<0] =1
+                transform.target.points[transform.target.points>=image.shape[0]] = image.shape[0]-2
+                transform.set_target(transform.target)
+                transform.target.points[transform.target.points < 0] = 1
+                transform.target.points[transform.target.points >= image.shape[0]] = image.shape[0] - 2
+
+            p_list.append(transform.as_vector())
+            shapes.append(transform.target)
 
             # Test convergence
-            eps = np.abs(np.linalg.norm(s_k - self.transform.target.points))
+            eps = np.abs(np.linalg.norm(s_k - transform.target.points))
             epsList.append(eps)
+
+            # Freeze converged landmarks, and stop if the weighted landmark update is small enough
+            displacement = np.linalg.norm(transform.target.points - s_k, axis=1)
+            if landmark_tol is not None:
+                active = active[displacement[active] >= landmark_tol]
+                stop = len(active) == 0
+            if stop_tol is not None:
+                landmark_weight = kernel_covariance[0::2] + kernel_covariance[1::2]
+                stop = stop or np.sum(landmark_weight * displacement) < stop_tol * np.sum(landmark_weight)
+
             # Increase iteration counter
             k += 1
 
@@ -491,6 +740,7 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
         visualize = self.opt['verbose']
 
         if visualize:
+            import matplotlib.pyplot as plt
             # wrFilebase = self.opt['imgDir']
             # wrFilebase = '../'
 
@@ -504,11 +754,271 @@ class RegularisedLandmarkMeanShift(GradientDescentCLMAlgorithm):
             plt.pause(0.05)
 
             # plt.savefig(wrFilebase + '/output/' + image.path.stem + '.png')
-        # np.save('/Users/arik/Desktop/test/ect/' + image.path.name.rsplit('.', 1)[0], self.transform.target.points)
+        # np.save('/Users/arik/Desktop/test/ect/' + image.path.name.rsplit('.', 1)[0], transform.target.points)
+
+        result = ParametricIterativeResult(shapes=shapes, shape_parameters=p_list,
+                                           initial_shape=initial_shape,   #image.landmarks['__initial_shape'] initial_shape
+                                           image=image, gt_shape=gt_shape, costs=cost)
+        result.termination_stats = _TerminationStats(1, k, max_iters - k, n_patches_skipped)
+        return result
+
+    def _termination_tolerances(self):
+        # Pixel tolerances of the adaptive early termination (landmark
+        # freezing, global stop), disabled if not set in opt
+        return self.opt.get('landmark_tol'), self.opt.get('stop_tol')
+
+    def _clip_batch_target(self, transform, params, image_size):
+        # Boundary check of run() for a single face: clip the target to the
+        # image, project it onto the model and clip the projection
+        transform._from_vector_inplace(params)
+        target = transform.target
+        target.points[target.points < 0] = 1
+        target.points[target.points >= image_size] = image_size - 2
+        transform.set_target(target)
+        transform.target.points[transform.target.points < 0] = 1
+        transform.target.points[transform.target.points >= image_size] = \
+            image_size - 2
+        return transform.as_vector(), transform.target.points.copy()
+
+    def run_batch(self, images, initial_shapes, gt_shapes=None, max_iters=20,
+                  return_costs=False, map_inference=True):
+        r"""
+        Execute the optimization algorithm on a batch of images in lockstep.
+        The state of all faces is kept in ``(n_images, n_points, 2)`` arrays,
+        the patch responses of all faces are gathered at once, and the
+        evidence, kernels, mean-shift targets and parameter updates are
+        computed on batched arrays. The responses are read from the response
+        maps of the images, so only :map:`FcnFilterExpertEnsemble` experts are
+        supported. Faces that have converged are masked out
+        of subsequent iterations, and so are the landmarks frozen by adaptive
+        early termination (see ``opt``). The result of each face matches the
+        result of :meth:`run`, but the response maps of the images are not
+        modified.
 
-        return ParametricIterativeResult(shapes=shapes, shape_parameters=p_list,
-                                         initial_shape=initial_shape,   #image.landmarks['__initial_shape'] initial_shape
-                                         image=image, gt_shape=gt_shape, costs=cost)
+        Parameters
+        ----------
+        images : `list` of `menpo.image.Image`
+            The input test images, all of the same shape, with response maps
+            (``rspmap_data``).
+        initial_shapes : `list` of `menpo.shape.PointCloud`
+            The initial shape of each image.
+        gt_shapes : `list` of `menpo.shape.PointCloud` or ``None``, optional
+            The ground truth shape of each image.
+        max_iters : `int`, optional
+            The maximum number of iterations, used if ``opt`` does not set
+            ``numIter``.
+        return_costs : `bool`, optional
+            Has no effect; see :meth:`run`.
+        map_inference : `bool`, optional
+            Only MAP inference is supported in batch mode.
+
+        Returns
+        -------
+        fitting_results : `list` of :map:`ParametricIterativeResult` or ``None``
+            The fitting result of each image, with the counters of its
+            adaptive early termination as its ``termination_stats``. It is
+            ``None`` for faces with all-zero responses of some searched
+            landmark, for which :meth:`run` raises.
+        """
+        if return_costs:
+            raise_costs_warning(self)
+        if not map_inference:
+            raise ValueError('Only MAP inference is supported in batch mode')
+        if not isinstance(self.expert_ensemble, FcnFilterExpertEnsemble):
+            raise ValueError('Only FcnFilterExpertEnsemble experts are '
+                             'supported in batch mode')
+        with self._fit_contexts.acquire() as context:
+            return self._run_batch(context.transform, images, initial_shapes,
+                                   gt_shapes, max_iters)
+
+    def _run_batch(self, transform, images, initial_shapes, gt_shapes,
+                   max_iters):
+        image_shape = images[0].shape
+        if any(image.shape != image_shape for image in images):
+            raise ValueError('All images of a batch must have the same shape')
+        if gt_shapes is None:
+            gt_shapes = [None] * len(images)
+
+        search_ratio = ([self.opt['ratio1']] * 3 +
+                        [self.opt['ratio2']] * (self.opt['numIter'] - 3))
+        try:
+            weighted_project, weighted_meanshift = self.opt['ablation'][:2]
+        except:
+            weighted_project, weighted_meanshift = True, True
+        try:
+            smooth_rspmap = self.opt['smooth']
+        except:
+            smooth_rspmap = True
+        try:
+            max_iters = self.opt['numIter']
+        except:
+            pass
+        rho2 = self.opt['rho2']
+
+        time_fit_start = time()
+        # (n_points, height, width) response maps of each face
+        rspmaps = [image.rspmap_data[0] for image in images]
+        n_faces = len(images)
+        pad = np.array([int(image_shape[0] / 2), int(image_shape[1] / 2)])
+        failed = np.zeros(n_faces, dtype=bool)
+
+        def patch_responses_at(face_inds, point_inds, targets, search_shape):
+            origins = (np.around(targets + 1 + pad).astype(int) -
+                       search_shape[0] // 2)
+            return _gather_batch_responses(rspmaps, face_inds, point_inds,
+                                           origins, search_shape[0])
+
+        def clip_to_image(face_inds, params, targets):
+            out_of_bounds = np.any((targets < 0) |
+                                   (targets >= image_shape[0]), axis=(1, 2))
+            for i in np.nonzero(out_of_bounds)[0]:
+                params[i], targets[i] = self._clip_batch_target(
+                    transform, params[i], image_shape[0])
+
+        initial_points = np.array([shape.points for shape in initial_shapes])
+        if weighted_project:
+            # Correction step
+            search_grid = build_grid(np.array(
+                search_ratio[0] * np.array(image_shape), int))
+            patch_responses = patch_responses_at(
+                np.arange(n_faces)[:, None],
+                np.arange(initial_points.shape[1])[None], initial_points,
+                search_grid.shape)
+            project_weight, nonzero = _batch_evidence(
+                patch_responses, self.confidence_gama, self.kernel_idealmap)
+            failed |= ~np.all(nonzero, axis=1)
+
+            ini_rho2_inv_prior = np.hstack((
+                np.zeros((4,)),
+                self.opt['pdm_rho'] / self.transform.model.eigenvalues))
+            initial_shape_mean = (initial_points.reshape(n_faces, -1) -
+                                  self.transform.model._mean)
+            params = _batch_solve(self.J, project_weight,
+                                  (initial_shape_mean * project_weight).dot(
+                                      self.J), ini_rho2_inv_prior)
+            targets = _batch_pdm_targets(self.transform, params)
+        else:
+            params = np.zeros((n_faces, self.J.shape[1]))
+            targets = np.zeros_like(initial_points)
+            for i, shape in enumerate(initial_shapes):
+                transform.set_target(shape)
+                params[i] = transform.as_vector()
+                targets[i] = transform.target.points
+        # the recorded initial parameters are the ones before the boundary check
+        params_list = [[p] for p in params.copy()]
+        clip_to_image(np.arange(n_faces), params, targets)
+        shapes_list = [[PointCloud(t)] for t in targets]
+
+        # Tuning step. Frozen landmarks (see run()) keep the mean shift targets
+        # and weights of their last search, and are not searched anymore: the
+        # searched landmarks of all faces are gathered as (face, landmark)
+        # pairs, each processed as a face of a single landmark.
+        landmark_tol, stop_tol = self._termination_tolerances()
+        frozen = np.zeros(targets.shape[:2], dtype=bool)
+        mean_shift_points = np.zeros_like(targets)
+        weights = np.ones((n_faces, 2 * targets.shape[1]))
+        n_patches_skipped = np.zeros(n_faces, dtype=int)
+        active = ~failed
+        k = 0
+        while k < max_iters and np.any(active):
+            face_inds = np.nonzero(active)[0]
+            prev_targets = targets[face_inds]
+            search_grid = build_grid(np.array(
+                search_ratio[k] * np.array(image_shape), int))
+
+            searched = ~frozen[face_inds]
+            n_patches_skipped[face_inds] += np.sum(~searched, axis=1)
+            pair_faces, pair_points = np.nonzero(searched)
+            pair_targets = prev_targets[pair_faces, pair_points][:, None]
+            patch_responses = patch_responses_at(
+                face_inds[pair_faces][:, None], pair_points[:, None],
+                pair_targets, search_grid.shape)
+            if weighted_meanshift:
+                kernel_covariance, nonzero = _batch_evidence(
+                    patch_responses, self.confidence_gama,
+                    self.kernel_idealmap)
+            else:
+                kernel_covariance = np.ones((len(pair_faces), 2))
+                nonzero = np.sum(patch_responses, axis=(-2, -1))[..., 0] != 0
+            valid = np.ones(len(face_inds), dtype=bool)
+            valid[pair_faces[~nonzero[:, 0]]] = False
+
+            # zero responses of failed faces are discarded
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if smooth_rspmap:
+                    patch_responses /= np.sum(patch_responses,
+                                              axis=(-2, -1))[..., None, None]
+                    # isotropic gaussian kernel per landmark
+                    cov = 2.0 * rho2 / (kernel_covariance[:, 0::2] +
+                                        kernel_covariance[:, 1::2])
+                    sq_dist = np.sum(search_grid ** 2, axis=-1)
+                    kernel_grid = (
+                        np.exp(-0.5 * sq_dist / cov[..., None, None]) /
+                        (2 * np.pi * cov[..., None, None]))
+                    patch_kernels = patch_responses * kernel_grid[:, :, None]
+                else:
+                    patch_kernels = patch_responses
+                patch_kernels /= np.sum(patch_kernels,
+                                        axis=(-2, -1))[..., None, None]
+
+            # Mean shift targets: kernel-weighted mean of candidate landmarks
+            patch_kernels = patch_kernels[:, :, 0]
+            mean_shift_target = (
+                pair_targets * np.sum(patch_kernels, axis=(-2, -1))[..., None] +
+                np.einsum('nphw,hwd->npd', patch_kernels, search_grid))
+            pair_faces = face_inds[pair_faces]
+            mean_shift_points[pair_faces, pair_points] = mean_shift_target[:, 0]
+            weights.reshape(n_faces, -1, 2)[pair_faces, pair_points] = \
+                kernel_covariance
+            kernel_covariance = weights[face_inds]
+            error = (mean_shift_points[face_inds] - prev_targets).reshape(
+                len(face_inds), -1)
+
+            p = params[face_inds]
+            Je = (self.rho2_inv_L * p -
+                  (error * kernel_covariance).dot(self.J))
+            dp = -_batch_solve(self.J, kernel_covariance, Je, self.rho2_inv_L)
+
+            new_params = p + dp
+            new_targets = _batch_pdm_targets(self.transform, new_params)
+            clip_to_image(face_inds, new_params, new_targets)
+
+            # Faces with zero responses would raise in run(), drop them
+            failed[face_inds[~valid]] = True
+            params[face_inds] = new_params
+            targets[face_inds] = new_targets
+            eps = np.linalg.norm((prev_targets - new_targets).reshape(
+                len(face_inds), -1), axis=1)
+            for i, face in enumerate(face_inds):
+                params_list[face].append(new_params[i])
+                shapes_list[face].append(PointCloud(new_targets[i]))
+
+            # Freeze converged landmarks, and stop faces whose weighted
+            # landmark update is small enough
+            displacement = np.linalg.norm(new_targets - prev_targets, axis=2)
+            stop = np.zeros(len(face_inds), dtype=bool)
+            if landmark_tol is not None:
+                frozen[face_inds] |= displacement < landmark_tol
+                stop |= np.all(frozen[face_inds], axis=1)
+            if stop_tol is not None:
+                landmark_weight = (kernel_covariance[:, 0::2] +
+                                   kernel_covariance[:, 1::2])
+                stop |= (np.sum(landmark_weight * displacement, axis=1) <
+                         stop_tol * np.sum(landmark_weight, axis=1))
+            active[face_inds[(eps <= self.eps) | ~valid | stop]] = False
+            k += 1
+
+        cost = [time() - time_fit_start]
+        results = [None] * n_faces
+        for i in np.nonzero(~failed)[0]:
+            results[i] = ParametricIterativeResult(
+                shapes=shapes_list[i], shape_parameters=params_list[i],
+                initial_shape=initial_shapes[i], image=images[i],
+                gt_shape=gt_shapes[i], costs=cost)
+            n_iters = len(params_list[i]) - 1
+            results[i].termination_stats = _TerminationStats(
+                1, n_iters, max_iters - n_iters, n_patches_skipped[i])
+        return results
 
     def __str__(self):
         return "Weighted Regularized Mean Shift"
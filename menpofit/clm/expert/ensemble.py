@@ -1,7 +1,9 @@
 from __future__ import division
+import os
 from functools import partial
+from multiprocessing import Pool
 import numpy as np
-from scipy.stats import multivariate_normal
+from numpy.lib.stride_tricks import as_strided
 
 from menpo.feature import normalize_norm
 from menpo.shape import PointCloud
@@ -126,59 +128,62 @@ class FcnFilterExpertEnsemble(ExpertEnsemble):
         """
         return self.patch_shape
 
-    def predict_response(self, image, shape, grid):
+    def predict_response(self, image, shape, grid, out=None, landmarks=None):
         r"""
         Method for predicting the response of the experts on a given image.
+        The response of each expert is the window of the (padded) response map
+        of its landmark, centered at the rounded landmark location.
 
         Parameters
         ----------
         image : `menpo.image.Image` or `subclass`
-            The test image.
+            The test image. Its padded response maps are read from
+            ``image.rspmap_data``.
         shape : `menpo.shape.PointCloud`
             The shape that corresponds to the image from which the patches
             will be extracted.
+        grid : `tuple` of `int`
+            The search grid shape. Windows of size ``(grid[0], grid[0])``
+            are extracted.
+        out : ``(n_points, 1, grid[0], grid[0])`` `ndarray` or ``None``, optional
+            Output buffer for the responses. If ``None``, a new array is
+            allocated.
+        landmarks : ``(n_points,)`` `ndarray` of `int` or ``None``, optional
+            The indices of the experts (landmarks) of the points of `shape`. If
+            ``None``, then `shape` has a point per expert.
 
         Returns
         -------
-        response : ``(n_experts, 1, height, width)`` `ndarray`
+        response : ``(n_points, 1, height, width)`` `ndarray`
             The response of each expert.
         """
-        # Predict responses
-        '''
-        rOffset = self.patch_shape[0]/2
-        lOffset = self.patch_shape[0] - rOffset
-        ratioW = image.shape[-1]/image.rspmap_data.shape[-1]
-        ratioH = image.shape[-2]/image.rspmap_data.shape[-2]
-        '''
-        '''
-        rspList = [image.rspmap_data[0, i, y-rOffset:y+lOffset, x-rOffset:x+lOffset]  for i in range(shape.n_points)
-                                          for y in [np.around(shape.points[i][0]/ratioH+0.5)]
-                                          for x in [np.around(shape.points[i][1]/ratioW+0.5)]]
-        '''
-        rOffset = np.floor(grid[0]/2).astype(int)
-        lOffset = grid[0] - rOffset
-        padH = int(image.shape[0]/2)
-        padW = int(image.shape[1]/2)
-        rspList = [image.rspmap_data[0, i, y-rOffset:y+lOffset, x-rOffset:x+lOffset]  for i in range(shape.n_points)
-                                          for y in [np.around(shape.points[i][0]+1+padH).astype(int)]
-                                          for x in [np.around(shape.points[i][1]+1+padW).astype(int)]]
-
-        # debug mode:   ValueError: resize only works on single-segment arrays
-        '''
-        responses = []
-        for i in rspList:
-            #i_resize = np.array(i)
-            #i_resize.resize((15, 15))
-            i = np.array(i)
-            i.resize(self.patch_shape)
-            responses.append(i)
-        '''
-        responses = np.array(rspList)[:, None, :, :]
-
-        return responses
-
-
-    def predict_probability(self, image, shape, grid):
+        rsp_maps = image.rspmap_data[0]
+        if landmarks is None:
+            landmarks = np.arange(shape.n_points)
+        window_size = int(grid[0])
+        pad = np.array([int(image.shape[0] / 2), int(image.shape[1] / 2)])
+
+        # Top-left corner of the window of each landmark in the padded maps
+        origins = (np.around(shape.points + 1 + pad).astype(int) -
+                   window_size // 2)
+
+        # Strided view of all windows of all maps:
+        # (n_points, n_rows, n_cols, window_size, window_size)
+        n_maps, height, width = rsp_maps.shape
+        windows = as_strided(
+            rsp_maps, shape=(n_maps, height - window_size + 1,
+                             width - window_size + 1, window_size,
+                             window_size),
+            strides=rsp_maps.strides + rsp_maps.strides[1:])
+
+        if out is None:
+            out = np.empty((shape.n_points, 1, window_size, window_size),
+                           dtype=rsp_maps.dtype)
+        out[:, 0] = windows[landmarks, origins[:, 0], origins[:, 1]]
+        return out
+
+    def predict_probability(self, image, shape, grid, out=None,
+                            landmarks=None):
         r"""
         Method for predicting the probability map of the response experts on a
         given image. Note that the provided shape must have the same number of
@@ -191,14 +196,22 @@ class FcnFilterExpertEnsemble(ExpertEnsemble):
         shape : `menpo.shape.PointCloud`
             The shape that corresponds to the image from which the patches
             will be extracted.
+        grid : `tuple` of `int`
+            The search grid shape.
+        out : ``(n_points, 1, grid[0], grid[0])`` `ndarray` or ``None``, optional
+            Output buffer for the responses. If ``None``, a new array is
+            allocated.
+        landmarks : ``(n_points,)`` `ndarray` of `int` or ``None``, optional
+            The indices of the experts (landmarks) of the points of `shape`. If
+            ``None``, then `shape` has a point per expert.
 
         Returns
         -------
-        probability_map : ``(n_experts, 1, height, width)`` `ndarray`
+        probability_map : ``(n_points, 1, height, width)`` `ndarray`
             The probability map of the response of each expert.
         """
-
-        return self.predict_response(image, shape, grid)
+        return self.predict_response(image, shape, grid, out=out,
+                                     landmarks=landmarks)
         # Turn them into proper probability maps
         #return probability_map(responses)
 
@@ -437,6 +450,14 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
     verbose : `bool`, optional
         If ``True``, then information will be printed regarding the training
         progress.
+    n_jobs : `int` or ``None``, optional
+        The number of processes that train the experts in parallel. If ``1``,
+        then the experts are trained in the current process. If ``None``, then
+        the number of CPUs is used.
+    patches_path : `str` or ``None``, optional
+        If provided, then the training patches of all the experts are stored
+        in a memory-mapped ``.npy`` file at this path, instead of in memory.
+        The file is deleted after training.
     """
     def __init__(self, images, shapes,
                  icf_cls=IncrementalCorrelationFilterThinWrapper,
@@ -444,7 +465,7 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
                  response_covariance=3,
                  patch_normalisation=channel_normalize_norm,
                  cosine_mask=True, sample_offsets=None, prefix='',
-                 verbose=False):
+                 verbose=False, n_jobs=1, patches_path=None):
         # TODO: check parameters?
         # Set parameters
         self._icf = icf_cls()
@@ -454,6 +475,8 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
         self.patch_normalisation = patch_normalisation
         self.cosine_mask = cosine_mask
         self.sample_offsets = sample_offsets
+        self.n_jobs = n_jobs
+        self.patches_path = patches_path
 
         # Generate cosine mask
         self._cosine_mask = generate_cosine_mask(self.context_shape)
@@ -466,6 +489,12 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
         # Train ensemble of correlation filter experts
         self._train(images, shapes, verbose=verbose, prefix=prefix)
 
+    def __setstate__(self, state):
+        # Ensembles pickled before parallel training was added
+        state.setdefault('n_jobs', 1)
+        state.setdefault('patches_path', None)
+        self.__dict__.update(state)
+
     def _extract_patch(self, image, landmark):
         # Extract patch from image
         patch = image.extract_patches(
@@ -481,6 +510,48 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
             patch = self._cosine_mask * patch
         return patch
 
+    def _extract_image_patches(self, image, shape):
+        # Extract the patches of all landmarks with a single call
+        patches = image.extract_patches(
+            shape, patch_shape=self.context_shape,
+            sample_offsets=self.sample_offsets, as_single_array=True)
+        # Reshape patches
+        # patches: n_patches x (n_offsets x n_channels) x h x w
+        patches = patches.reshape((patches.shape[0], -1) + patches.shape[-2:])
+        # Normalise each patch separately, as in _extract_patch
+        patches = np.array([self.patch_normalisation(p) for p in patches])
+        if self.cosine_mask:
+            # Apply cosine mask if required
+            patches = self._cosine_mask * patches
+        return patches
+
+    def _extract_training_patches(self, images, shapes, prefix='',
+                                  verbose=False):
+        # Define print_progress partial
+        wrap = partial(print_progress,
+                       prefix='{}Extracting patches'.format(prefix),
+                       end_with_newline=not prefix,
+                       verbose=verbose)
+
+        # The patches of each image are extracted once, and stored into a
+        # preallocated (n_experts, n_images, n_channels, h, w) array, so
+        # that the patches of each expert are a contiguous slice
+        patches = None
+        for j, (image, shape) in enumerate(wrap(list(zip(images, shapes)))):
+            image_patches = self._extract_image_patches(image, shape)
+            if patches is None:
+                patches_shape = ((image_patches.shape[0], len(images)) +
+                                 image_patches.shape[1:])
+                if self.patches_path is None:
+                    patches = np.empty(patches_shape,
+                                       dtype=image_patches.dtype)
+                else:
+                    patches = np.lib.format.open_memmap(
+                        self.patches_path, mode='w+',
+                        dtype=image_patches.dtype, shape=patches_shape)
+            patches[:, j] = image_patches
+        return patches
+
     def _train(self, images, shapes, prefix='', verbose=False,
                increment=False):
         # Define print_progress partial
@@ -505,43 +576,49 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
         # Obtain total number of experts
         n_experts = shapes[0].n_points
 
+        # Extract the patches of all experts, with a single pass over the
+        # images
+        patches = self._extract_training_patches(images, shapes,
+                                                 prefix=prefix,
+                                                 verbose=verbose)
+        if self.patches_path is not None:
+            # Workers read the expert slices from the file
+            patches.flush()
+            del patches
+            patches = np.load(self.patches_path, mmap_mode='r')
+
         # Train ensemble of correlation filter experts
-        fft_padded_filters = []
-        auto_correlations = []
-        cross_correlations = []
-        for i in wrap(range(n_experts)):
-            patches = []
-            for image, shape in zip(images, shapes):
-                # Select the appropriate landmark
-                landmark = PointCloud([shape.points[i]])
-                # Extract patch
-                patch = self._extract_patch(image, landmark)
-                # Add patch to the list
-                patches.append(patch)
-
-            if increment:
-                # Increment correlation filter
-                correlation_filter, auto_correlation, cross_correlation = (
-                    self._icf.increment(self.auto_correlations[i],
-                                        self.cross_correlations[i],
-                                        self.n_images,
-                                        patches,
-                                        self.response))
+        if increment:
+            tasks = [(i, self.auto_correlations[i], self.cross_correlations[i],
+                      self.n_images) for i in range(n_experts)]
+        else:
+            tasks = [(i, None, None, None) for i in range(n_experts)]
+        pool = None
+        if self.n_jobs is None or self.n_jobs > 1:
+            pool = Pool(processes=self.n_jobs, initializer=_init_expert_worker,
+                        initargs=(self._icf, patches, self.response,
+                                  self.padded_size))
+        else:
+            _init_expert_worker(self._icf, patches, self.response,
+                                self.padded_size)
+        try:
+            if pool is None:
+                experts = [_train_expert(task) for task in wrap(tasks)]
             else:
-                # Train correlation filter
-                correlation_filter, auto_correlation, cross_correlation = (
-                    self._icf.train(patches, self.response))
-
-            # Pad filter with zeros
-            padded_filter = pad(correlation_filter, self.padded_size)
-            # Compute fft of padded filter
-            fft_padded_filter = fft2(padded_filter)
-            # Add fft padded filter to list
-            fft_padded_filters.append(fft_padded_filter)
-            auto_correlations.append(auto_correlation)
-            cross_correlations.append(cross_correlation)
+                experts = list(wrap(pool.imap(_train_expert, tasks),
+                                    n_items=n_experts))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _init_expert_worker(None, None, None, None)
+            del patches
+            if self.patches_path is not None:
+                os.remove(self.patches_path)
 
         # Turn list into ndarray
+        fft_padded_filters, auto_correlations, cross_correlations = zip(
+            *experts)
         self.fft_padded_filters = np.asarray(fft_padded_filters)
         self.auto_correlations = np.asarray(auto_correlations)
         self.cross_correlations = np.asarray(cross_correlations)
@@ -565,6 +642,38 @@ class CorrelationFilterExpertEnsemble(ConvolutionBasedExpertEnsemble):
         return cls_str
 
 
+# Training state of the expert worker processes. It is set once per process
+# by the pool initializer, so that the (possibly memory-mapped) patches array
+# is not sent with every task.
+_expert_worker = {}
+
+
+def _init_expert_worker(icf, patches, response, padded_size):
+    _expert_worker['icf'] = icf
+    _expert_worker['patches'] = patches
+    _expert_worker['response'] = response
+    _expert_worker['padded_size'] = padded_size
+
+
+def _train_expert(task):
+    i, auto_correlation, cross_correlation, n_images = task
+    icf = _expert_worker['icf']
+    # Patches of the i-th expert: n_images x n_channels x h x w
+    patches = np.asarray(_expert_worker['patches'][i])
+    if auto_correlation is not None:
+        # Increment correlation filter
+        correlation_filter, auto_correlation, cross_correlation = (
+            icf.increment(auto_correlation, cross_correlation, n_images,
+                          patches, _expert_worker['response']))
+    else:
+        # Train correlation filter
+        correlation_filter, auto_correlation, cross_correlation = (
+            icf.train(patches, _expert_worker['response']))
+    # Pad filter with zeros and compute its fft
+    padded_filter = pad(correlation_filter, _expert_worker['padded_size'])
+    return fft2(padded_filter), auto_correlation, cross_correlation
+
+
 def generate_gaussian_response(patch_shape, response_covariance):
     r"""
     Method that generates a Gaussian response (probability density function)
@@ -582,6 +691,7 @@ def generate_gaussian_response(patch_shape, response_covariance):
     pdf : ``(patch_height, patch_width)`` `ndarray`
         The generated response.
     """
+    from scipy.stats import multivariate_normal  # expensive
     grid = build_grid(patch_shape)
     mvn = multivariate_normal(mean=np.zeros(2), cov=response_covariance)
     return mvn.pdf(grid)
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from menpo.image import Image
+from menpo.shape import PointCloud
+from menpofit.clm import (CorrelationFilterExpertEnsemble,
+                          FcnFilterExpertEnsemble)
+from menpofit.fitter import ResponseMapImage
+from menpofit.math.fft_utils import fft2, pad
+
+
+def predict_response_loop(image, shape, grid):
+    # reference: window of each landmark extracted separately
+    r_offset = int(np.floor(grid[0] / 2))
+    l_offset = grid[0] - r_offset
+    pad_h = int(image.shape[0] / 2)
+    pad_w = int(image.shape[1] / 2)
+    responses = []
+    for i in range(shape.n_points):
+        y = np.around(shape.points[i][0] + 1 + pad_h).astype(int)
+        x = np.around(shape.points[i][1] + 1 + pad_w).astype(int)
+        responses.append(image.rspmap_data[0, i, y - r_offset:y + l_offset,
+                                           x - r_offset:x + l_offset])
+    return np.array(responses)[:, None, :, :]
+
+
+def test_fcn_predict_response_matches_loop():
+    rng = np.random.RandomState(0)
+    image = ResponseMapImage((64, 64), rng.rand(1, 68, 128, 128))
+    shape = PointCloud(rng.uniform(1, 62, (68, 2)))
+    ensemble = FcnFilterExpertEnsemble(None, None)
+    for grid in [(7, 7, 2), (8, 8, 2), (15, 15, 2)]:
+        expected = predict_response_loop(image, shape, grid)
+        assert_array_equal(ensemble.predict_response(image, shape, grid),
+                           expected)
+        out = np.empty(expected.shape)
+        result = ensemble.predict_probability(image, shape, grid, out=out)
+        assert result is out
+        assert_array_equal(out, expected)
+
+
+def train_experts_loop(ensemble, images, shapes):
+    # reference: patches of each expert extracted one landmark at a time
+    fft_padded_filters = []
+    for i in range(shapes[0].n_points):
+        patches = [ensemble._extract_patch(image,
+                                           PointCloud([shape.points[i]]))
+                   for image, shape in zip(images, shapes)]
+        correlation_filter, _, _ = ensemble._icf.train(patches,
+                                                       ensemble.response)
+        fft_padded_filters.append(fft2(pad(correlation_filter,
+                                           ensemble.padded_size)))
+    return np.array(fft_padded_filters)
+
+
+def test_correlation_filter_train_matches_loop():
+    rng = np.random.RandomState(0)
+    images = [Image(rng.rand(1, 40, 40)) for _ in range(4)]
+    shapes = [PointCloud(rng.uniform(12, 28, (5, 2))) for _ in images]
+    kwargs = dict(patch_shape=(5, 5), context_shape=(10, 10))
+    ensemble = CorrelationFilterExpertEnsemble(images, shapes, **kwargs)
+    assert_allclose(ensemble.fft_padded_filters,
+                    train_experts_loop(ensemble, images, shapes))
+
+    patches_path = os.path.join(tempfile.mkdtemp(), 'patches.npy')
+    parallel = CorrelationFilterExpertEnsemble(
+        images, shapes, n_jobs=2, patches_path=patches_path, **kwargs)
+    assert not os.path.exists(patches_path)
+    assert_allclose(parallel.fft_padded_filters, ensemble.fft_padded_filters)
+    # the correlations are stored per expert, as sparse matrices
+    for a, b in zip(parallel.cross_correlations, ensemble.cross_correlations):
+        assert_allclose(a.toarray(), b.toarray())
@@ -0,0 +1,150 @@
+import numpy as np
+from threading import Thread
+from nose.tools import raises
+from numpy.testing import assert_allclose, assert_array_equal
+from menpo.shape import PointCloud
+from menpofit.base import build_grid
+from menpofit.clm import FcnFilterExpertEnsemble
+from menpofit.clm.algorithm.gd import RegularisedLandmarkMeanShift
+from menpofit.fitter import ResponseMapImage
+from menpofit.modelinstance import OrthoPDM
+
+
+image_size = 64
+opt = {'numIter': 5, 'kernel_covariance': 10, 'sigOffset': 25,
+       'sigRate': 0.25, 'pdm_rho': 20, 'verbose': False, 'rho2': 20,
+       'ablation': (True, True), 'ratio1': 0.12, 'ratio2': 0.08,
+       'smooth': True}
+
+
+def build_rlms(rng, n_points=20):
+    mean_shape = rng.uniform(16, 48, (n_points, 2))
+    shapes = [PointCloud(mean_shape + rng.normal(0, 1.5, mean_shape.shape))
+              for _ in range(30)]
+    return RegularisedLandmarkMeanShift(
+        FcnFilterExpertEnsemble(None, None), OrthoPDM(shapes), opt=opt,
+        imgSize=image_size), mean_shape
+
+
+def response_maps(rng, points):
+    grid = build_grid((image_size, image_size)) + image_size // 2
+    sq_dist = np.sum((grid[None] - points[:, None, None]) ** 2, axis=-1)
+    return (np.exp(-sq_dist / 18.) +
+            0.05 * rng.rand(*sq_dist.shape))[None]
+
+
+def test_rlms_run_batch_matches_run():
+    rng = np.random.RandomState(0)
+    algorithm, mean_shape = build_rlms(rng)
+    maps, initial_shapes = [], []
+    for _ in range(6):
+        points = mean_shape + rng.normal(0, 2, mean_shape.shape)
+        maps.append(response_maps(rng, points))
+        initial_shapes.append(PointCloud(points + rng.normal(0, 2,
+                                                             points.shape)))
+
+    batch_results = algorithm.run_batch(
+        [ResponseMapImage((image_size, image_size), m) for m in maps],
+        initial_shapes)
+    for m, initial_shape, batch_result in zip(maps, initial_shapes,
+                                              batch_results):
+        result = algorithm.run(
+            ResponseMapImage((image_size, image_size), m.copy()),
+            initial_shape)
+        assert batch_result.n_iters == result.n_iters
+        for batch_shape, shape in zip(batch_result.shapes, result.shapes):
+            assert_allclose(batch_shape.points, shape.points, rtol=1e-5,
+                            atol=1e-5)
+        for batch_p, p in zip(batch_result.shape_parameters,
+                              result.shape_parameters):
+            assert_allclose(batch_p, p, rtol=1e-5, atol=1e-5)
+
+
+def test_rlms_early_termination():
+    rng = np.random.RandomState(3)
+    algorithm, mean_shape = build_rlms(rng)
+    maps, initial_shapes = [], []
+    for _ in range(4):
+        points = mean_shape + rng.normal(0, 1, mean_shape.shape)
+        maps.append(response_maps(rng, points))
+        initial_shapes.append(PointCloud(points))
+
+    full = [algorithm.run(ResponseMapImage((image_size, image_size), m),
+                          shape) for m, shape in zip(maps, initial_shapes)]
+    assert sum(r.termination_stats for r in full).n_patches_skipped == 0
+
+    algorithm.opt = dict(opt, landmark_tol=0.5, stop_tol=0.5)
+    batch_results = algorithm.run_batch(
+        [ResponseMapImage((image_size, image_size), m) for m in maps],
+        initial_shapes)
+    results = []
+    for m, shape, full_result, batch_result in zip(maps, initial_shapes,
+                                                   full, batch_results):
+        result = algorithm.run(ResponseMapImage((image_size, image_size), m),
+                               shape)
+        assert result.n_iters <= full_result.n_iters
+        assert batch_result.n_iters == result.n_iters
+        assert (batch_result.termination_stats.n_patches_skipped ==
+                result.termination_stats.n_patches_skipped)
+        assert_allclose(batch_result.final_shape.points,
+                        result.final_shape.points, rtol=1e-5, atol=1e-5)
+        results.append(result)
+    stats = sum(r.termination_stats for r in results + batch_results)
+    assert stats.n_fits == 8
+    assert stats.n_iters + stats.n_iters_saved == 8 * opt['numIter']
+    assert stats.n_iters_saved > 0
+    assert not hasattr(algorithm, 'termination_stats')
+
+
+def test_rlms_run_batch_zero_responses():
+    rng = np.random.RandomState(1)
+    algorithm, mean_shape = build_rlms(rng)
+    maps = [response_maps(rng, mean_shape), np.zeros((1, len(mean_shape),
+                                                      image_size, image_size))]
+    results = algorithm.run_batch(
+        [ResponseMapImage((image_size, image_size), m) for m in maps],
+        [PointCloud(mean_shape)] * 2)
+    assert results[0] is not None
+    assert results[1] is None
+
+
+@raises(ValueError)
+def test_rlms_run_batch_requires_fcn_experts():
+    rng = np.random.RandomState(1)
+    algorithm, mean_shape = build_rlms(rng)
+    # batch fits read the response maps of the images, as fcn experts do
+    algorithm.expert_ensemble = None
+    algorithm.run_batch(
+        [ResponseMapImage((image_size, image_size),
+                          response_maps(rng, mean_shape))],
+        [PointCloud(mean_shape)])
+
+
+def test_rlms_run_concurrent_matches_run():
+    rng = np.random.RandomState(2)
+    algorithm, mean_shape = build_rlms(rng)
+    images, initial_shapes = [], []
+    for _ in range(8):
+        points = mean_shape + rng.normal(0, 2, mean_shape.shape)
+        images.append(ResponseMapImage((image_size, image_size),
+                                       response_maps(rng, points)))
+        initial_shapes.append(PointCloud(points))
+    maps = [image.rspmap_data.copy() for image in images]
+    expected = [algorithm.run(image, shape).final_shape.points
+                for image, shape in zip(images, initial_shapes)]
+
+    results = [None] * len(images)
+
+    def fit(i):
+        for _ in range(5):
+            results[i] = algorithm.run(images[i],
+                                       initial_shapes[i]).final_shape.points
+
+    threads = [Thread(target=fit, args=(i,)) for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for image, m, result, points in zip(images, maps, results, expected):
+        assert_array_equal(image.rspmap_data, m)
+        assert_array_equal(result, points)
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import subprocess
+
+
+# upper bound (seconds) for importing the inference stack in a fresh interpreter
+IMPORT_TIME_BUDGET = 10.
+
+repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+new_modules_script = '''
+import sys
+import menpo.io, menpo.image, menpo.shape
+imported = set(sys.modules)
+import {module}
+print(' '.join(sorted(set(sys.modules) - imported)))
+'''
+
+
+def modules_imported_by(module):
+    output = subprocess.check_output(
+        [sys.executable, '-c', new_modules_script.format(module=module)],
+        cwd=repo_root)
+    return output.decode().split()
+
+
+def test_clm_import_defers_plotting_and_stats():
+    new_modules = modules_imported_by('menpofit.clm')
+    assert 'matplotlib.pyplot' not in new_modules
+    assert 'scipy.stats' not in new_modules
+
+
+def test_pdm_clm_functions_import_defers_visualisation():
+    new_modules = modules_imported_by('pdm_clm_functions')
+    assert 'matplotlib.pyplot' not in new_modules
+    assert 'cv2' not in new_modules
+    assert 'scipy.stats' not in new_modules
+
+
+def test_inference_import_time_budget():
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', 'import pdm_clm_functions'],
+                          cwd=repo_root)
+    assert time.time() - start < IMPORT_TIME_BUDGET
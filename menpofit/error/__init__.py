@@ -6,6 +6,20 @@ from .base import (bb_area, bb_perimeter, bb_avg_edge_length, bb_diagonal, inner
                    euclidean_bb_normalised_error,
                    euclidean_distance_normalised_error,
                    euclidean_distance_indexed_normalised_error)
+from .batch import (batch_bb_area, batch_bb_perimeter,
+                    batch_bb_avg_edge_length, batch_bb_diagonal,
+                    batch_bb_sqrt_edge_length, batch_inner_pupil,
+                    batch_distance_two_indices, batch_root_mean_square_error,
+                    batch_euclidean_error,
+                    batch_root_mean_square_bb_normalised_error,
+                    batch_root_mean_square_distance_normalised_error,
+                    batch_root_mean_square_distance_indexed_normalised_error,
+                    batch_euclidean_bb_normalised_error,
+                    batch_euclidean_distance_normalised_error,
+                    batch_euclidean_distance_indexed_normalised_error,
+                    batch_mean_pupil_68_error,
+                    batch_outer_eye_corner_68_euclidean_error,
+                    batch_bb_avg_edge_length_68_euclidean_error)
 from .stats import (compute_cumulative_error, mad,
                     area_under_curve_and_failure_rate,
                     compute_statistical_measures)
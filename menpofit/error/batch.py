@@ -0,0 +1,595 @@
+from functools import wraps
+import numpy as np
+
+from menpo.shape import PointCloud
+
+
+def pointclouds_to_array(wrapped):
+    @wraps(wrapped)
+    def wrapper(*args, **kwargs):
+        args = list(args)
+        for index, arg in enumerate(args):
+            args[index] = _to_array(arg)
+        for key in kwargs:
+            kwargs[key] = _to_array(kwargs[key])
+        return wrapped(*args, **kwargs)
+    return wrapper
+
+
+def _to_array(arg):
+    # (n_shapes, n_points, n_dims) array of a list of PointClouds
+    if (isinstance(arg, (list, tuple)) and len(arg) > 0 and
+            isinstance(arg[0], PointCloud)):
+        return np.array([s.points for s in arg])
+    return arg
+
+
+# BOUNDING BOX NORMALISERS
+def _bb_edges(shapes):
+    # (n_shapes,) heights and widths of the bounding boxes
+    extent = np.max(shapes, axis=1) - np.min(shapes, axis=1)
+    return extent[:, 0], extent[:, 1]
+
+
+@pointclouds_to_array
+def batch_bb_area(shapes):
+    r"""
+    Computes the area of the bounding box of each of the provided shapes. It
+    is the batch version of :map:`bb_area`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes.
+
+    Returns
+    -------
+    bb_area : ``(n_shapes,)`` `ndarray`
+        The area of the bounding box of each shape.
+    """
+    height, width = _bb_edges(shapes)
+    return height * width
+
+
+@pointclouds_to_array
+def batch_bb_perimeter(shapes):
+    r"""
+    Computes the perimeter of the bounding box of each of the provided shapes.
+    It is the batch version of :map:`bb_perimeter`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes.
+
+    Returns
+    -------
+    bb_perimeter : ``(n_shapes,)`` `ndarray`
+        The perimeter of the bounding box of each shape.
+    """
+    height, width = _bb_edges(shapes)
+    return 2 * (height + width)
+
+
+@pointclouds_to_array
+def batch_bb_avg_edge_length(shapes):
+    r"""
+    Computes the average edge length of the bounding box of each of the
+    provided shapes. It is the batch version of :map:`bb_avg_edge_length`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes.
+
+    Returns
+    -------
+    bb_avg_edge_length : ``(n_shapes,)`` `ndarray`
+        The average edge length of the bounding box of each shape.
+    """
+    height, width = _bb_edges(shapes)
+    return 0.5 * (height + width)
+
+
+@pointclouds_to_array
+def batch_bb_diagonal(shapes):
+    r"""
+    Computes the diagonal of the bounding box of each of the provided shapes.
+    It is the batch version of :map:`bb_diagonal`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes.
+
+    Returns
+    -------
+    bb_diagonal : ``(n_shapes,)`` `ndarray`
+        The diagonal of the bounding box of each shape.
+    """
+    height, width = _bb_edges(shapes)
+    return np.sqrt(width ** 2 + height ** 2)
+
+
+@pointclouds_to_array
+def batch_bb_sqrt_edge_length(shapes, gt_shapes):
+    r"""
+    Computes the square root of the area of the bounding box of each of the
+    ground truth shapes. It is the batch version of
+    :map:`bb_sqrt_edge_length`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (unused).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    bb_sqrt_edge_length : ``(n_shapes,)`` `ndarray`
+        The square root of the area of the bounding box of each ground truth
+        shape.
+    """
+    height, width = _bb_edges(gt_shapes)
+    return np.sqrt(height * width)
+
+
+@pointclouds_to_array
+def batch_inner_pupil(shapes, gt_shapes):
+    r"""
+    Computes the distance between the inner pupils (means of the inner eye
+    points) of each of the 68-point ground truth shapes. It is the batch
+    version of :map:`inner_pupil`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (unused).
+    gt_shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    inner_pupil : ``(n_shapes,)`` `ndarray`
+        The inner pupil distance of each ground truth shape.
+    """
+    r_pupil = np.mean(gt_shapes[:, [37, 38, 40, 41]], axis=1)
+    l_pupil = np.mean(gt_shapes[:, [43, 44, 46, 47]], axis=1)
+    return np.sqrt(np.sum((r_pupil - l_pupil) ** 2, axis=-1))
+
+
+batch_bb_norm_types = {
+    'avg_edge_length': batch_bb_avg_edge_length,
+    'perimeter': batch_bb_perimeter,
+    'diagonal': batch_bb_diagonal,
+    'area': batch_bb_area
+}
+
+
+# EUCLIDEAN AND ROOT MEAN SQUARE ERRORS
+@pointclouds_to_array
+def batch_root_mean_square_error(shapes, gt_shapes):
+    r"""
+    Computes the root mean square error between each pair of shapes. It is
+    the batch version of :map:`root_mean_square_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    root_mean_square_error : ``(n_shapes,)`` `ndarray`
+        The root mean square error of each shape.
+    """
+    return np.sqrt(np.mean((shapes - gt_shapes) ** 2, axis=(1, 2)))
+
+
+@pointclouds_to_array
+def batch_euclidean_error(shapes, gt_shapes):
+    r"""
+    Computes the Euclidean error between each pair of shapes. It is the batch
+    version of :map:`euclidean_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    euclidean_error : ``(n_shapes,)`` `ndarray`
+        The Euclidean error of each shape.
+    """
+    return np.mean(np.sqrt(np.sum((shapes - gt_shapes) ** 2, axis=-1)),
+                   axis=-1)
+
+
+# DISTANCE NORMALISER
+@pointclouds_to_array
+def batch_distance_two_indices(index1, index2, shapes):
+    r"""
+    Computes the Euclidean distance between two points of each of the
+    provided shapes. It is the batch version of :map:`distance_two_indices`.
+
+    Parameters
+    ----------
+    index1 : `int`
+        The index of the first point.
+    index2 : `int`
+        The index of the second point.
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes.
+
+    Returns
+    -------
+    distance_two_indices : ``(n_shapes,)`` `ndarray`
+        The Euclidean distance between the points of each shape.
+    """
+    return np.sqrt(np.sum((shapes[:, index1] - shapes[:, index2]) ** 2,
+                          axis=-1))
+
+
+# GENERIC NORMALISED ERROR FUNCTIONS
+@pointclouds_to_array
+def batch_bb_normalised_error(shape_error_f, shapes, gt_shapes,
+                              norm_shapes=None, norm_type='avg_edge_length'):
+    r"""
+    Computes an error normalised by a measure based on the bounding box of
+    each of the shapes. It is the batch version of :map:`bb_normalised_error`.
+
+    Parameters
+    ----------
+    shape_error_f : `callable`
+        The batch function to be used for computing the errors, e.g.
+        :map:`batch_euclidean_error`.
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    norm_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud` or ``None``, optional
+        The shapes to be used to compute the normalisers. If ``None``, then
+        the ground truth shapes are used.
+    norm_type : ``{'area', 'perimeter', 'avg_edge_length', 'diagonal'}``, optional
+        The type of the normaliser (see :map:`bb_normalised_error`).
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised error of each shape.
+    """
+    if norm_type not in batch_bb_norm_types:
+        raise ValueError('norm_type must be one of '
+                         '{avg_edge_length, perimeter, diagonal, area}.')
+    if norm_shapes is None:
+        norm_shapes = gt_shapes
+    return (shape_error_f(shapes, gt_shapes) /
+            batch_bb_norm_types[norm_type](norm_shapes))
+
+
+@pointclouds_to_array
+def batch_distance_normalised_error(shape_error_f, distance_norm_f, shapes,
+                                    gt_shapes):
+    r"""
+    Computes an error normalised by a distance measure between each pair of
+    shapes. It is the batch version of :map:`distance_normalised_error`.
+
+    Parameters
+    ----------
+    shape_error_f : `callable`
+        The batch function to be used for computing the errors.
+    distance_norm_f : `callable`
+        The batch function to be used for computing the normalisation
+        distance metrics, e.g. :map:`batch_inner_pupil`.
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised error of each shape.
+    """
+    return shape_error_f(shapes, gt_shapes) / distance_norm_f(shapes,
+                                                              gt_shapes)
+
+
+@pointclouds_to_array
+def batch_distance_indexed_normalised_error(shape_error_f, index1, index2,
+                                            shapes, gt_shapes):
+    r"""
+    Computes an error normalised by the distance between two points of each
+    of the ground truth shapes. It is the batch version of
+    :map:`distance_indexed_normalised_error`.
+
+    Parameters
+    ----------
+    shape_error_f : `callable`
+        The batch function to be used for computing the errors.
+    index1 : `int`
+        The index of the first point.
+    index2 : `int`
+        The index of the second point.
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised error of each shape.
+    """
+    return (shape_error_f(shapes, gt_shapes) /
+            batch_distance_two_indices(index1, index2, gt_shapes))
+
+
+# EUCLIDEAN AND ROOT MEAN SQUARE NORMALISED ERRORS
+def batch_root_mean_square_bb_normalised_error(shapes, gt_shapes,
+                                               norm_shapes=None,
+                                               norm_type='avg_edge_length'):
+    r"""
+    Batch version of :map:`root_mean_square_bb_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    norm_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud` or ``None``, optional
+        The shapes to be used to compute the normalisers. If ``None``, then
+        the ground truth shapes are used.
+    norm_type : ``{'area', 'perimeter', 'avg_edge_length', 'diagonal'}``, optional
+        The type of the normaliser.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed root mean square normalised error of each shape.
+    """
+    return batch_bb_normalised_error(
+        shape_error_f=batch_root_mean_square_error, shapes=shapes,
+        gt_shapes=gt_shapes, norm_shapes=norm_shapes, norm_type=norm_type)
+
+
+def batch_root_mean_square_distance_normalised_error(shapes, gt_shapes,
+                                                     distance_norm_f):
+    r"""
+    Batch version of :map:`root_mean_square_distance_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    distance_norm_f : `callable`
+        The batch function to be used for computing the normalisation
+        distance metrics.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed root mean square normalised error of each shape.
+    """
+    return batch_distance_normalised_error(
+        shape_error_f=batch_root_mean_square_error,
+        distance_norm_f=distance_norm_f, shapes=shapes, gt_shapes=gt_shapes)
+
+
+def batch_root_mean_square_distance_indexed_normalised_error(shapes, gt_shapes,
+                                                             index1, index2):
+    r"""
+    Batch version of :map:`root_mean_square_distance_indexed_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    index1 : `int`
+        The index of the first point.
+    index2 : `int`
+        The index of the second point.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed root mean square normalised error of each shape.
+    """
+    return batch_distance_indexed_normalised_error(
+        shape_error_f=batch_root_mean_square_error, index1=index1,
+        index2=index2, shapes=shapes, gt_shapes=gt_shapes)
+
+
+def batch_euclidean_bb_normalised_error(shapes, gt_shapes, norm_shapes=None,
+                                        norm_type='avg_edge_length'):
+    r"""
+    Batch version of :map:`euclidean_bb_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    norm_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud` or ``None``, optional
+        The shapes to be used to compute the normalisers. If ``None``, then
+        the ground truth shapes are used.
+    norm_type : ``{'area', 'perimeter', 'avg_edge_length', 'diagonal'}``, optional
+        The type of the normaliser.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed Euclidean normalised error of each shape.
+    """
+    return batch_bb_normalised_error(
+        shape_error_f=batch_euclidean_error, shapes=shapes,
+        gt_shapes=gt_shapes, norm_shapes=norm_shapes, norm_type=norm_type)
+
+
+def batch_euclidean_distance_normalised_error(shapes, gt_shapes,
+                                              distance_norm_f):
+    r"""
+    Batch version of :map:`euclidean_distance_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    distance_norm_f : `callable`
+        The batch function to be used for computing the normalisation
+        distance metrics.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed Euclidean normalised error of each shape.
+    """
+    return batch_distance_normalised_error(
+        shape_error_f=batch_euclidean_error, distance_norm_f=distance_norm_f,
+        shapes=shapes, gt_shapes=gt_shapes)
+
+
+def batch_euclidean_distance_indexed_normalised_error(shapes, gt_shapes,
+                                                      index1, index2):
+    r"""
+    Batch version of :map:`euclidean_distance_indexed_normalised_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, n_points, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+    index1 : `int`
+        The index of the first point.
+    index2 : `int`
+        The index of the second point.
+
+    Returns
+    -------
+    error : ``(n_shapes,)`` `ndarray`
+        The computed Euclidean normalised error of each shape.
+    """
+    return batch_distance_indexed_normalised_error(
+        shape_error_f=batch_euclidean_error, index1=index1, index2=index2,
+        shapes=shapes, gt_shapes=gt_shapes)
+
+
+# 68-POINT FACE ERRORS
+def _check_68_points(shapes, gt_shapes):
+    if shapes.shape[1] != 68:
+        raise ValueError('Final shapes must have 68 points')
+    if gt_shapes.shape[1] != 68:
+        raise ValueError('Ground truth shapes must have 68 points')
+
+
+@pointclouds_to_array
+def batch_mean_pupil_68_error(shapes, gt_shapes):
+    r"""
+    Computes the Euclidean error of 68-point shapes normalised with the
+    distance between the mean eye points (pupils) of the ground truth shapes.
+    It is the batch version of :map:`mean_pupil_68_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised Euclidean error of each shape.
+
+    Raises
+    ------
+    ValueError
+        Final shapes must have 68 points
+    ValueError
+        Ground truth shapes must have 68 points
+    """
+    _check_68_points(shapes, gt_shapes)
+
+    def pupil_dist(_, s):
+        return np.sqrt(np.sum((np.mean(s[:, 36:42], axis=1) -
+                               np.mean(s[:, 42:48], axis=1)) ** 2, axis=-1))
+    return batch_distance_normalised_error(batch_euclidean_error, pupil_dist,
+                                           shapes, gt_shapes)
+
+
+@pointclouds_to_array
+def batch_outer_eye_corner_68_euclidean_error(shapes, gt_shapes):
+    r"""
+    Computes the Euclidean error of 68-point shapes normalised with the
+    distance between the outer eye corners (inter-ocular distance, points
+    ``36`` and ``45``) of the ground truth shapes. It is the batch version of
+    :map:`outer_eye_corner_68_euclidean_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised Euclidean error of each shape.
+
+    Raises
+    ------
+    ValueError
+        Final shapes must have 68 points
+    ValueError
+        Ground truth shapes must have 68 points
+    """
+    _check_68_points(shapes, gt_shapes)
+    return batch_distance_indexed_normalised_error(batch_euclidean_error, 36,
+                                                   45, shapes, gt_shapes)
+
+
+@pointclouds_to_array
+def batch_bb_avg_edge_length_68_euclidean_error(shapes, gt_shapes):
+    r"""
+    Computes the Euclidean error of 68-point shapes normalised by the average
+    edge length of the ground truth shapes' bounding boxes. It is the batch
+    version of :map:`bb_avg_edge_length_68_euclidean_error`.
+
+    Parameters
+    ----------
+    shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The input shapes (e.g. the final shapes of a fitting procedure).
+    gt_shapes : ``(n_shapes, 68, 2)`` `ndarray` or `list` of `menpo.shape.PointCloud`
+        The ground truth shapes.
+
+    Returns
+    -------
+    normalised_error : ``(n_shapes,)`` `ndarray`
+        The computed normalised Euclidean error of each shape.
+
+    Raises
+    ------
+    ValueError
+        Final shapes must have 68 points
+    ValueError
+        Ground truth shapes must have 68 points
+    """
+    _check_68_points(shapes, gt_shapes)
+    return batch_bb_normalised_error(batch_euclidean_error, shapes, gt_shapes,
+                                     norm_type='avg_edge_length')
@@ -1,45 +1,68 @@
 from __future__ import division
 import numpy as np
-from scipy.integrate import simps
-from collections import Iterable
+try:
+    from scipy.integrate import simps
+except ImportError:  # removed in scipy 1.14
+    from scipy.integrate import simpson as simps
+try:
+    from collections.abc import Iterable
+except ImportError:  # Python 2
+    from collections import Iterable
 
 
 def compute_cumulative_error(errors, bins):
     r"""
-    Computes the values of the Cumulative Error Distribution (CED).
+    Computes the values of the Cumulative Error Distribution (CED). The errors
+    are sorted once, and the number of errors up to each bin is found with a
+    binary search, so the cost is ``O((n_errors + n_bins) log(n_errors))``.
 
     Parameters
     ----------
-    errors : `list` of `float`
-        The `list` of errors per image.
+    errors : `list` of `float` or ``(n_methods, n_errors)`` `ndarray`
+        The `list` of errors per image. The errors of multiple methods (with
+        the same number of images) can be given as a 2D array.
     bins : `list` of `float`
         The values of the error bins centers at which the CED is evaluated.
 
     Returns
     -------
-    ced : `list` of `float`
-        The computed CED.
+    ced : `list` of `float` or ``(n_methods, n_bins)`` `ndarray`
+        The computed CED. It is an array with the CED of each method for 2D
+        errors.
     """
-    n_errors = len(errors)
-    return [np.count_nonzero([errors <= x]) / n_errors for x in bins]
-
-
-def mad(errors):
+    errors = np.asarray(errors, dtype=float)
+    bins = np.asarray(bins)
+    n_errors = errors.shape[-1]
+    # NaN errors are sorted last and are never counted, as with errors <= x
+    sorted_errors = np.sort(errors, axis=-1)
+    if errors.ndim == 1:
+        return list(np.searchsorted(sorted_errors, bins, side='right') /
+                    n_errors)
+    return np.array([np.searchsorted(e, bins, side='right')
+                     for e in sorted_errors]) / n_errors
+
+
+def mad(errors, axis=None):
     r"""
     Computes the Median Absolute Deviation of a set of errors.
 
     Parameters
     ----------
-    errors : `list` of `float`
+    errors : `list` of `float` or `ndarray`
         The `list` of errors per image.
+    axis : `int` or ``None``, optional
+        The axis of the errors of each set, e.g. ``-1`` for the
+        ``(n_methods, n_errors)`` errors of multiple methods. If ``None``, then
+        all errors belong to a single set.
 
     Returns
     -------
-    mad : `float`
+    mad : `float` or `ndarray`
         The median absolute deviation value.
     """
-    med = np.median(errors)
-    return np.median(np.abs(errors - med))
+    errors = np.asarray(errors)
+    med = np.median(errors, axis=axis, keepdims=axis is not None)
+    return np.median(np.abs(errors - med), axis=axis)
 
 
 def area_under_curve_and_failure_rate(errors, step_error, max_error,
@@ -50,8 +73,9 @@ def area_under_curve_and_failure_rate(errors, step_error, max_error,
 
     Parameters
     ----------
-    errors : `list` of `float`
-        The `list` of errors per image.
+    errors : `list` of `float` or ``(n_methods, n_errors)`` `ndarray`
+        The `list` of errors per image. The errors of multiple methods (with
+        the same number of images) can be given as a 2D array.
     step_error : `float`
         The sampling step of the error bins of the CED.
     max_error : `float`
@@ -61,14 +85,14 @@ def area_under_curve_and_failure_rate(errors, step_error, max_error,
 
     Returns
     -------
-    auc : `float`
+    auc : `float` or ``(n_methods,)`` `ndarray`
         The Area Under the Curve value.
-    fr : `float`
+    fr : `float` or ``(n_methods,)`` `ndarray`
         The Failure Rate value.
     """
-    x_axis = list(np.arange(min_error, max_error + step_error, step_error))
-    ced = np.array(compute_cumulative_error(errors, x_axis))
-    return simps(ced, x=x_axis) / max_error, 1. - ced[-1]
+    x_axis = np.arange(min_error, max_error + step_error, step_error)
+    ced = np.asarray(compute_cumulative_error(errors, x_axis))
+    return simps(ced, x=x_axis, axis=-1) / max_error, 1. - ced[..., -1]
 
 
 def compute_statistical_measures(errors, step_error, max_error, min_error=0.):
@@ -110,6 +134,23 @@ def compute_statistical_measures(errors, step_error, max_error, min_error=0.):
         The failure rate value.
     """
     if isinstance(errors[0], Iterable):
+        try:
+            errors_array = np.asarray(errors, dtype=float)
+        except ValueError:  # different number of errors per method
+            errors_array = None
+    if isinstance(errors[0], Iterable) and errors_array is not None:
+        # same number of errors for all methods: compute all at once
+        auc_val, fail_val = area_under_curve_and_failure_rate(
+                errors_array, step_error=step_error, max_error=max_error,
+                min_error=min_error)
+        mean_val = list(np.mean(errors_array, axis=-1))
+        std_val = list(np.std(errors_array, axis=-1))
+        median_val = list(np.median(errors_array, axis=-1))
+        mad_val = list(mad(errors_array, axis=-1))
+        max_val = list(np.max(errors_array, axis=-1))
+        auc_val = list(auc_val)
+        fail_val = list(fail_val)
+    elif isinstance(errors[0], Iterable):
         mean_val = []
         std_val = []
         median_val = []
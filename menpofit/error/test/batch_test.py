@@ -0,0 +1,85 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from menpo.shape import PointCloud
+from menpofit.error import (
+    bb_area, bb_perimeter, bb_avg_edge_length, bb_diagonal,
+    bb_sqrt_edge_length, inner_pupil, root_mean_square_error,
+    euclidean_error, root_mean_square_bb_normalised_error,
+    root_mean_square_distance_indexed_normalised_error,
+    euclidean_bb_normalised_error, euclidean_distance_normalised_error,
+    euclidean_distance_indexed_normalised_error, mean_pupil_68_error,
+    outer_eye_corner_68_euclidean_error,
+    bb_avg_edge_length_68_euclidean_error, batch_bb_area, batch_bb_perimeter,
+    batch_bb_avg_edge_length, batch_bb_diagonal, batch_bb_sqrt_edge_length,
+    batch_inner_pupil, batch_root_mean_square_error, batch_euclidean_error,
+    batch_root_mean_square_bb_normalised_error,
+    batch_root_mean_square_distance_indexed_normalised_error,
+    batch_euclidean_bb_normalised_error,
+    batch_euclidean_distance_normalised_error,
+    batch_euclidean_distance_indexed_normalised_error,
+    batch_mean_pupil_68_error, batch_outer_eye_corner_68_euclidean_error,
+    batch_bb_avg_edge_length_68_euclidean_error)
+
+
+rng = np.random.RandomState(0)
+gt_shapes = rng.uniform(0, 100, (10, 68, 2))
+shapes = gt_shapes + rng.normal(0, 3, gt_shapes.shape)
+pcs = [PointCloud(s) for s in shapes]
+gt_pcs = [PointCloud(s) for s in gt_shapes]
+
+
+def test_batch_bb_normalisers():
+    for batch_f, f in [(batch_bb_area, bb_area),
+                       (batch_bb_perimeter, bb_perimeter),
+                       (batch_bb_avg_edge_length, bb_avg_edge_length),
+                       (batch_bb_diagonal, bb_diagonal)]:
+        assert_allclose(batch_f(gt_shapes), [f(s) for s in gt_shapes])
+    assert_allclose(batch_bb_sqrt_edge_length(shapes, gt_shapes),
+                    [bb_sqrt_edge_length(s, g)
+                     for s, g in zip(shapes, gt_shapes)])
+    assert_allclose(batch_inner_pupil(shapes, gt_shapes),
+                    [inner_pupil(s, g) for s, g in zip(shapes, gt_shapes)])
+
+
+def test_batch_errors():
+    for batch_f, f in [
+            (batch_root_mean_square_error, root_mean_square_error),
+            (batch_euclidean_error, euclidean_error),
+            (batch_mean_pupil_68_error, mean_pupil_68_error),
+            (batch_outer_eye_corner_68_euclidean_error,
+             outer_eye_corner_68_euclidean_error),
+            (batch_bb_avg_edge_length_68_euclidean_error,
+             bb_avg_edge_length_68_euclidean_error)]:
+        expected = [f(s, g) for s, g in zip(pcs, gt_pcs)]
+        assert_allclose(batch_f(shapes, gt_shapes), expected)
+        assert_allclose(batch_f(pcs, gt_pcs), expected)
+
+
+def test_batch_normalised_errors():
+    for norm_type in ['area', 'perimeter', 'avg_edge_length', 'diagonal']:
+        assert_allclose(
+            batch_euclidean_bb_normalised_error(shapes, gt_shapes,
+                                                norm_type=norm_type),
+            [euclidean_bb_normalised_error(s, g, norm_type=norm_type)
+             for s, g in zip(pcs, gt_pcs)])
+        assert_allclose(
+            batch_root_mean_square_bb_normalised_error(
+                shapes, gt_shapes, norm_shapes=shapes, norm_type=norm_type),
+            [root_mean_square_bb_normalised_error(s, g, norm_shape=s,
+                                                  norm_type=norm_type)
+             for s, g in zip(pcs, gt_pcs)])
+    assert_allclose(
+        batch_euclidean_distance_indexed_normalised_error(shapes, gt_shapes,
+                                                          36, 45),
+        [euclidean_distance_indexed_normalised_error(s, g, 36, 45)
+         for s, g in zip(pcs, gt_pcs)])
+    assert_allclose(
+        batch_root_mean_square_distance_indexed_normalised_error(
+            shapes, gt_shapes, 36, 45),
+        [root_mean_square_distance_indexed_normalised_error(s, g, 36, 45)
+         for s, g in zip(pcs, gt_pcs)])
+    assert_allclose(
+        batch_euclidean_distance_normalised_error(shapes, gt_shapes,
+                                                  batch_inner_pupil),
+        [euclidean_distance_normalised_error(s, g, inner_pupil)
+         for s, g in zip(shapes, gt_shapes)])
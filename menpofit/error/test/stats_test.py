@@ -0,0 +1,45 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from menpofit.error import (compute_cumulative_error,
+                            area_under_curve_and_failure_rate,
+                            compute_statistical_measures, mad)
+from menpofit.error.stats import simps
+
+
+rng = np.random.RandomState(0)
+errors = rng.gamma(2., 0.02, (3, 500))
+errors[1, :5] = np.nan
+bins = np.arange(0., 0.08 + 0.0001, 0.0001)
+
+
+def cumulative_error_loop(e, x_axis):
+    return [np.count_nonzero([e <= x]) / len(e) for x in x_axis]
+
+
+def test_compute_cumulative_error():
+    for e in errors:
+        assert_allclose(compute_cumulative_error(e, bins),
+                        cumulative_error_loop(e, bins))
+    assert_allclose(compute_cumulative_error(errors, bins),
+                    [cumulative_error_loop(e, bins) for e in errors])
+
+
+def test_area_under_curve_and_failure_rate():
+    auc, fr = area_under_curve_and_failure_rate(errors, 0.0001, 0.08)
+    for i, e in enumerate(errors):
+        ced = np.array(cumulative_error_loop(e, bins))
+        assert_allclose(auc[i], simps(ced, x=bins) / 0.08)
+        assert_allclose(fr[i], 1. - ced[-1])
+        auc_i, fr_i = area_under_curve_and_failure_rate(e, 0.0001, 0.08)
+        assert_allclose([auc_i, fr_i], [auc[i], fr[i]])
+
+
+def test_compute_statistical_measures():
+    e = errors[[0, 2]]
+    measures = compute_statistical_measures(list(e), 0.0001, 0.08)
+    ragged = compute_statistical_measures([e[0], e[1, :-1]], 0.0001, 0.08)
+    for i in range(2):
+        expected = compute_statistical_measures(e[i], 0.0001, 0.08)
+        assert_allclose([m[i] for m in measures], expected)
+    assert_allclose([m[0] for m in ragged], [m[0] for m in measures])
+    assert_allclose(mad(e, axis=-1), [mad(e[0]), mad(e[1])])
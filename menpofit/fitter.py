@@ -7,14 +7,15 @@ import warnings
 from menpo.base import name_of_callable
 from menpo.shape import PointCloud
 from menpo.transform import (scale_about_centre, rotate_ccw_about_centre,
-                             Translation, Scale, AlignmentAffine,
-                             AlignmentSimilarity)
+                             Translation, Scale, NonUniformScale, Affine,
+                             AlignmentAffine, AlignmentSimilarity)
 
 from menpofit.base import MenpoFitCostsWarning
 import menpofit.checks as checks
 from menpofit.visualize import print_progress
 from menpofit.result import (MultiScaleNonParametricIterativeResult,
-                             MultiScaleParametricIterativeResult)
+                             MultiScaleParametricIterativeResult,
+                             CompactResult)
 
 
 def raise_costs_warning(cls):
@@ -230,6 +231,36 @@ def align_shape_with_bounding_box(shape, bounding_box,
     return transform.apply(shape)
 
 
+class ResponseMapImage(object):
+    r"""
+    Pixel-free stand-in for an image, used when fitting only from response
+    maps. It carries the shape of the image it replaces, its response maps
+    and its path, which is all that response-map-driven algorithms read.
+
+    Parameters
+    ----------
+    shape : `tuple` of `int`
+        The shape (height, width) of the image it replaces.
+    rspmap_data : ``(1, n_points, height, width)`` `ndarray`
+        The response maps of the image.
+    path : `pathlib.Path` or ``None``, optional
+        The path of the image it replaces.
+    """
+    def __init__(self, shape, rspmap_data, path=None):
+        self.shape = tuple(shape)
+        self.rspmap_data = rspmap_data
+        self.path = path
+
+    @property
+    def n_dims(self):
+        r"""
+        The number of dimensions of the image.
+
+        :type: `int`
+        """
+        return len(self.shape)
+
+
 class MultiScaleNonParametricFitter(object):
     r"""
     Class for defining a multi-scale fitter for a non-parametric fitting method,
@@ -421,6 +452,129 @@ class MultiScaleNonParametricFitter(object):
         return (images, initial_shapes, gt_shapes, affine_transforms,
                 scale_transforms)
 
+    def _prepare_response_map(self, image, initial_shape, gt_shape=None):
+        r"""
+        Pixel-free version of :meth:`_prepare_image`, for algorithms that only
+        read the response maps of the image (``image.rspmap_data``), e.g.
+        :map:`FcnFilterExpertEnsemble`. No image is resampled and no features
+        are extracted. Only the shapes and the transforms that map them between
+        scales and back to the image are computed, exactly as the image
+        rescaling of :meth:`_prepare_image` would. The holistic features are
+        assumed not to change the image geometry, and the rescale wrt the
+        ground truth shape is the identity.
+
+        Parameters
+        ----------
+        image : `menpo.image.Image` or subclass
+            The image to be fitted. It must have ``rspmap_data``.
+        initial_shape : `menpo.shape.PointCloud`
+            The initial shape estimate from which the fitting procedure
+            will start.
+        gt_shape : `menpo.shape.PointCloud`, optional
+            The ground truth shape associated to the image.
+
+        Returns
+        -------
+        images : `list` of :map:`ResponseMapImage`
+            The list of pixel-free images per scale.
+        initial_shapes : `list` of `menpo.shape.PointCloud`
+            The list of initial shapes per scale.
+        gt_shapes : `list` of `menpo.shape.PointCloud`
+            The list of ground truth shapes per scale.
+        affine_transforms : `list` of `menpo.transform.Affine`
+            The list of affine transforms per scale (identities).
+        scale_transforms : `list` of `menpo.shape.Scale`
+            The list of inverse scaling transforms per scale.
+        """
+        image_shape = np.array(image.shape, dtype=float)
+        path = getattr(image, 'path', None)
+
+        images = []
+        initial_shapes = []
+        gt_shapes = [] if gt_shape else None
+        affine_transforms = []
+        scale_transforms = []
+        for i in range(self.n_scales):
+            affine_transforms.append(Affine.init_identity(initial_shape.n_dims))
+
+            if self.scales[i] != 1:
+                # Same shape and transform as menpo's Image.rescale
+                scaled_shape = np.ceil(self.scales[i] * image_shape).astype(int)
+                scale_factors = ((self.scales[i] * image_shape - 1) /
+                                 (image_shape - 1))
+                scale_transform = NonUniformScale(scale_factors).pseudoinverse()
+            else:
+                scaled_shape = image.shape
+                scale_transform = Scale(1., initial_shape.n_dims)
+            scale_transforms.append(scale_transform)
+
+            shape_transform = scale_transform.pseudoinverse()
+            initial_shapes.append(shape_transform.apply(initial_shape))
+            if gt_shape:
+                gt_shapes.append(shape_transform.apply(gt_shape))
+
+            images.append(ResponseMapImage(scaled_shape, image.rspmap_data,
+                                           path=path))
+
+        return (images, initial_shapes, gt_shapes, affine_transforms,
+                scale_transforms)
+
+    def _shape_to_next_scale(self, shape, i, affine_transforms,
+                             scale_transforms):
+        r"""
+        Function that maps the final shape of scale ``i`` to the image space of
+        scale ``i + 1``.
+
+        Parameters
+        ----------
+        shape : `menpo.shape.PointCloud`
+            The final shape of scale ``i``.
+        i : `int`
+            The index of the current scale.
+        affine_transforms : `list` of `menpo.transform.Affine`
+            The list of affine transforms per scale.
+        scale_transforms : `list` of `menpo.shape.Scale`
+            The list of inverse scaling transforms per scale.
+
+        Returns
+        -------
+        shape : `menpo.shape.PointCloud`
+            The initial shape of scale ``i + 1``.
+        """
+        if self.holistic_features[i + 1] != self.holistic_features[i]:
+            # If the features function of the current scale is different
+            # than the one of the next scale, this means that the affine
+            # transform is different as well. Thus we need to do the
+            # following composition:
+            #
+            #    S_{i+1} \circ A_{i+1} \circ inv(A_i) \circ inv(S_i)
+            #
+            # where:
+            #    S_i : scaling transform of current scale
+            #    S_{i+1} : scaling transform of next scale
+            #    A_i : affine transform of current scale
+            #    A_{i+1} : affine transform of next scale
+            t1 = scale_transforms[i].compose_after(affine_transforms[i])
+            t2 = affine_transforms[i + 1].pseudoinverse().compose_after(t1)
+            transform = scale_transforms[i + 1].pseudoinverse().compose_after(t2)
+            shape = transform.apply(shape)
+        elif (self.holistic_features[i + 1] == self.holistic_features[i] and
+              self.scales[i] != self.scales[i + 1]):
+            # If the features function of the current scale is the same
+            # as the one of the next scale, this means that the affine
+            # transform is the same as well, and thus can be omitted.
+            # Given that the scale factors are different, we need to do
+            # the # following composition:
+            #
+            #    S_{i+1} \circ inv(S_i)
+            #
+            # where:
+            #    S_i : scaling transform of current scale
+            #    S_{i+1} : scaling transform of next scale
+            transform = scale_transforms[i + 1].pseudoinverse().compose_after(scale_transforms[i])
+            shape = transform.apply(shape)
+        return shape
+
     def _fit(self, images, initial_shape, affine_transforms, scale_transforms,
              gt_shapes=None, max_iters=20, return_costs=False, **kwargs):
         r"""
@@ -488,39 +642,9 @@ class MultiScaleNonParametricFitter(object):
             # Prepare this scale's final shape for the next scale
             if i < self.n_scales - 1:
                 # This should not be done for the last scale.
-                shape = algorithm_result.final_shape
-                if self.holistic_features[i + 1] != self.holistic_features[i]:
-                    # If the features function of the current scale is different
-                    # than the one of the next scale, this means that the affine
-                    # transform is different as well. Thus we need to do the
-                    # following composition:
-                    #
-                    #    S_{i+1} \circ A_{i+1} \circ inv(A_i) \circ inv(S_i)
-                    #
-                    # where:
-                    #    S_i : scaling transform of current scale
-                    #    S_{i+1} : scaling transform of next scale
-                    #    A_i : affine transform of current scale
-                    #    A_{i+1} : affine transform of next scale
-                    t1 = scale_transforms[i].compose_after(affine_transforms[i])
-                    t2 = affine_transforms[i + 1].pseudoinverse().compose_after(t1)
-                    transform = scale_transforms[i + 1].pseudoinverse().compose_after(t2)
-                    shape = transform.apply(shape)
-                elif (self.holistic_features[i + 1] == self.holistic_features[i] and
-                      self.scales[i] != self.scales[i + 1]):
-                    # If the features function of the current scale is the same
-                    # as the one of the next scale, this means that the affine
-                    # transform is the same as well, and thus can be omitted.
-                    # Given that the scale factors are different, we need to do
-                    # the # following composition:
-                    #
-                    #    S_{i+1} \circ inv(S_i)
-                    #
-                    # where:
-                    #    S_i : scaling transform of current scale
-                    #    S_{i+1} : scaling transform of next scale
-                    transform = scale_transforms[i + 1].pseudoinverse().compose_after(scale_transforms[i])
-                    shape = transform.apply(shape)
+                shape = self._shape_to_next_scale(
+                    algorithm_result.final_shape, i, affine_transforms,
+                    scale_transforms)
 
         # Return list of algorithm results
         return algorithm_results
@@ -556,8 +680,44 @@ class MultiScaleNonParametricFitter(object):
             affine_transforms=affine_transforms,
             scale_transforms=scale_transforms, image=image, gt_shape=gt_shape)
 
+    def _compact_fitter_result(self, algorithm_results, affine_transforms,
+                               scale_transforms, gt_shape=None,
+                               keep_shapes=False):
+        r"""
+        Function that creates the compact fitting result object. The
+        multi-scale fitting result is created without the image, and only its
+        final shape, costs and (optionally) shapes are kept.
+
+        Parameters
+        ----------
+        algorithm_results : `list` of :map:`NonParametricIterativeResult` or subclass
+            The list of fitting result per scale.
+        affine_transforms : `list` of `menpo.transform.Affine`
+            The list of affine transforms per scale that are the inverses of the
+            transformations introduced by the rescale wrt the reference shape as
+            well as the feature extraction.
+        scale_transforms : `list` of `menpo.shape.Scale`
+            The list of inverse scaling transforms per scale.
+        gt_shape : `menpo.shape.PointCloud`, optional
+            The ground truth shape associated to the image.
+        keep_shapes : `bool`, optional
+            If ``True``, then the shapes of all the iterations are kept.
+
+        Returns
+        -------
+        fitting_result : :map:`CompactResult`
+            The compact fitting result.
+        """
+        return CompactResult.init_from_result(
+            self._fitter_result(image=None, algorithm_results=algorithm_results,
+                                affine_transforms=affine_transforms,
+                                scale_transforms=scale_transforms,
+                                gt_shape=gt_shape),
+            keep_shapes=keep_shapes)
+
     def fit_from_shape(self, image, initial_shape, max_iters=20, gt_shape=None,
-                       return_costs=False, **kwargs):
+                       return_costs=False, response_map_only=False,
+                       compact=False, compact_shapes=False, **kwargs):
         r"""
         Fits the multi-scale fitter to an image given an initial shape.
 
@@ -581,13 +741,26 @@ class MultiScaleNonParametricFitter(object):
             computation increases the computational cost of the fitting. The
             additional computation cost depends on the fitting method. Only
             use this option for research purposes.*
+        response_map_only : `bool`, optional
+            If ``True``, then the image pixels are neither resampled nor
+            used for feature extraction, and the algorithms are given
+            pixel-free :map:`ResponseMapImage` objects (see
+            :meth:`_prepare_response_map`). Only use this option with experts
+            that read nothing but ``image.rspmap_data``.
+        compact : `bool`, optional
+            If ``True``, then a :map:`CompactResult` is returned, which does
+            not store the image. Use this option when holding the results of
+            many fittings in memory.
+        compact_shapes : `bool`, optional
+            If ``True`` and `compact` is ``True``, then the compact result
+            also keeps the shapes of all the iterations.
         kwargs : `dict`, optional
             Additional keyword arguments that can be passed to specific
             implementations.
 
         Returns
         -------
-        fitting_result : :map:`MultiScaleNonParametricIterativeResult` or subclass
+        fitting_result : :map:`MultiScaleNonParametricIterativeResult` or subclass or :map:`CompactResult`
             The multi-scale fitting result containing the result of the fitting
             procedure.
         """
@@ -600,9 +773,12 @@ class MultiScaleNonParametricFitter(object):
         # as potential affine transform from the features. The scale
         # transforms are the Scale objects that correspond to each level's
         # scale.
+        if response_map_only:
+            prepare = self._prepare_response_map
+        else:
+            prepare = self._prepare_image
         (images, initial_shapes, gt_shapes, affine_transforms,
-         scale_transforms) = self._prepare_image(image, initial_shape,
-                                                 gt_shape=gt_shape)
+         scale_transforms) = prepare(image, initial_shape, gt_shape=gt_shape)
 
         # Execute multi-scale fitting
         algorithm_results = self._fit(images=images,
@@ -613,12 +789,118 @@ class MultiScaleNonParametricFitter(object):
                                       return_costs=return_costs, **kwargs)
 
         # Return multi-scale fitting result
+        if compact:
+            return self._compact_fitter_result(
+                algorithm_results=algorithm_results,
+                affine_transforms=affine_transforms,
+                scale_transforms=scale_transforms, gt_shape=gt_shape,
+                keep_shapes=compact_shapes)
         return self._fitter_result(image=image,
                                    algorithm_results=algorithm_results,
                                    affine_transforms=affine_transforms,
                                    scale_transforms=scale_transforms,
                                    gt_shape=gt_shape)
 
+    def fit_batch_from_shapes(self, images, initial_shapes, max_iters=20,
+                              gt_shapes=None, return_costs=False,
+                              response_map_only=False, compact=False,
+                              compact_shapes=False, **kwargs):
+        r"""
+        Fits the multi-scale fitter to a batch of images given their initial
+        shapes. At each scale, all the images are fitted at once, in lockstep,
+        with the ``run_batch`` method of the scale's algorithm (e.g.
+        :meth:`RegularisedLandmarkMeanShift.run_batch`), so all images must
+        have the same shape. The result of each image is the same as the
+        result of :meth:`fit_from_shape`.
+
+        Parameters
+        ----------
+        images : `list` of `menpo.image.Image` or subclass
+            The images to be fitted.
+        initial_shapes : `list` of `menpo.shape.PointCloud`
+            The initial shape estimate of each image.
+        max_iters : `int` or `list` of `int`, optional
+            The maximum number of iterations. If `int`, then it specifies the
+            maximum number of iterations over all scales. If `list` of `int`,
+            then specifies the maximum number of iterations per scale.
+        gt_shapes : `list` of `menpo.shape.PointCloud` or ``None``, optional
+            The ground truth shape associated to each image.
+        return_costs : `bool`, optional
+            If ``True``, then the cost function values will be computed
+            during the fitting procedure.
+        response_map_only : `bool`, optional
+            If ``True``, then the algorithms are given pixel-free
+            :map:`ResponseMapImage` objects (see :meth:`fit_from_shape`).
+        compact : `bool`, optional
+            If ``True``, then :map:`CompactResult` objects are returned (see
+            :meth:`fit_from_shape`).
+        compact_shapes : `bool`, optional
+            If ``True`` and `compact` is ``True``, then the compact results
+            also keep the shapes of all the iterations.
+        kwargs : `dict`, optional
+            Additional keyword arguments that can be passed to specific
+            implementations.
+
+        Returns
+        -------
+        fitting_results : `list` of :map:`MultiScaleNonParametricIterativeResult` or subclass or :map:`CompactResult`
+            The multi-scale fitting result of each image. It is ``None`` for
+            images that could not be fitted by the algorithm of some scale.
+        """
+        if response_map_only:
+            prepare = self._prepare_response_map
+        else:
+            prepare = self._prepare_image
+        if gt_shapes is None:
+            gt_shapes = [None] * len(images)
+        prepared = [prepare(image, initial_shape, gt_shape=gt_shape)
+                    for image, initial_shape, gt_shape in
+                    zip(images, initial_shapes, gt_shapes)]
+        max_iters = checks.check_max_iters(max_iters, self.n_scales)
+
+        # Fit all scales, in lockstep over the images that are still fitted
+        shapes = [p[1][0] for p in prepared]
+        algorithm_results = [[] for _ in images]
+        active = list(range(len(images)))
+        for i in range(self.n_scales):
+            if len(active) == 0:
+                # all images failed at a previous scale
+                break
+            results = self.algorithms[i].run_batch(
+                [prepared[j][0][i] for j in active], [shapes[j] for j in active],
+                gt_shapes=[prepared[j][2][i] if prepared[j][2] is not None
+                           else None for j in active],
+                max_iters=max_iters[i], return_costs=return_costs, **kwargs)
+            for j, algorithm_result in zip(active, results):
+                if algorithm_result is None:
+                    algorithm_results[j] = None
+                    continue
+                algorithm_results[j].append(algorithm_result)
+                if i < self.n_scales - 1:
+                    shapes[j] = self._shape_to_next_scale(
+                        algorithm_result.final_shape, i, prepared[j][3],
+                        prepared[j][4])
+            active = [j for j in active if algorithm_results[j] is not None]
+
+        fitting_results = []
+        for j in range(len(images)):
+            if algorithm_results[j] is None:
+                fitting_results.append(None)
+            elif compact:
+                fitting_results.append(self._compact_fitter_result(
+                    algorithm_results=algorithm_results[j],
+                    affine_transforms=prepared[j][3],
+                    scale_transforms=prepared[j][4], gt_shape=gt_shapes[j],
+                    keep_shapes=compact_shapes))
+            else:
+                fitting_results.append(self._fitter_result(
+                    image=images[j], algorithm_results=algorithm_results[j],
+                    affine_transforms=prepared[j][3],
+                    scale_transforms=prepared[j][4], gt_shape=gt_shapes[j]))
+            # release the per-scale results as soon as they are converted
+            algorithm_results[j] = None
+        return fitting_results
+
     def fit_from_bb(self, image, bounding_box, max_iters=20, gt_shape=None,
                     return_costs=False, **kwargs):
         r"""
@@ -1,3 +1,4 @@
 from .regression import (IRLRegression, IIRLRegression, PCRRegression,
-                         OptimalLinearRegression, OPPRegression)
+                         OptimalLinearRegression, OPPRegression,
+                         randomized_svd)
 from .correlationfilter import mccf, imccf, mosse, imosse
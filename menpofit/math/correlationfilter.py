@@ -1,9 +1,79 @@
 import numpy as np
-from numpy.fft import fft2, ifft2, ifftshift
-from scipy.sparse import spdiags, eye as speye
-from scipy.sparse.linalg import spsolve
+from numpy.fft import ifftshift
+from scipy.sparse import coo_matrix
 
-from menpofit.math.fft_utils import pad, crop
+from menpofit.math.fft_utils import (pad, crop, rfft2, irfft2,
+                                     padded_rfft2_chunks,
+                                     hermitian_full_spectrum)
+
+
+# All the images and desired responses are real, so their ffts are Hermitian
+# symmetric. The spectral energies are therefore accumulated and the filters
+# solved on the real ffts (half spectra) of whole image stacks, and only the
+# returned auto and cross spectral energies are expanded to full spectra.
+
+
+def _mosse_spectral_energies(X, fft_ext_y, ext_shape, boundary='constant'):
+    # auto and cross spectral energies (half spectra) of a stack of images
+    sXX = 0
+    sXY = 0
+    for fft_ext_x in padded_rfft2_chunks(X, ext_shape, boundary=boundary):
+        sXX += np.sum(fft_ext_x.conj() * fft_ext_x, axis=0)
+        sXY += np.sum(fft_ext_x.conj() * fft_ext_y, axis=0)
+    return sXX, sXY
+
+
+def _mccf_spectral_energies(X, fft_ext_y, ext_shape, boundary='constant'):
+    # per-frequency channel auto spectral energies ``(k, k, ext_h, n_half)``
+    # and cross spectral energies ``(k, ext_h, n_half)`` of a stack of images
+    sXX = 0
+    sXY = 0
+    for fft_ext_x in padded_rfft2_chunks(X, ext_shape, boundary=boundary):
+        sXX += np.einsum('nkhw,nlhw->klhw', fft_ext_x.conj(), fft_ext_x)
+        sXY += np.sum(fft_ext_x.conj() * fft_ext_y, axis=0)
+    return sXX, sXY
+
+
+def _block_diagonal_indices(k, ext_d):
+    # row and column indices of the (k x k) blocks of diagonal matrices
+    # that form the ``(k * ext_d, k * ext_d)`` mccf auto-correlation matrix
+    c = np.arange(k) * ext_d
+    p = np.arange(ext_d)
+    rows = (c[:, None, None] + p).repeat(k, axis=1)
+    cols = (c[None, :, None] + p).repeat(k, axis=0)
+    return rows, cols
+
+
+def _mccf_sparse_auto_correlation(sXX, ext_w):
+    # expand per-frequency auto spectral energies (half spectra) to the
+    # sparse ``(k * ext_d, k * ext_d)`` auto-correlation matrix
+    k, _, ext_h, _ = sXX.shape
+    ext_d = ext_h * ext_w
+    rows, cols = _block_diagonal_indices(k, ext_d)
+    data = hermitian_full_spectrum(sXX, ext_w).reshape((k, k, ext_d))
+    return coo_matrix((data.ravel(), (rows.ravel(), cols.ravel())),
+                      shape=(k * ext_d, k * ext_d)).tocsr()
+
+
+def _mccf_auto_correlation_blocks(B, k, ext_shape):
+    # per-frequency (half spectra) blocks of a sparse auto-correlation matrix
+    ext_h, ext_w = ext_shape
+    n_half = ext_w // 2 + 1
+    rows, cols = _block_diagonal_indices(k, ext_h * ext_w)
+    rows = rows.reshape((k, k, ext_h, ext_w))[..., :n_half]
+    cols = cols.reshape((k, k, ext_h, ext_w))[..., :n_half]
+    blocks = B.tocsr()[rows.ravel(), cols.ravel()]
+    return np.asarray(blocks).reshape((k, k, ext_h, n_half))
+
+
+def _mccf_solve(sXX, sXY, l, ext_shape):
+    # solve the independent k x k linear systems (with regularization) of
+    # all frequencies, and return the spatial extended filter
+    k, _, ext_h, n_half = sXX.shape
+    A = sXX.reshape((k, k, -1)).transpose((2, 0, 1)) + l * np.eye(k)
+    b = sXY.reshape((k, -1)).T[..., None]
+    fft_ext_f = np.linalg.solve(A, b)[..., 0].T.reshape((k, ext_h, n_half))
+    return ifftshift(irfft2(fft_ext_f, s=ext_shape), axes=(-2, -1))
 
 
 def mosse(X, y, l=0.01, boundary='constant', crop_filter=True):
@@ -59,35 +129,26 @@ def mosse(X, y, l=0.01, boundary='constant', crop_filter=True):
     # extend desired response
     ext_y = pad(y, ext_shape)
     # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
-
-    # auto and cross spectral energy matrices
-    sXX = 0
-    sXY = 0
-    # for each training image and desired response
-    for x in X:
-        # extend image
-        ext_x = pad(x, ext_shape, boundary=boundary)
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
+    fft_ext_y = rfft2(ext_y)
 
-        # update auto and cross spectral energy matrices
-        sXX += fft_ext_x.conj() * fft_ext_x
-        sXY += fft_ext_x.conj() * fft_ext_y
+    # auto and cross spectral energy matrices of all training images
+    sXX, sXY = _mosse_spectral_energies(X, fft_ext_y, ext_shape,
+                                        boundary=boundary)
 
     # compute desired correlation filter
     fft_ext_f = sXY / (sXX + l)
     # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
+    fft_ext_f = fft_ext_f.reshape((k, ext_h, -1))
 
     # compute extended filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = ifftshift(irfft2(fft_ext_f, s=ext_shape), axes=(-2, -1))
 
     if crop_filter:
         # crop extended filter to match desired response shape
         f = crop(f, y_shape)
 
-    return f, sXY, sXX
+    return (f, hermitian_full_spectrum(sXY, ext_w),
+            hermitian_full_spectrum(sXX, ext_w))
 
 
 def imosse(A, B, n_ab, X, y, l=0.01, boundary='constant',
@@ -165,33 +226,23 @@ def imosse(A, B, n_ab, X, y, l=0.01, boundary='constant',
     # extend desired response
     ext_y = pad(y, ext_shape)
     # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
-
-    # extend images
-    ext_X = pad(X, ext_shape, boundary=boundary)
-
-    # auto and cross spectral energy matrices
-    sXX = 0
-    sXY = 0
-    # for each training image and desired response
-    for ext_x in ext_X:
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
+    fft_ext_y = rfft2(ext_y)
 
-        # update auto and cross spectral energy matrices
-        sXX += fft_ext_x.conj() * fft_ext_x
-        sXY += fft_ext_x.conj() * fft_ext_y
+    # auto and cross spectral energy matrices of all training images
+    sXX, sXY = _mosse_spectral_energies(X, fft_ext_y, ext_shape,
+                                        boundary=boundary)
 
     # combine old and new auto and cross spectral energy matrices
-    sXY = nu_ab * A + nu_x * sXY
-    sXX = nu_ab * B + nu_x * sXX
-    # compute desired correlation filter
-    fft_ext_f = sXY / (sXX + l)
+    sXY = nu_ab * A + nu_x * hermitian_full_spectrum(sXY, ext_w)
+    sXX = nu_ab * B + nu_x * hermitian_full_spectrum(sXX, ext_w)
+    # compute desired correlation filter (on the half spectrum)
+    n_half = ext_w // 2 + 1
+    fft_ext_f = sXY[..., :n_half] / (sXX[..., :n_half] + l)
     # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
+    fft_ext_f = fft_ext_f.reshape((k, ext_h, n_half))
 
     # compute filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = ifftshift(irfft2(fft_ext_f, s=ext_shape), axes=(-2, -1))
 
     if crop_filter:
         # crop extended filter to match desired response shape
@@ -248,49 +299,27 @@ def mccf(X, y, l=0.01, boundary='constant', crop_filter=True):
     ext_h = hx + hy - 1
     ext_w = wx + wy - 1
     ext_shape = (ext_h, ext_w)
-    # extended dimensionality
-    ext_d = ext_h * ext_w
 
     # extend desired response
     ext_y = pad(y, ext_shape)
     # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
+    fft_ext_y = rfft2(ext_y)
 
-    # extend images
-    ext_X = pad(X, ext_shape, boundary=boundary)
-
-    # auto and cross spectral energy matrices
-    sXX = 0
-    sXY = 0
-    # for each training image and desired response
-    for ext_x in ext_X:
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
-
-        # store extended image fft as sparse diagonal matrix
-        diag_fft_x = spdiags(fft_ext_x.reshape((k, -1)),
-                             -np.arange(0, k) * ext_d, ext_d * k, ext_d).T
-        # vectorize extended desired response fft
-        diag_fft_y = fft_ext_y.ravel()
-
-        # update auto and cross spectral energy matrices
-        sXX += diag_fft_x.conj().T.dot(diag_fft_x)
-        sXY += diag_fft_x.conj().T.dot(diag_fft_y)
+    # auto and cross spectral energy matrices of all training images, as
+    # k x k blocks per frequency
+    sXX, sXY = _mccf_spectral_energies(X, fft_ext_y, ext_shape,
+                                       boundary=boundary)
 
     # solve ext_d independent k x k linear systems (with regularization)
     # to obtain desired extended multi-channel correlation filter
-    fft_ext_f = spsolve(sXX + l * speye(sXX.shape[-1]), sXY)
-    # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
-
-    # compute filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = _mccf_solve(sXX, sXY, l, ext_shape)
 
     if crop_filter:
         # crop extended filter to match desired response shape
         f = crop(f, y_shape)
 
-    return f, sXY, sXX
+    return (f, hermitian_full_spectrum(sXY, ext_w).ravel(),
+            _mccf_sparse_auto_correlation(sXX, ext_w))
 
 
 def imccf(A, B, n_ab, X, y, l=0.01, boundary='constant', crop_filter=True,
@@ -367,48 +396,28 @@ def imccf(A, B, n_ab, X, y, l=0.01, boundary='constant', crop_filter=True,
     ext_h = hz + hy - 1
     ext_w = wz + wy - 1
     ext_shape = (ext_h, ext_w)
-    # extended dimensionality
-    ext_d = ext_h * ext_w
 
     # extend desired response
     ext_y = pad(y, ext_shape)
     # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
-
-    # extend images
-    ext_X = pad(X, ext_shape, boundary=boundary)
-
-    # auto and cross spectral energy matrices
-    sXX = 0
-    sXY = 0
-    # for each training image and desired response
-    for ext_x in ext_X:
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
+    fft_ext_y = rfft2(ext_y)
 
-        # store extended image fft as sparse diagonal matrix
-        diag_fft_x = spdiags(fft_ext_x.reshape((k, -1)),
-                             -np.arange(0, k) * ext_d, ext_d * k, ext_d).T
-        # vectorize extended desired response fft
-        diag_fft_y = fft_ext_y.ravel()
-
-        # update auto and cross spectral energy matrices
-        sXX += diag_fft_x.conj().T.dot(diag_fft_x)
-        sXY += diag_fft_x.conj().T.dot(diag_fft_y)
+    # auto and cross spectral energy matrices of all training images, as
+    # k x k blocks per frequency
+    sXX, sXY = _mccf_spectral_energies(X, fft_ext_y, ext_shape,
+                                       boundary=boundary)
 
     # combine old and new auto and cross spectral energy matrices
-    sXY = nu_ab * A + nu_x * sXY
-    sXX = nu_ab * B + nu_x * sXX
+    n_half = ext_w // 2 + 1
+    sXY_full = nu_ab * A + nu_x * hermitian_full_spectrum(sXY, ext_w).ravel()
+    sXY = sXY_full.reshape((k, ext_h, ext_w))[..., :n_half]
+    sXX = (nu_ab * _mccf_auto_correlation_blocks(B, k, ext_shape) +
+           nu_x * sXX)
     # solve ext_d independent k x k linear systems (with regularization)
     # to obtain desired extended multi-channel correlation filter
-    fft_ext_f = spsolve(sXX + l * speye(sXX.shape[-1]), sXY)
-    # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
-
-    # compute filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = _mccf_solve(sXX, sXY, l, ext_shape)
     if crop_filter:
         # crop extended filter to match desired response shape
         f = crop(f, y_shape)
 
-    return f, sXY, sXX
+    return f, sXY_full, _mccf_sparse_auto_correlation(sXX, ext_w)
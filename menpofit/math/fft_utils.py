@@ -1,7 +1,9 @@
 from __future__ import division
 import warnings
+import threading
 import numpy as np
 from functools import wraps
+from multiprocessing import cpu_count
 
 from menpo.feature.base import rebuild_feature_image
 
@@ -13,12 +15,14 @@ try:
         # try calling fft2 on a 4-dimensional array (this is known to have
         # problem in some linux distributions)
         fft2(np.zeros((1, 1, 1, 1)))
+        _use_pyfftw = True
     except RuntimeError:
         warnings.warn("pyfftw is known to be buggy on your system, numpy.fft "
                       "will be used instead. Consequently, all algorithms "
                       "using ffts will be running at a slower speed.",
                       RuntimeWarning)
         from numpy.fft import fft2, ifft2, fftshift, ifftshift
+        _use_pyfftw = False
 except ImportError:
     warnings.warn("pyfftw is not installed on your system, numpy.fft will be "
                   "used instead. Consequently, all algorithms using ffts "
@@ -26,6 +30,25 @@ except ImportError:
                   "pyfftw (pip install pyfftw) to speed up your ffts.",
                   ImportWarning)
     from numpy.fft import fft2, ifft2, fftshift, ifftshift
+    _use_pyfftw = False
+
+if _use_pyfftw:
+    # multithreaded real ffts, with the fftw plans cached between calls
+    import pyfftw.interfaces.cache
+    from pyfftw.interfaces import numpy_fft as _pyfftw_fft
+    pyfftw.interfaces.cache.enable()
+    _fft_threads = cpu_count()
+
+    def rfft2(x, s=None, axes=(-2, -1)):
+        return _pyfftw_fft.rfft2(x, s=s, axes=axes, threads=_fft_threads)
+
+    def irfft2(x, s=None, axes=(-2, -1)):
+        return _pyfftw_fft.irfft2(x, s=s, axes=axes, threads=_fft_threads)
+else:
+    from numpy.fft import rfft2, irfft2
+
+# per-thread padding workspaces, reused between calls with the same shape
+_workspaces = threading.local()
 
 
 # TODO: Document me!
@@ -71,6 +94,109 @@ def crop(pixels, shape):
                   w_margin + w_corrector:-w_margin]
 
 
+def _pad_margins(shape, ext_shape):
+    # same (top, left) margins as pad
+    h, w = shape[-2:]
+    h_margin = (ext_shape[0] - h) // 2
+    if h + 2 * h_margin < ext_shape[0]:
+        h_margin += 1
+    w_margin = (ext_shape[1] - w) // 2
+    if w + 2 * w_margin < ext_shape[1]:
+        w_margin += 1
+    return h_margin, w_margin
+
+
+def pad_workspace(pixels, ext_shape, boundary='constant'):
+    r"""
+    Pads the last two axes of `pixels` to `ext_shape`, like :func:`pad`, but
+    into a zero-padded workspace that is reused by later calls (of the same
+    thread) with the same shapes. The returned array is therefore only valid
+    until the next call, and must not be modified.
+
+    Parameters
+    ----------
+    pixels : ``(..., height, width)`` `ndarray`
+        The array to pad.
+    ext_shape : (`int`, `int`)
+        The padded shape of the last two axes.
+    boundary : ``{'constant', 'symmetric'}``, optional
+        Determines how the array is padded. Only ``'constant'`` padding uses
+        a workspace.
+
+    Returns
+    -------
+    padded : ``(..., ext_shape[0], ext_shape[1])`` `ndarray`
+        The padded array.
+    """
+    if boundary != 'constant':
+        return pad(pixels, ext_shape, boundary=boundary)
+    ext_shape = tuple(int(e) for e in ext_shape)
+    key = (pixels.shape, ext_shape, pixels.dtype.str)
+    if getattr(_workspaces, 'key', None) != key:
+        _workspaces.key = key
+        _workspaces.padded = np.zeros(pixels.shape[:-2] + ext_shape,
+                                      dtype=pixels.dtype)
+    h_margin, w_margin = _pad_margins(pixels.shape, ext_shape)
+    h, w = pixels.shape[-2:]
+    # The margins are never written, so they remain zero
+    _workspaces.padded[..., h_margin:h_margin + h,
+                       w_margin:w_margin + w] = pixels
+    return _workspaces.padded
+
+
+def padded_rfft2_chunks(X, ext_shape, boundary='constant', chunk_size=256):
+    r"""
+    Generator of the real ffts of the padded images of a stack, computed on
+    chunks of `chunk_size` images at a time. The padded chunks share a single
+    workspace.
+
+    Parameters
+    ----------
+    X : ``(n_images, n_channels, height, width)`` `ndarray`
+        The stack of images.
+    ext_shape : (`int`, `int`)
+        The padded shape of the images.
+    boundary : ``{'constant', 'symmetric'}``, optional
+        Determines how the images are padded.
+    chunk_size : `int`, optional
+        The number of images transformed at once.
+
+    Yields
+    ------
+    fft_ext_X : ``(chunk_size, n_channels, ext_shape[0], ext_shape[1] // 2 + 1)`` `ndarray`
+        The real ffts of the padded images of a chunk.
+    """
+    for start in range(0, X.shape[0], chunk_size):
+        yield rfft2(pad_workspace(X[start:start + chunk_size], ext_shape,
+                                  boundary=boundary))
+
+
+def hermitian_full_spectrum(fft_half, ext_w):
+    r"""
+    Recovers the full 2D spectrum of a real signal from its real fft (i.e.
+    the output of ``rfft2``), using Hermitian symmetry.
+
+    Parameters
+    ----------
+    fft_half : ``(..., ext_h, ext_w // 2 + 1)`` `ndarray`
+        The real fft on the last two axes.
+    ext_w : `int`
+        The width of the signal.
+
+    Returns
+    -------
+    fft_full : ``(..., ext_h, ext_w)`` `ndarray`
+        The full fft, i.e. the output of ``fft2`` on the signal.
+    """
+    ext_h, n_half = fft_half.shape[-2:]
+    fft_full = np.empty(fft_half.shape[:-1] + (ext_w,), dtype=fft_half.dtype)
+    fft_full[..., :n_half] = fft_half
+    rows = -np.arange(ext_h) % ext_h
+    cols = ext_w - np.arange(n_half, ext_w)
+    fft_full[..., n_half:] = np.conj(fft_half[..., rows, :][..., cols])
+    return fft_full
+
+
 # TODO: Document me!
 def ndconvolution(wrapped):
     r"""
@@ -121,16 +247,17 @@ def fft_convolve2d(x, f, mode='same', boundary='constant', fft_filter=False):
         Result of convolving each image channel with its corresponding
         filter channel.
     """
+    # image and filter are real, so real ffts (half spectra) are used
     if fft_filter:
         # extended shape is filter shape
         ext_shape = np.asarray(f.shape[-2:])
 
-        # extend image and filter
-        ext_x = pad(x, ext_shape, boundary=boundary)
+        # extend image
+        ext_x = pad_workspace(x, ext_shape, boundary=boundary)
 
         # compute ffts of extended image
-        fft_ext_x = fft2(ext_x)
-        fft_ext_f = f
+        fft_ext_x = rfft2(ext_x)
+        fft_ext_f = f[..., :fft_ext_x.shape[-1]]
     else:
         # extended shape
         x_shape = np.asarray(x.shape[-2:])
@@ -143,14 +270,14 @@ def fft_convolve2d(x, f, mode='same', boundary='constant', fft_filter=False):
         ext_f = pad(f, ext_shape)
 
         # compute ffts of extended image and extended filter
-        fft_ext_x = fft2(ext_x)
-        fft_ext_f = fft2(ext_f)
+        fft_ext_x = rfft2(ext_x)
+        fft_ext_f = rfft2(ext_f)
 
     # compute extended convolution in Fourier domain
     fft_ext_c = fft_ext_f * fft_ext_x
 
     # compute ifft of extended convolution
-    ext_c = np.real(ifftshift(ifft2(fft_ext_c), axes=(-2, -1)))
+    ext_c = ifftshift(irfft2(fft_ext_c, s=tuple(ext_shape)), axes=(-2, -1))
 
     if mode is 'full':
         return ext_c
@@ -199,20 +326,20 @@ def fft_convolve2d_sum(x, f, mode='same', boundary='constant',
         Result of convolving each image channel with its corresponding
         filter channel and summing across the channel axis.
     """
+    # image and filter are real, so real ffts (half spectra) are used
     if fft_filter:
-        fft_ext_f = f
-
         # extended shape is fft_ext_filter shape
         x_shape = np.asarray(x.shape[-2:])
-        f_shape = ((np.asarray(fft_ext_f.shape[-2:]) + 1) / 1.5).astype(int)
+        f_shape = ((np.asarray(f.shape[-2:]) + 1) / 1.5).astype(int)
         f_half_shape = (f_shape / 2).astype(int)
         ext_shape = np.asarray(f.shape[-2:])
 
-        # extend image and filter
-        ext_x = pad(x, ext_shape, boundary=boundary)
+        # extend image
+        ext_x = pad_workspace(x, ext_shape, boundary=boundary)
 
         # compute ffts of extended image
-        fft_ext_x = fft2(ext_x)
+        fft_ext_x = rfft2(ext_x)
+        fft_ext_f = f[..., :fft_ext_x.shape[-1]]
     else:
         # extended shape
         x_shape = np.asarray(x.shape[-2:])
@@ -225,14 +352,14 @@ def fft_convolve2d_sum(x, f, mode='same', boundary='constant',
         ext_f = pad(f, ext_shape)
 
         # compute ffts of extended image and extended filter
-        fft_ext_x = fft2(ext_x)
-        fft_ext_f = fft2(ext_f)
+        fft_ext_x = rfft2(ext_x)
+        fft_ext_f = rfft2(ext_f)
 
     # compute extended convolution in Fourier domain
     fft_ext_c = np.sum(fft_ext_f * fft_ext_x, axis=axis, keepdims=keepdims)
 
     # compute ifft of extended convolution
-    ext_c = np.real(ifftshift(ifft2(fft_ext_c), axes=(-2, -1)))
+    ext_c = ifftshift(irfft2(fft_ext_c, s=tuple(ext_shape)), axes=(-2, -1))
 
     if mode is 'full':
         return ext_c
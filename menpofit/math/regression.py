@@ -1,8 +1,139 @@
+from functools import partial
 import numpy as np
+from scipy.linalg import cho_solve
 
 from menpo.math import pca
 
 
+def _row_chunks(X, chunk_size=None, bias=False):
+    # In-memory chunks of consecutive rows of X (e.g. of a memory map),
+    # optionally with an appended column of ones
+    n_samples = X.shape[0]
+    if chunk_size is None:
+        chunk_size = n_samples
+    for start in range(0, n_samples, chunk_size):
+        x = np.asarray(X[start:start + chunk_size])
+        if bias:
+            x = np.hstack((x, np.ones((x.shape[0], 1))))
+        yield x
+
+
+def randomized_svd(X, n_components, n_oversamples=10, n_power_iterations=2,
+                   chunk_size=None, bias=False, random_state=None):
+    r"""
+    Computes the truncated Singular Value Decomposition of the first
+    `n_components` components of a matrix using randomized range finding [1].
+    The matrix is only accessed by products over chunks of its rows, thus it
+    can be a memory map that does not fit in memory.
+
+    Parameters
+    ----------
+    X : ``(n_samples, n_features)`` `ndarray`
+        The matrix to decompose.
+    n_components : `int`
+        The number of singular values and vectors to compute.
+    n_oversamples : `int`, optional
+        The number of additional random vectors used for finding the range of
+        `X`. Larger values improve the accuracy.
+    n_power_iterations : `int`, optional
+        The number of power iterations. Larger values improve the accuracy
+        when the singular values of `X` decay slowly, at the cost of two more
+        passes over `X` each.
+    chunk_size : `int` or ``None``, optional
+        The number of rows of `X` that are processed at a time. If ``None``,
+        then all the rows are processed at once.
+    bias : `bool`, optional
+        If ``True``, then the decomposition is of `X` with an appended column
+        of ones, which is never materialized as a whole.
+    random_state : `int` or `numpy.random.RandomState` or ``None``, optional
+        The seed or state of the random number generator.
+
+    Returns
+    -------
+    U : ``(n_samples, n_components)`` `ndarray`
+        The left singular vectors.
+    s : ``(n_components,)`` `ndarray`
+        The singular values, in descending order.
+    V : ``(n_components, n_features)`` `ndarray`
+        The right singular vectors.
+
+    References
+    ----------
+    .. [1] N. Halko, P. G. Martinsson, and J. A. Tropp. "Finding structure
+        with randomness: Probabilistic algorithms for constructing
+        approximate matrix decompositions", SIAM Review, 2011.
+    """
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    chunks = partial(_row_chunks, X, chunk_size=chunk_size, bias=bias)
+
+    def dot(M):
+        # X M
+        return np.vstack([x.dot(M) for x in chunks()])
+
+    def t_dot(M):
+        # X^T M
+        XM = 0
+        start = 0
+        for x in chunks():
+            XM += x.T.dot(M[start:start + x.shape[0]])
+            start += x.shape[0]
+        return XM
+
+    n_features = X.shape[1] + int(bias)
+    n_random = min(n_components + n_oversamples, X.shape[0], n_features)
+
+    # Orthonormal basis of the range of X, refined with power iterations
+    Q = dot(random_state.normal(size=(n_features, n_random)))
+    for _ in range(n_power_iterations):
+        Q, _ = np.linalg.qr(Q)
+        Z, _ = np.linalg.qr(t_dot(Q))
+        Q = dot(Z)
+    Q, _ = np.linalg.qr(Q)
+
+    # SVD of the projection of X on the basis
+    U, s, V = np.linalg.svd(t_dot(Q).T, full_matrices=False)
+    U = Q.dot(U[:, :n_components])
+    return U, s[:n_components], V[:n_components]
+
+
+def cholesky_update(L, X):
+    r"""
+    Rank-k update of a Cholesky factorization, i.e. computes the lower
+    triangular Cholesky factor of ``L L^T + X^T X``. The update is performed
+    with a sequence of rank-1 updates, one per row of `X`, unless the rank of
+    the update is large enough for a new factorization to be cheaper.
+
+    Parameters
+    ----------
+    L : ``(n_features, n_features)`` `ndarray`
+        The lower triangular Cholesky factor.
+    X : ``(n_samples, n_features)`` `ndarray`
+        The rows of the update.
+
+    Returns
+    -------
+    L : ``(n_features, n_features)`` `ndarray`
+        The updated lower triangular Cholesky factor.
+    """
+    n_samples, n_features = X.shape
+    if 6 * n_samples >= n_features:
+        M = L.dot(L.T) + X.T.dot(X)
+        return np.linalg.cholesky((M + M.T) / 2.0)
+
+    # Rank-1 updates work on the rows of the upper triangular factor
+    R = np.array(L.T, dtype=np.float64, order='C')
+    for x in np.array(X, dtype=np.float64):
+        for k in range(n_features):
+            r = np.hypot(R[k, k], x[k])
+            c = r / R[k, k]
+            s = x[k] / R[k, k]
+            R[k, k] = r
+            R[k, k + 1:] = (R[k, k + 1:] + s * x[k + 1:]) / c
+            x[k + 1:] = c * x[k + 1:] - s * R[k, k + 1:]
+    return R.T
+
+
 class IRLRegression(object):
     r"""
     Class for training and applying Incremental Regularized Linear Regression.
@@ -16,14 +147,40 @@ class IRLRegression(object):
     incrementable : `bool`, optional
         If ``True``, then the regression model will have the ability to get
         incremented.
+    cholesky : `bool`, optional
+        If ``True``, then the regularized covariance is solved with (and, if
+        `incrementable`, stored as) its Cholesky factorization ``L`` instead
+        of its inverse ``V``, and increments are rank-k updates of the
+        factorization.
+    dtype : `numpy.dtype` or ``None``, optional
+        The dtype in which the model is stored, e.g. ``np.float32`` to halve
+        its size and speed up predictions. The model is always trained in
+        double precision. If ``None``, then the training dtype is kept.
     """
-    def __init__(self, alpha=0, bias=True, incrementable=False):
+    def __init__(self, alpha=0, bias=True, incrementable=False,
+                 cholesky=False, dtype=None):
         self.alpha = alpha
         self.bias = bias
         self.incrementable = incrementable
+        self.cholesky = cholesky
+        self.dtype = dtype
         self.V = None
+        self.L = None
         self.W = None
 
+    def __setstate__(self, state):
+        # Models pickled before the Cholesky and dtype options were added
+        state.setdefault('cholesky', False)
+        state.setdefault('dtype', None)
+        state.setdefault('L', None)
+        self.__dict__.update(state)
+
+    def _astype(self, a):
+        # cast an array to the storage dtype
+        if self.dtype is None:
+            return a
+        return a.astype(self.dtype)
+
     def train(self, X, Y):
         r"""
         Train the regression model.
@@ -40,14 +197,47 @@ class IRLRegression(object):
             X = np.hstack((X, np.ones((X.shape[0], 1))))
 
         # regularized linear regression
-        XX = X.T.dot(X)
+        self._solve(X.T.dot(X), X.T.dot(Y))
+
+    def train_chunks(self, chunks):
+        r"""
+        Train the regression model on chunks of samples, so that only a
+        single chunk needs to be in memory at a time. The normal equations
+        are accumulated over the chunks, thus the trained model is the same
+        as the one of :meth:`train` on all the samples.
+
+        Parameters
+        ----------
+        chunks : `iterable` of ``(X, Y)``
+            The chunks of ``(n_samples, n_features)`` feature vectors and
+            ``(n_samples, n_dims)`` target vectors.
+        """
+        XX = 0
+        XY = 0
+        for X, Y in chunks:
+            if self.bias:
+                # add bias
+                X = np.hstack((X, np.ones((X.shape[0], 1))))
+            XX += X.T.dot(X)
+            XY += X.T.dot(Y)
+
+        # regularized linear regression
+        self._solve(XX, XY)
+
+    def _solve(self, XX, XY):
         # ensure covariance is perfectly symmetric for inversion
         XX = (XX + XX.T) / 2.0
         if self.alpha:
             np.fill_diagonal(XX, self.alpha + np.diag(XX))
-        if self.incrementable:
-            self.V = np.linalg.inv(XX)
-        self.W = np.linalg.solve(XX, X.T.dot(Y))
+        if self.cholesky:
+            L = np.linalg.cholesky(XX)
+            if self.incrementable:
+                self.L = self._astype(L)
+            self.W = self._astype(cho_solve((L, True), XY))
+        else:
+            if self.incrementable:
+                self.V = self._astype(np.linalg.inv(XX))
+            self.W = self._astype(np.linalg.solve(XX, XY))
 
     def increment(self, X, Y):
         r"""
@@ -72,14 +262,29 @@ class IRLRegression(object):
             # add bias
             X = np.hstack((X, np.ones((X.shape[0], 1))))
 
-        # incremental regularized linear regression
-        U = X.dot(self.V).dot(X.T)
-        if self.alpha:
-            np.fill_diagonal(U, self.alpha + np.diag(U))
+        if self.cholesky:
+            # incremental regularized linear regression by rank-k update of
+            # the Cholesky factorization of the covariance
+            L = np.asarray(self.L, dtype=np.float64)
+            W = np.asarray(self.W, dtype=np.float64)
+            # right hand side of the normal equations of all the samples
+            XY = L.dot(L.T.dot(W)) + X.T.dot(Y)
+            L = cholesky_update(L, X)
+            self.L = self._astype(L)
+            self.W = self._astype(cho_solve((L, True), XY))
+            return
+
+        V = np.asarray(self.V, dtype=np.float64)
+        W = np.asarray(self.W, dtype=np.float64)
+        # incremental regularized linear regression (Woodbury identity). The
+        # regularization is already part of V, thus it is not added again.
+        U = X.dot(V).dot(X.T)
+        np.fill_diagonal(U, 1 + np.diag(U))
         U = np.linalg.inv(U)
-        Q = self.V.dot(X.T).dot(U).dot(X)
-        self.V = self.V - Q.dot(self.V)
-        self.W = self.W - Q.dot(self.W) + self.V.dot(X.T.dot(Y))
+        Q = V.dot(X.T).dot(U).dot(X)
+        V = V - Q.dot(V)
+        self.V = self._astype(V)
+        self.W = self._astype(W - Q.dot(W) + V.dot(X.T.dot(Y)))
 
     def predict(self, x):
         r"""
@@ -100,7 +305,7 @@ class IRLRegression(object):
                 x = np.hstack((x, np.ones(1)))
             else:
                 x = np.hstack((x, np.ones((x.shape[0], 1))))
-        return np.dot(x, self.W)
+        return np.dot(x.astype(self.W.dtype, copy=False), self.W)
 
 
 class IIRLRegression(IRLRegression):
@@ -116,10 +321,17 @@ class IIRLRegression(IRLRegression):
         If ``True``, a bias term is used.
     alpha2 : `float`, optional
         The regularization parameter of the Hessian.
+    cholesky : `bool`, optional
+        If ``True``, then the Cholesky factorization is used instead of the
+        inverse (see :map:`IRLRegression`).
+    dtype : `numpy.dtype` or ``None``, optional
+        The dtype in which the model is stored (see :map:`IRLRegression`).
     """
-    def __init__(self, alpha=0, bias=False, alpha2=0):
+    def __init__(self, alpha=0, bias=False, alpha2=0, cholesky=False,
+                 dtype=None):
         # TODO: Can we model the bias? May need to slice off of prediction?
-        super(IIRLRegression, self).__init__(alpha=alpha, bias=False)
+        super(IIRLRegression, self).__init__(alpha=alpha, bias=False,
+                                             cholesky=cholesky, dtype=dtype)
         self.alpha2 = alpha2
 
     def train(self, X, Y):
@@ -135,14 +347,37 @@ class IIRLRegression(IRLRegression):
         """
         # regularized linear regression exchanging the roles of X and Y
         super(IIRLRegression, self).train(Y, X)
-        J = self.W
+        J = np.asarray(self.W, dtype=np.float64)
+        # solve the original problem by computing the pseudo-inverse of the
+        # previous solution
+        # Note that everything is transposed from the above exchanging of roles
+        H = J.dot(J.T)
+        if self.alpha2:
+            np.fill_diagonal(H, self.alpha2 + np.diag(H))
+        self.W = self._astype(np.linalg.solve(H, J).T)
+
+    def train_chunks(self, chunks):
+        r"""
+        Train the regression model on chunks of samples, so that only a
+        single chunk needs to be in memory at a time. The trained model is
+        the same as the one of :meth:`train` on all the samples.
+
+        Parameters
+        ----------
+        chunks : `iterable` of ``(X, Y)``
+            The chunks of ``(n_samples, n_features)`` feature vectors and
+            ``(n_samples, n_dims)`` target vectors.
+        """
+        # regularized linear regression exchanging the roles of X and Y
+        super(IIRLRegression, self).train_chunks((Y, X) for X, Y in chunks)
+        J = np.asarray(self.W, dtype=np.float64)
         # solve the original problem by computing the pseudo-inverse of the
         # previous solution
         # Note that everything is transposed from the above exchanging of roles
         H = J.dot(J.T)
         if self.alpha2:
             np.fill_diagonal(H, self.alpha2 + np.diag(H))
-        self.W = np.linalg.solve(H, J).T
+        self.W = self._astype(np.linalg.solve(H, J).T)
 
     def increment(self, X, Y):
         r"""
@@ -162,14 +397,14 @@ class IIRLRegression(IRLRegression):
         """
         # incremental least squares exchanging the roles of X and Y
         super(IIRLRegression, self).increment(Y, X)
-        J = self.W
+        J = np.asarray(self.W, dtype=np.float64)
         # solve the original problem by computing the pseudo-inverse of the
         # previous solution
         # Note that everything is transposed from the above exchanging of roles
         H = J.dot(J.T)
         if self.alpha2:
             np.fill_diagonal(H, self.alpha2 + np.diag(H))
-        self.W = np.linalg.solve(H, J)
+        self.W = self._astype(np.linalg.solve(H, J))
 
     def predict(self, x):
         r"""
@@ -185,7 +420,7 @@ class IIRLRegression(IRLRegression):
         prediction : ``(n_dims,)`` `ndarray`
             The prediction vector.
         """
-        return np.dot(x, self.W)
+        return np.dot(x.astype(self.W.dtype, copy=False), self.W)
 
 
 class PCRRegression(object):
@@ -199,10 +434,26 @@ class PCRRegression(object):
         The SVD variance.
     bias : `bool`, optional
         If ``True``, a bias term is used.
+    n_components : `int` or ``None``, optional
+        If an `int` is provided, then only the first `n_components` singular
+        vectors are computed, with a randomized truncated SVD (see
+        :func:`randomized_svd`) that processes the feature vectors in chunks.
+        The `variance` is then measured with respect to these components. If
+        ``None``, then the exact SVD is used.
+    chunk_size : `int` or ``None``, optional
+        The number of samples processed at a time by the randomized SVD. If
+        ``None``, then all the samples are processed at once.
+    random_state : `int` or `numpy.random.RandomState` or ``None``, optional
+        The seed or state of the random number generator of the randomized
+        SVD.
     """
-    def __init__(self, variance=None, bias=True):
+    def __init__(self, variance=None, bias=True, n_components=None,
+                 chunk_size=1024, random_state=None):
         self.variance = variance
         self.bias = bias
+        self.n_components = n_components
+        self.chunk_size = chunk_size
+        self.random_state = random_state
         self.R = None
         self.V = None
 
@@ -217,11 +468,18 @@ class PCRRegression(object):
         Y : ``(n_dims, n_samples)`` `ndarray`
             The array of target vectors.
         """
-        if self.bias:
-            X = np.hstack((X, np.ones((X.shape[0], 1))))
+        if self.n_components is not None:
+            # Randomized truncated SVD over chunks of X (and the bias)
+            U, s, self.V = randomized_svd(X, self.n_components,
+                                          chunk_size=self.chunk_size,
+                                          bias=self.bias,
+                                          random_state=self.random_state)
+        else:
+            if self.bias:
+                X = np.hstack((X, np.ones((X.shape[0], 1))))
+            U, s, self.V = np.linalg.svd(X, full_matrices=False)
 
         # Reduce variance
-        U, s, self.V = np.linalg.svd(X, full_matrices=False)
         if self.variance:
             variation = np.cumsum(s) / np.sum(s)
             # Inverted for easier parameter semantics
@@ -0,0 +1,111 @@
+import numpy as np
+from numpy.fft import fft2, ifft2, ifftshift
+from numpy.testing import assert_allclose
+from scipy.sparse import spdiags, eye as speye
+from scipy.sparse.linalg import spsolve
+
+from menpofit.math import mccf, imccf, mosse, imosse
+from menpofit.math.fft_utils import (pad, crop, fft_convolve2d,
+                                     fft_convolve2d_sum,
+                                     hermitian_full_spectrum, rfft2)
+
+
+rng = np.random.RandomState(0)
+X = rng.normal(size=(7, 2, 9, 8))
+X_new = rng.normal(size=(3, 2, 9, 8))
+y = rng.normal(size=(1, 5, 4))
+
+
+def mosse_loop(X, y, l=0.01):
+    # reference (full complex fft) implementation
+    ext_shape = (X.shape[-2] + y.shape[-2] - 1, X.shape[-1] + y.shape[-1] - 1)
+    fft_ext_y = fft2(pad(y, ext_shape))
+    sXX = 0
+    sXY = 0
+    for x in X:
+        fft_ext_x = fft2(pad(x, ext_shape))
+        sXX += fft_ext_x.conj() * fft_ext_x
+        sXY += fft_ext_x.conj() * fft_ext_y
+    f = np.real(ifftshift(ifft2(sXY / (sXX + l)), axes=(-2, -1)))
+    return crop(f, y.shape[-2:]), sXY, sXX
+
+
+def mccf_loop(X, y, l=0.01):
+    # reference (sparse) implementation
+    k = X.shape[1]
+    ext_shape = (X.shape[-2] + y.shape[-2] - 1, X.shape[-1] + y.shape[-1] - 1)
+    ext_d = ext_shape[0] * ext_shape[1]
+    fft_ext_y = fft2(pad(y, ext_shape))
+    sXX = 0
+    sXY = 0
+    for x in X:
+        fft_ext_x = fft2(pad(x, ext_shape))
+        diag_fft_x = spdiags(fft_ext_x.reshape((k, -1)),
+                             -np.arange(0, k) * ext_d, ext_d * k, ext_d).T
+        sXX += diag_fft_x.conj().T.dot(diag_fft_x)
+        sXY += diag_fft_x.conj().T.dot(fft_ext_y.ravel())
+    fft_ext_f = spsolve(sXX + l * speye(sXX.shape[-1]), sXY)
+    f = np.real(ifftshift(ifft2(fft_ext_f.reshape((k,) + ext_shape)),
+                          axes=(-2, -1)))
+    return crop(f, y.shape[-2:]), sXY, sXX
+
+
+def test_hermitian_full_spectrum():
+    for shape in [(6, 8), (7, 9)]:
+        x = rng.normal(size=(2,) + shape)
+        assert_allclose(hermitian_full_spectrum(rfft2(x), shape[-1]), fft2(x),
+                        atol=1e-10)
+
+
+def test_fft_convolve2d():
+    f = rng.normal(size=(2, 5, 4))
+    x = X[0]
+    # extended shape of fft_convolve2d: image shape + half filter shape - 1
+    ext_shape = (x.shape[-2] + f.shape[-2] // 2 - 1,
+                 x.shape[-1] + f.shape[-1] // 2 - 1)
+    expected = np.real(ifftshift(ifft2(fft2(pad(f, ext_shape)) *
+                                       fft2(pad(x, ext_shape))),
+                                 axes=(-2, -1)))
+    assert_allclose(fft_convolve2d(x, f, mode='full'), expected, atol=1e-10)
+    assert_allclose(fft_convolve2d_sum(x, f, mode='full', axis=0),
+                    expected.sum(axis=0, keepdims=True), atol=1e-10)
+    fft_f = fft2(pad(f, ext_shape))
+    assert_allclose(fft_convolve2d(x, fft_f, mode='full', fft_filter=True),
+                    expected, atol=1e-10)
+
+
+def test_mosse():
+    f, sXY, sXX = mosse(X[:, :1], y)
+    f_loop, sXY_loop, sXX_loop = mosse_loop(X[:, :1], y)
+    assert_allclose(f, f_loop, atol=1e-10)
+    assert_allclose(sXY, sXY_loop, atol=1e-10)
+    assert_allclose(sXX, sXX_loop, atol=1e-10)
+
+    f_inc, A, B = imosse(sXY, sXX, len(X), X_new[:, :1], y)
+    _, sXY_new, sXX_new = mosse_loop(X_new[:, :1], y)
+    A_loop = 0.7 * sXY_loop + 0.3 * sXY_new
+    B_loop = 0.7 * sXX_loop + 0.3 * sXX_new
+    f_loop = np.real(ifftshift(ifft2(A_loop / (B_loop + 0.01)),
+                               axes=(-2, -1)))
+    assert_allclose(f_inc, crop(f_loop, y.shape[-2:]), atol=1e-10)
+    assert_allclose(A, A_loop, atol=1e-10)
+    assert_allclose(B, B_loop, atol=1e-10)
+
+
+def test_mccf():
+    f, sXY, sXX = mccf(X, y)
+    f_loop, sXY_loop, sXX_loop = mccf_loop(X, y)
+    assert_allclose(f, f_loop, atol=1e-10)
+    assert_allclose(sXY, sXY_loop, atol=1e-10)
+    assert_allclose(sXX.toarray(), sXX_loop.toarray(), atol=1e-10)
+
+    f_inc, A, B = imccf(sXY, sXX, len(X), X_new, y)
+    _, sXY_new, sXX_new = mccf_loop(X_new, y)
+    A_loop = 0.7 * sXY_loop + 0.3 * sXY_new
+    B_loop = 0.7 * sXX_loop + 0.3 * sXX_new
+    fft_ext_f = spsolve(B_loop + 0.01 * speye(B_loop.shape[-1]), A_loop)
+    f_loop = np.real(ifftshift(ifft2(fft_ext_f.reshape((2, 13, 11))),
+                               axes=(-2, -1)))
+    assert_allclose(f_inc, crop(f_loop, y.shape[-2:]), atol=1e-10)
+    assert_allclose(A, A_loop, atol=1e-10)
+    assert_allclose(B.toarray(), B_loop.toarray(), atol=1e-10)
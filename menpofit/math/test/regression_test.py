@@ -0,0 +1,109 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+from menpofit.math import (IRLRegression, IIRLRegression, PCRRegression,
+                           randomized_svd)
+from menpofit.math.regression import cholesky_update
+from menpofit.sdm.algorithm.base import iterate_chunks
+
+
+rng = np.random.RandomState(0)
+X = rng.normal(size=(100, 20))
+Y = X.dot(rng.normal(size=(20, 4))) + rng.normal(0, 0.1, size=(100, 4))
+
+
+def test_irl_train_chunks():
+    for kwargs in [{}, {'alpha': 0.1, 'bias': False}]:
+        r = IRLRegression(incrementable=True, **kwargs)
+        r.train(X, Y)
+        r_chunks = IRLRegression(incrementable=True, **kwargs)
+        r_chunks.train_chunks(iterate_chunks(X, Y, 32))
+        assert_allclose(r_chunks.W, r.W)
+        assert_allclose(r_chunks.V, r.V)
+        assert_allclose(r_chunks.predict(X), r.predict(X))
+
+
+def test_iirl_train_chunks():
+    r = IIRLRegression(alpha=0.1, alpha2=0.01)
+    r.train(X, Y)
+    r_chunks = IIRLRegression(alpha=0.1, alpha2=0.01)
+    r_chunks.train_chunks(iterate_chunks(X, Y, 32))
+    assert_allclose(r_chunks.W, r.W)
+
+
+def test_randomized_svd():
+    # exactly low rank matrix, and a matrix with decaying spectrum
+    low_rank = rng.normal(size=(100, 5)).dot(rng.normal(size=(5, 20)))
+    decaying = (rng.normal(size=(100, 20)) * 0.5 ** np.arange(20))
+    for A, atol in [(low_rank, 1e-8), (decaying, 1e-3)]:
+        _, s, V = np.linalg.svd(A, full_matrices=False)
+        U_r, s_r, V_r = randomized_svd(A, 5, chunk_size=16, random_state=0)
+        assert_allclose(s_r, s[:5], rtol=1e-6, atol=atol)
+        # subspaces are the same up to the signs of the vectors
+        assert_allclose(np.abs(np.sum(V_r * V[:5], axis=1)), 1, atol=atol)
+        assert_allclose(U_r.T.dot(U_r), np.eye(5), atol=1e-10)
+    # bias column is appended without being materialized
+    A = np.hstack((low_rank, np.ones((100, 1))))
+    _, s_b, _ = randomized_svd(low_rank, 6, chunk_size=16, bias=True,
+                               random_state=0)
+    assert_allclose(s_b, np.linalg.svd(A, compute_uv=False)[:6])
+
+
+def test_pcr_randomized_svd():
+    for bias in [True, False]:
+        r = PCRRegression(bias=bias)
+        r.train(X, Y)
+        # all components are captured, so the solution is the exact one
+        r_rand = PCRRegression(bias=bias, n_components=21, chunk_size=32,
+                               random_state=0)
+        r_rand.train(X, Y)
+        assert_allclose(r_rand.predict(X), r.predict(X))
+
+
+def test_cholesky_update():
+    A = X.T.dot(X) + np.eye(20)
+    L = np.linalg.cholesky(A)
+    # rank-1 updates (few rows) and new factorization (many rows)
+    for U in [rng.normal(size=(2, 20)), rng.normal(size=(10, 20))]:
+        assert_allclose(cholesky_update(L, U),
+                        np.linalg.cholesky(A + U.T.dot(U)))
+
+
+def test_irl_cholesky():
+    for alpha in [0, 0.1]:
+        r = IRLRegression(alpha=alpha, incrementable=True)
+        r.train(X, Y)
+        r_chol = IRLRegression(alpha=alpha, incrementable=True,
+                               cholesky=True)
+        r_chol.train(X, Y)
+        assert_allclose(r_chol.W, r.W)
+        assert_allclose(r_chol.L.dot(r_chol.L.T), np.linalg.inv(r.V))
+
+        # increments give the regression of all the samples
+        r_chol = IRLRegression(alpha=alpha, incrementable=True,
+                               cholesky=True)
+        r_chol.train(X[:80], Y[:80])
+        r_chol.increment(X[80:83], Y[80:83])
+        r_chol.increment(X[83:], Y[83:])
+        assert_allclose(r_chol.W, r.W)
+        r_inv = IRLRegression(alpha=alpha, incrementable=True)
+        r_inv.train(X[:80], Y[:80])
+        r_inv.increment(X[80:], Y[80:])
+        assert_allclose(r_inv.W, r.W)
+        assert_allclose(r_inv.V, r.V)
+
+
+def test_irl_float32():
+    r = IRLRegression(alpha=0.1)
+    r.train(X, Y)
+    for cholesky in [False, True]:
+        r32 = IRLRegression(alpha=0.1, cholesky=cholesky, dtype=np.float32)
+        r32.train(X, Y)
+        assert r32.W.dtype == np.float32
+        assert_allclose(r32.predict(X), r.predict(X), rtol=1e-4, atol=1e-4)
+    r32 = IIRLRegression(alpha=0.1, alpha2=0.01, dtype=np.float32)
+    r32.train(X, Y)
+    r = IIRLRegression(alpha=0.1, alpha2=0.01)
+    r.train(X, Y)
+    assert r32.W.dtype == np.float32
+    assert_allclose(r32.predict(X), r.predict(X), rtol=1e-4, atol=1e-4)
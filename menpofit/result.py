@@ -2,6 +2,7 @@ import numpy as np
 from collections import Iterable
 
 from menpo.image import Image
+from menpo.shape import PointCloud
 
 from menpofit.visualize import view_image_multiple_landmarks
 from menpofit.error import euclidean_bb_normalised_error
@@ -59,9 +60,10 @@ class Result(object):
         self._final_shape = final_shape
         self._initial_shape = initial_shape
         self._gt_shape = gt_shape
-        # If image is provided, create a copy
+        # If image is provided, create a copy (pixel-free images, used when
+        # fitting only from response maps, have nothing to copy)
         self._image = None
-        if image is not None:
+        if image is not None and hasattr(image, 'pixels'):
             self._image = Image(image.pixels)
 
     @property
@@ -2665,3 +2667,319 @@ class MultiScaleParametricIterativeResult(MultiScaleNonParametricIterativeResult
             axes_font_weight=axes_font_weight, axes_x_limits=axes_x_limits,
             axes_y_limits=axes_y_limits, axes_x_ticks=axes_x_ticks,
             axes_y_ticks=axes_y_ticks, figure_size=figure_size)
+
+
+class CompactResult(object):
+    r"""
+    Class for defining a compact fitting result, for workloads that hold the
+    results of many fittings in memory. In contrast to :map:`Result` and its
+    subclasses, it stores no image and no `menpo.shape.PointCloud` or
+    parameter objects. It keeps only the final, initial and ground truth
+    shapes (at full precision), optionally the shapes of all the iterations
+    as a single ``(n_shapes, n_points, 2)`` `float32` array, and the costs. The shapes are converted to
+    `menpo.shape.PointCloud` objects only when they are requested, and the
+    result can be converted to a full result with :meth:`to_full_result`
+    (e.g. for visualisation).
+
+    Parameters
+    ----------
+    final_shape : `menpo.shape.PointCloud` or ``(n_points, 2)`` `ndarray`
+        The final shape of the fitting process.
+    shapes : `list` of `menpo.shape.PointCloud` or ``(n_shapes, n_points, 2)`` `ndarray` or ``None``, optional
+        The shapes per iteration, following the convention of
+        :map:`NonParametricIterativeResult` (i.e. without the initial shape).
+        If ``None``, then the iterations are not stored.
+    initial_shape : `menpo.shape.PointCloud` or ``(n_points, 2)`` `ndarray` or ``None``, optional
+        The initial shape from which the fitting process started.
+    gt_shape : `menpo.shape.PointCloud` or ``(n_points, 2)`` `ndarray` or ``None``, optional
+        The ground truth shape associated with the image.
+    costs : `list` of `float` or ``None``, optional
+        The `list` of cost per iteration.
+    n_iters : `int` or ``None``, optional
+        The total number of iterations of the fitting process. If ``None``,
+        then it is set to the number of `shapes` (or ``0``, if `shapes` is
+        ``None``).
+    """
+    __slots__ = ('_final_shape', '_shapes', '_initial_shape', '_gt_shape',
+                 '_costs', '_n_iters')
+
+    def __init__(self, final_shape, shapes=None, initial_shape=None,
+                 gt_shape=None, costs=None, n_iters=None):
+        self._final_shape = _compact_points(final_shape)
+        self._initial_shape = _compact_points(initial_shape)
+        self._gt_shape = _compact_points(gt_shape)
+        self._shapes = None
+        if shapes is not None:
+            self._shapes = np.array(
+                [_compact_points(s, dtype=np.float32) for s in shapes],
+                dtype=np.float32)
+        self._costs = None
+        if costs is not None:
+            self._costs = np.array(costs, dtype=np.float32)
+        if n_iters is None:
+            n_iters = 0 if shapes is None else len(shapes)
+        self._n_iters = n_iters
+
+    @classmethod
+    def init_from_result(cls, result, keep_shapes=False):
+        r"""
+        Creates a compact result from a :map:`Result` (or subclass) object.
+
+        Parameters
+        ----------
+        result : :map:`Result` or subclass
+            The fitting result.
+        keep_shapes : `bool`, optional
+            If ``True`` and `result` is iterative, then the shapes of all the
+            iterations are kept.
+
+        Returns
+        -------
+        compact_result : :map:`CompactResult`
+            The compact fitting result.
+        """
+        shapes = None
+        costs = None
+        n_iters = 0
+        if result.is_iterative:
+            n_iters = result.n_iters
+            costs = result.costs
+            if keep_shapes:
+                shapes = result.shapes
+                if result.initial_shape is not None:
+                    shapes = shapes[1:]
+        return cls(result.final_shape, shapes=shapes,
+                   initial_shape=result.initial_shape,
+                   gt_shape=result.gt_shape, costs=costs, n_iters=n_iters)
+
+    @property
+    def is_iterative(self):
+        r"""
+        Flag whether the shapes of all the iterations are stored.
+
+        :type: `bool`
+        """
+        return self._shapes is not None
+
+    @property
+    def final_shape(self):
+        r"""
+        Returns the final shape of the fitting process.
+
+        :type: `menpo.shape.PointCloud`
+        """
+        return PointCloud(self._final_shape)
+
+    @property
+    def initial_shape(self):
+        r"""
+        Returns the initial shape of the fitting process, or ``None`` if it
+        was not set.
+
+        :type: `menpo.shape.PointCloud` or ``None``
+        """
+        if self._initial_shape is None:
+            return None
+        return PointCloud(self._initial_shape)
+
+    @property
+    def gt_shape(self):
+        r"""
+        Returns the ground truth shape, or ``None`` if it was not set.
+
+        :type: `menpo.shape.PointCloud` or ``None``
+        """
+        if self._gt_shape is None:
+            return None
+        return PointCloud(self._gt_shape)
+
+    @property
+    def image(self):
+        r"""
+        A compact result does not store the image, so ``None`` is returned.
+
+        :type: ``None``
+        """
+        return None
+
+    @property
+    def shape_array(self):
+        r"""
+        Returns the shapes of all the iterations as a single `float32` array,
+        including the `initial_shape` (if it exists), or ``None`` if the
+        iterations are not stored.
+
+        :type: ``(n_shapes, n_points, 2)`` `ndarray` or ``None``
+        """
+        if self._shapes is None or self._initial_shape is None:
+            return self._shapes
+        return np.concatenate([self._initial_shape[None].astype(np.float32),
+                               self._shapes])
+
+    @property
+    def shapes(self):
+        r"""
+        Returns the `list` of shapes of all the iterations, including the
+        `initial_shape` (if it exists), or ``None`` if the iterations are not
+        stored.
+
+        :type: `list` of `menpo.shape.PointCloud` or ``None``
+        """
+        shape_array = self.shape_array
+        if shape_array is None:
+            return None
+        return [PointCloud(s) for s in shape_array]
+
+    @property
+    def n_iters(self):
+        r"""
+        Returns the total number of iterations of the fitting process.
+
+        :type: `int`
+        """
+        return self._n_iters
+
+    @property
+    def costs(self):
+        r"""
+        Returns a `list` with the cost per iteration. It returns ``None`` if
+        the costs are not computed.
+
+        :type: `list` of `float` or ``None``
+        """
+        if self._costs is None:
+            return None
+        return list(self._costs)
+
+    def final_error(self, compute_error=None):
+        r"""
+        Returns the final error of the fitting process, if the ground truth
+        shape exists (see :meth:`Result.final_error`).
+
+        Parameters
+        ----------
+        compute_error: `callable`, optional
+            Callable that computes the error between the fitted and
+            ground truth shapes.
+
+        Returns
+        -------
+        final_error : `float`
+            The final error at the end of the fitting process.
+
+        Raises
+        ------
+        ValueError
+            Ground truth shape has not been set, so the final error cannot be
+            computed
+        """
+        if compute_error is None:
+            compute_error = euclidean_distance_indexed_normalised_error
+        if self._gt_shape is not None:
+            return compute_error(self.final_shape, self.gt_shape, 36, 45)
+        else:
+            raise ValueError('Ground truth shape has not been set, so the '
+                             'final error cannot be computed')
+
+    def initial_error(self, compute_error=None):
+        r"""
+        Returns the initial error of the fitting process, if the ground truth
+        shape and initial shape exist (see :meth:`Result.initial_error`).
+
+        Parameters
+        ----------
+        compute_error: `callable`, optional
+            Callable that computes the error between the initial and
+            ground truth shapes.
+
+        Returns
+        -------
+        initial_error : `float`
+            The initial error at the beginning of the fitting process.
+
+        Raises
+        ------
+        ValueError
+            Initial shape has not been set, so the initial error cannot be
+            computed
+        ValueError
+            Ground truth shape has not been set, so the initial error cannot be
+            computed
+        """
+        if compute_error is None:
+            compute_error = euclidean_distance_indexed_normalised_error
+        if self._initial_shape is None:
+            raise ValueError('Initial shape has not been set, so the initial '
+                             'error cannot be computed')
+        elif self._gt_shape is None:
+            raise ValueError('Ground truth shape has not been set, so the '
+                             'initial error cannot be computed')
+        else:
+            return compute_error(self.initial_shape, self.gt_shape, 36, 45)
+
+    def to_full_result(self, image=None):
+        r"""
+        Converts the compact result to a full fitting result, e.g. in order to
+        visualise it. If the iterations are stored, then a
+        :map:`NonParametricIterativeResult` is returned, otherwise a
+        :map:`Result`.
+
+        Parameters
+        ----------
+        image : `menpo.image.Image` or `subclass` or ``None``, optional
+            The image on which the fitting process was applied.
+
+        Returns
+        -------
+        result : :map:`Result` or :map:`NonParametricIterativeResult`
+            The full fitting result.
+        """
+        if self._shapes is None:
+            return Result(self.final_shape, image=image,
+                          initial_shape=self.initial_shape,
+                          gt_shape=self.gt_shape)
+        shapes = [PointCloud(s) for s in self._shapes]
+        if len(shapes) > 0:
+            # the last iteration is the final shape, kept at full precision
+            shapes[-1] = self.final_shape
+        return NonParametricIterativeResult(
+            shapes, initial_shape=self.initial_shape, image=image,
+            gt_shape=self.gt_shape, costs=self.costs)
+
+    def view(self, image=None, **kwargs):
+        r"""
+        Visualizes the fitting result, by converting it to a full result (see
+        :meth:`to_full_result` and :meth:`Result.view`).
+
+        Parameters
+        ----------
+        image : `menpo.image.Image` or `subclass` or ``None``, optional
+            The image on which the fitting process was applied.
+        kwargs : `dict`, optional
+            The visualisation options of :meth:`Result.view`.
+
+        Returns
+        -------
+        renderer : `class`
+            The renderer object.
+        """
+        return self.to_full_result(image=image).view(**kwargs)
+
+    def __str__(self):
+        out = "Compact fitting result of {} landmark points.".format(
+                len(self._final_shape))
+        if self._gt_shape is not None:
+            if self._initial_shape is not None:
+                out += "\nInitial error: {:.4f}".format(self.initial_error())
+            out += "\nFinal error: {:.4f}".format(self.final_error())
+        return out
+
+
+def _compact_points(shape, dtype=None):
+    # a copy of the points of a shape, at full precision unless a dtype is
+    # given
+    if shape is None:
+        return None
+    if isinstance(shape, PointCloud):
+        shape = shape.points
+    return np.array(shape, dtype=dtype)
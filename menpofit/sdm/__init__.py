@@ -19,3 +19,4 @@ from .algorithm import (FullyParametricProjectOutNewton,
                         FullyParametricMeanTemplateNewton,
                         FullyParametricWeightsNewton,
                         FullyParametricProjectOutOPP)
+from .algorithm import register_batch_patch_feature, is_batch_patch_feature
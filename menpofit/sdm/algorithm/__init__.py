@@ -1,3 +1,4 @@
+from .base import register_batch_patch_feature, is_batch_patch_feature
 from .nonparametric import (NonParametricNewton, NonParametricGaussNewton,
                             NonParametricPCRRegression,
                             NonParametricOptimalRegression,
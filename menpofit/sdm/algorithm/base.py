@@ -1,7 +1,11 @@
 from __future__ import division
 from functools import partial
+from multiprocessing import Pool
+import os
 import numpy as np
 
+from menpo.feature import no_op
+from menpo.shape import PointCloud
 from menpo.visualize import print_dynamic
 
 from menpofit.fitter import raise_costs_warning
@@ -19,7 +23,8 @@ class BaseSupervisedDescentAlgorithm(object):
         raise NotImplementedError()
 
     def train(self, images, gt_shapes, current_shapes, prefix='',
-              verbose=False):
+              verbose=False, features_path=None, chunk_size=1024,
+              n_jobs=1):
         r"""
         Method to train the model given a set of initial shapes.
 
@@ -36,6 +41,17 @@ class BaseSupervisedDescentAlgorithm(object):
             The prefix to use when printing information.
         verbose : `bool`, optional
             If ``True``, then information is printed during training.
+        features_path : `str` or ``None``, optional
+            If provided, then the training features of each cascade are
+            written to a memory-mapped ``.npy`` scratch file at this path,
+            instead of being stacked in memory, and the regressors that
+            support it are trained on chunks of the file. The file is deleted
+            after each cascade.
+        chunk_size : `int`, optional
+            The number of samples per chunk, when `features_path` is provided.
+        n_jobs : `int` or ``None``, optional
+            The number of processes that extract the training features. If
+            ``None``, then the number of CPUs is used.
 
         Returns
         -------
@@ -43,10 +59,13 @@ class BaseSupervisedDescentAlgorithm(object):
             The `list` of current shapes that correspond to the images.
         """
         return self._train(images, gt_shapes, current_shapes, increment=False,
-                           prefix=prefix, verbose=verbose)
+                           prefix=prefix, verbose=verbose,
+                           features_path=features_path, chunk_size=chunk_size,
+                           n_jobs=n_jobs)
 
     def increment(self, images, gt_shapes, current_shapes, prefix='',
-                  verbose=False):
+                  verbose=False, features_path=None, chunk_size=1024,
+                  n_jobs=1):
         r"""
         Method to increment the model with the set of current shapes.
 
@@ -62,6 +81,17 @@ class BaseSupervisedDescentAlgorithm(object):
             The prefix to use when printing information.
         verbose : `bool`, optional
             If ``True``, then information is printed during training.
+        features_path : `str` or ``None``, optional
+            If provided, then the training features of each cascade are
+            written to a memory-mapped ``.npy`` scratch file at this path,
+            instead of being stacked in memory, and the regressors that
+            support it are trained on chunks of the file. The file is deleted
+            after each cascade.
+        chunk_size : `int`, optional
+            The number of samples per chunk, when `features_path` is provided.
+        n_jobs : `int` or ``None``, optional
+            The number of processes that extract the training features. If
+            ``None``, then the number of CPUs is used.
 
         Returns
         -------
@@ -69,10 +99,13 @@ class BaseSupervisedDescentAlgorithm(object):
             The `list` of current shapes that correspond to the images.
         """
         return self._train(images, gt_shapes, current_shapes, increment=True,
-                           prefix=prefix, verbose=verbose)
+                           prefix=prefix, verbose=verbose,
+                           features_path=features_path, chunk_size=chunk_size,
+                           n_jobs=n_jobs)
 
     def _train(self, images, gt_shapes, current_shapes, increment=False,
-               prefix='', verbose=False):
+               prefix='', verbose=False, features_path=None, chunk_size=1024,
+               n_jobs=1):
         if not increment:
             # Reset the regressors
             self.regressors = []
@@ -90,10 +123,16 @@ class BaseSupervisedDescentAlgorithm(object):
         for k in range(self.n_iterations):
             # generate regression data
             features_prefix = '{}(Iteration {}) - '.format(prefix, k)
-            features = self._compute_training_features(images, gt_shapes,
-                                                       current_shapes,
-                                                       prefix=features_prefix,
-                                                       verbose=verbose)
+            # Only pass the extraction options that are used, so that
+            # algorithms without them still work with the defaults
+            extraction_kwargs = {}
+            if features_path is not None:
+                extraction_kwargs['features_path'] = features_path
+            if n_jobs != 1:
+                extraction_kwargs['n_jobs'] = n_jobs
+            features = self._compute_training_features(
+                images, gt_shapes, current_shapes, prefix=features_prefix,
+                verbose=verbose, **extraction_kwargs)
 
             if verbose:
                 print_dynamic('{}(Iteration {}) - Performing regression'.format(
@@ -101,13 +140,27 @@ class BaseSupervisedDescentAlgorithm(object):
 
             if not increment:
                 r = self._regressor_cls()
-                r.train(features, delta_x)
+                if features_path is not None and hasattr(r, 'train_chunks'):
+                    # Accumulate the regression over chunks of the features
+                    r.train_chunks(iterate_chunks(features, delta_x,
+                                                  chunk_size))
+                else:
+                    r.train(features, delta_x)
                 self.regressors.append(r)
             else:
                 self.regressors[k].increment(features, delta_x)
 
             # Estimate delta_points
-            estimated_delta_x = self.regressors[k].predict(features)
+            if features_path is None:
+                estimated_delta_x = self.regressors[k].predict(features)
+            else:
+                estimated_delta_x = np.vstack([
+                    self.regressors[k].predict(f)
+                    for f, _ in iterate_chunks(features, delta_x, chunk_size)])
+                # The features of the next cascade overwrite the scratch file
+                del features
+                if os.path.exists(features_path):
+                    os.remove(features_path)
             if verbose:
                 self._print_regression_info(template_shape, gt_shapes,
                                             n_perturbations, delta_x,
@@ -162,6 +215,89 @@ class BaseSupervisedDescentAlgorithm(object):
         raise NotImplementedError()
 
 
+# The patch feature functions that can be applied on a whole
+# ``(n_patches, n_channels, height, width)`` stack of patches at once, and
+# return the stack of the features of each patch
+_batch_patch_features = set()
+
+
+def register_batch_patch_feature(features_callable):
+    r"""
+    Registers a patch feature function as batch-capable, i.e. as a function
+    that, given a ``(n_patches, n_channels, height, width)`` stack of
+    patches, returns the ``(n_patches, ...)`` stack of the features of each
+    patch in a single call. The features of registered functions are
+    computed over whole patch stacks by :func:`features_per_patch` and
+    :func:`features_per_shapes`, instead of patch by patch. It can be used as
+    a decorator.
+
+    Parameters
+    ----------
+    features_callable : `callable`
+        The batch-capable feature function.
+
+    Returns
+    -------
+    features_callable : `callable`
+        The registered feature function.
+    """
+    _batch_patch_features.add(features_callable)
+    return features_callable
+
+
+def is_batch_patch_feature(features_callable):
+    r"""
+    Whether a patch feature function is registered as batch-capable with
+    :func:`register_batch_patch_feature`.
+
+    Parameters
+    ----------
+    features_callable : `callable`
+        The feature function.
+
+    Returns
+    -------
+    is_batch : `bool`
+        ``True`` if the function is batch-capable.
+    """
+    try:
+        return features_callable in _batch_patch_features
+    except TypeError:
+        # unhashable callable
+        return False
+
+
+# no_op is element-wise, so it is applied on patch stacks as is
+register_batch_patch_feature(no_op)
+
+
+def features_per_patch_stack(patches, features_callable):
+    r"""
+    Method that computes the features of a stack of patches. If the feature
+    function is batch-capable (see :func:`register_batch_patch_feature`),
+    then it is called once on the whole stack, otherwise once per patch.
+
+    Parameters
+    ----------
+    patches : ``(n_patches, n_channels, height, width)`` `ndarray`
+        The stack of patches.
+    features_callable : `callable`
+        The function to be used for extracting features.
+
+    Returns
+    -------
+    features_per_patch_stack : ``(n_patches, n_features)`` `ndarray`
+        The vectorized features of each patch.
+    """
+    n_patches = patches.shape[0]
+    if is_batch_patch_feature(features_callable):
+        patch_features = features_callable(patches)
+        if patch_features.shape[0] == n_patches:
+            return patch_features.reshape((n_patches, -1))
+    # Per-patch fallback
+    return np.vstack([features_callable(p).ravel() for p in patches])
+
+
 def features_per_patch(image, shape, patch_shape, features_callable):
     r"""
     Method that first extracts patches and then features from these patches.
@@ -184,8 +320,7 @@ def features_per_patch(image, shape, patch_shape, features_callable):
     """
     patches = image.extract_patches(shape, patch_shape=patch_shape,
                                     as_single_array=True)
-    patch_features = [features_callable(p[0]).ravel() for p in patches]
-    return np.hstack(patch_features)
+    return features_per_patch_stack(patches[:, 0], features_callable).ravel()
 
 
 def features_per_shapes(image, shapes, patch_shape, features_callable):
@@ -209,14 +344,58 @@ def features_per_shapes(image, shapes, patch_shape, features_callable):
     features_per_shapes : ``(n_shapes, n_features)`` `ndarray`
         The concatenated feature vector per shape.
     """
-    patch_features = [features_per_patch(image, s, patch_shape,
+    # Extract the patches of all the shapes at once
+    points = PointCloud(np.vstack([s.points for s in shapes]), copy=False)
+    patches = image.extract_patches(points, patch_shape=patch_shape,
+                                    as_single_array=True)
+    patch_features = features_per_patch_stack(patches[:, 0], features_callable)
+    return patch_features.reshape((len(shapes), -1))
+
+
+def iterate_chunks(X, Y, chunk_size):
+    r"""
+    Generator of the consecutive chunks of corresponding rows of two arrays.
+    The chunks of memory-mapped arrays are read one at a time.
+
+    Parameters
+    ----------
+    X : ``(n_samples, ...)`` `ndarray`
+        The first array, e.g. the feature vectors.
+    Y : ``(n_samples, ...)`` `ndarray`
+        The second array, e.g. the target vectors.
+    chunk_size : `int`
+        The number of rows per chunk.
+
+    Yields
+    ------
+    X_chunk : ``(chunk_size, ...)`` `ndarray`
+        The chunk of the first array.
+    Y_chunk : ``(chunk_size, ...)`` `ndarray`
+        The chunk of the second array.
+    """
+    for start in range(0, X.shape[0], chunk_size):
+        yield (np.asarray(X[start:start + chunk_size]),
+               Y[start:start + chunk_size])
+
+
+def _features_per_shapes_task(task):
+    # Worker of features_per_image: computes the features of the shapes of a
+    # single image and, if a features_path is given, writes them into the
+    # rows of the memory-mapped feature matrix that start at offset
+    image, shapes, patch_shape, features_callable, features_path, offset = task
+    image_features = features_per_shapes(image, shapes, patch_shape,
                                          features_callable)
-                      for s in shapes]
-    return np.vstack(patch_features)
+    if features_path is None:
+        return image_features
+    features = np.load(features_path, mmap_mode='r+')
+    features[offset:offset + len(image_features)] = image_features
+    features.flush()
+    del features
 
 
 def features_per_image(images, shapes, patch_shape, features_callable,
-                       prefix='', verbose=False):
+                       prefix='', verbose=False, features_path=None,
+                       n_jobs=1):
     r"""
     Method that given multiple images with multiple shapes per image, it first
     extracts patches that correspond to the shapes and then features from
@@ -236,19 +415,77 @@ def features_per_image(images, shapes, patch_shape, features_callable,
         The prefix of the printed information.
     verbose : `bool`, optional
         If ``True``, then progress information is printed.
+    features_path : `str` or ``None``, optional
+        If provided, then the feature vectors are written to a memory-mapped
+        ``.npy`` file at this path, one image at a time, instead of being
+        stacked in memory.
+    n_jobs : `int` or ``None``, optional
+        The number of processes that the images are sharded across. Each
+        image is written at the rows that correspond to it, thus the result
+        is the same as with a single process. If ``None``, then the number of
+        CPUs is used. Note that with more than one process,
+        `features_callable` must be picklable.
 
     Returns
     -------
     features_per_image : ``(n_images * n_shapes, n_features)`` `ndarray`
-        The concatenated feature vector per image and per shape.
+        The concatenated feature vector per image and per shape. If
+        `features_path` is provided, then this is a read-only memory map of
+        the file.
     """
     wrap = partial(print_progress,
                    prefix='{}Extracting patches'.format(prefix),
                    end_with_newline=not prefix, verbose=verbose)
-    patch_features = [features_per_shapes(i, shapes[j], patch_shape,
-                                          features_callable)
-                      for j, i in enumerate(wrap(images))]
-    return np.vstack(patch_features)
+    if features_path is None and n_jobs == 1:
+        patch_features = [features_per_shapes(i, shapes[j], patch_shape,
+                                              features_callable)
+                          for j, i in enumerate(wrap(images))]
+        return np.vstack(patch_features)
+
+    # The rows of each image start at precomputed offsets
+    images = list(images)
+    offsets = np.cumsum([0] + [len(s) for s in shapes])
+
+    # The first image determines the number of features
+    image_features = features_per_shapes(images[0], shapes[0], patch_shape,
+                                         features_callable)
+    features_shape = (offsets[-1], image_features.shape[1])
+    if features_path is None:
+        features = np.empty(features_shape, dtype=image_features.dtype)
+    else:
+        features = np.lib.format.open_memmap(
+            features_path, mode='w+', dtype=image_features.dtype,
+            shape=features_shape)
+    features[:offsets[1]] = image_features
+    if features_path is not None:
+        # Workers write into the file
+        features.flush()
+
+    tasks = [(images[j], shapes[j], patch_shape, features_callable,
+              features_path if n_jobs != 1 else None, offsets[j])
+             for j in range(1, len(images))]
+    pool = None
+    if n_jobs != 1:
+        pool = Pool(processes=n_jobs)
+    try:
+        if pool is None:
+            results = map(_features_per_shapes_task, tasks)
+        else:
+            results = pool.imap(_features_per_shapes_task, tasks)
+        for j, image_features in enumerate(wrap(results, n_items=len(images),
+                                                offset=1), 1):
+            if image_features is not None:
+                features[offsets[j]:offsets[j + 1]] = image_features
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if features_path is None:
+        return features
+    features.flush()
+    del features
+    return np.load(features_path, mmap_mode='r')
 
 
 def compute_non_parametric_delta_x(gt_shapes, current_shapes):
@@ -499,7 +736,8 @@ def update_parametric_estimates(estimated_delta_x, delta_x, gt_x,
 
 
 def build_appearance_model(images, gt_shapes, patch_shape, patch_features,
-                           appearance_model_cls, verbose=False, prefix=''):
+                           appearance_model_cls, batch_size=None,
+                           verbose=False, prefix=''):
     r"""
     Method that builds a parametric patch-based appearance model.
 
@@ -517,6 +755,12 @@ def build_appearance_model(images, gt_shapes, patch_shape, patch_features,
     appearance_model_cls : `menpo.model.PCAModel`
         The class that will be used to train the model, e.g.
         `menpo.model.PCAModel`.
+    batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the model is built from the patches of
+        the first `batch_size` images and then incremented (incremental PCA)
+        with the patches of each following batch, so that only the patches of
+        a single batch are in memory at a time. If ``None``, then the model is
+        built from the patches of all the images at once.
     verbose : `bool`, optional
         If ``True``, then information about the training progress will be
         printed.
@@ -527,15 +771,27 @@ def build_appearance_model(images, gt_shapes, patch_shape, patch_features,
                    prefix='{}Extracting ground truth patches'.format(prefix),
                    end_with_newline=not prefix, verbose=verbose)
     n_images = len(images)
-    # Extract patches from ground truth
-    gt_patches = [features_per_patch(im, gt_s, patch_shape,
-                                     patch_features)
-                  for gt_s, im in wrap(list(zip(gt_shapes, images)))]
-    # Calculate appearance model from extracted gt patches
-    gt_patches = np.array(gt_patches).reshape([n_images, -1])
-    if verbose:
-        print_dynamic('{}Building Appearance Model'.format(prefix))
-    return appearance_model_cls(gt_patches)
+    if batch_size is None:
+        batch_size = n_images
+
+    model = None
+    data = list(zip(gt_shapes, images))
+    for start in range(0, n_images, batch_size):
+        batch_data = data[start:start + batch_size]
+        # Extract patches from ground truth
+        gt_patches = [features_per_patch(im, gt_s, patch_shape,
+                                         patch_features)
+                      for gt_s, im in wrap(batch_data, n_items=n_images,
+                                           offset=start)]
+        gt_patches = np.array(gt_patches).reshape([len(batch_data), -1])
+        if verbose:
+            print_dynamic('{}Building Appearance Model'.format(prefix))
+        # Calculate (or increment) appearance model from extracted gt patches
+        if model is None:
+            model = appearance_model_cls(gt_patches)
+        else:
+            model.increment(gt_patches)
+    return model
 
 
 def fit_parametric_shape(image, initial_shape, parametric_algorithm,
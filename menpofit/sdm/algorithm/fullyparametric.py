@@ -28,13 +28,19 @@ class FullyParametricSDAlgorithm(BaseSupervisedDescentAlgorithm):
         choice is :map:`OrthoPDM`.
     appearance_model_cls : `menpo.model.PCAVectorModel` or `subclass`
         The class to be used for building the appearance model.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, shape_model_cls=OrthoPDM,
-                 appearance_model_cls=PCAVectorModel):
+                 appearance_model_cls=PCAVectorModel,
+                 appearance_batch_size=None):
         super(FullyParametricSDAlgorithm, self).__init__()
         self.regressors = []
         self.shape_model_cls = shape_model_cls
         self.appearance_model_cls = appearance_model_cls
+        self.appearance_batch_size = appearance_batch_size
         self.appearance_model = None
         self.shape_model = None
 
@@ -57,11 +63,17 @@ class FullyParametricSDAlgorithm(BaseSupervisedDescentAlgorithm):
                                     current_shapes, self.shape_model)
 
     def _compute_training_features(self, images, gt_shapes, current_shapes,
-                                   prefix='', verbose=False):
+                                   prefix='', verbose=False,
+                                   features_path=None, n_jobs=1):
+        # The appearance parameters are low dimensional, thus they are always
+        # kept in memory (features_path is ignored) and extracted in this
+        # process (n_jobs is ignored)
         if self.appearance_model is None:
             self.appearance_model = build_appearance_model(
                 images, gt_shapes, self.patch_shape, self.patch_features,
-                self.appearance_model_cls, verbose=verbose, prefix=prefix)
+                self.appearance_model_cls,
+                batch_size=self.appearance_batch_size, verbose=verbose,
+                prefix=prefix)
 
         wrap = partial(print_progress,
                        prefix='{}Extracting patches'.format(prefix),
@@ -179,15 +191,20 @@ class FullyParametricWeightsNewton(ParametricAppearanceWeights):
         The regularization parameter.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True):
+                 alpha=0, bias=True, appearance_batch_size=None):
         super(FullyParametricWeightsNewton, self).__init__(
             shape_model_cls=shape_model_cls,
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias)
         self.patch_shape = patch_shape
@@ -223,15 +240,20 @@ class FullyParametricMeanTemplateNewton(ParametricAppearanceMeanTemplate):
         The regularization parameter.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True):
+                 alpha=0, bias=True, appearance_batch_size=None):
         super(FullyParametricMeanTemplateNewton, self).__init__(
             shape_model_cls=shape_model_cls,
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias)
         self.patch_shape = patch_shape
@@ -267,15 +289,20 @@ class FullyParametricProjectOutNewton(ParametricAppearanceProjectOut):
         The regularization parameter.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True):
+                 alpha=0, bias=True, appearance_batch_size=None):
         super(FullyParametricProjectOutNewton, self).__init__(
             shape_model_cls=shape_model_cls,
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias)
         self.patch_shape = patch_shape
@@ -313,15 +340,21 @@ class FullyParametricProjectOutGaussNewton(ParametricAppearanceProjectOut):
         Flag that controls whether to use a bias term.
     alpha2 : `float`, optional
         The regularization parameter of the Hessian matrix.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True, alpha2=0):
+                 alpha=0, bias=True, alpha2=0,
+                 appearance_batch_size=None):
         super(FullyParametricProjectOutGaussNewton, self).__init__(
             shape_model_cls=shape_model_cls,
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IIRLRegression, alpha=alpha, bias=bias,
                                       alpha2=alpha2)
@@ -355,15 +388,20 @@ class FullyParametricProjectOutOPP(ParametricAppearanceProjectOut):
         each cascade.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 bias=True):
+                 bias=True, appearance_batch_size=None):
         super(FullyParametricProjectOutOPP, self).__init__(
             shape_model_cls=shape_model_cls,
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(OPPRegression, bias=bias)
         self.patch_shape = patch_shape
@@ -24,11 +24,17 @@ class ParametricAppearanceSDAlgorithm(BaseSupervisedDescentAlgorithm):
     ----------
     appearance_model_cls : `menpo.model.PCAVectorModel` or `subclass`
         The class to be used for building the appearance model.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
-    def __init__(self, appearance_model_cls=PCAVectorModel):
+    def __init__(self, appearance_model_cls=PCAVectorModel,
+                 appearance_batch_size=None):
         super(ParametricAppearanceSDAlgorithm, self).__init__()
         self.regressors = []
         self.appearance_model_cls = appearance_model_cls
+        self.appearance_batch_size = appearance_batch_size
         self.appearance_model = None
 
     @property
@@ -45,12 +51,18 @@ class ParametricAppearanceSDAlgorithm(BaseSupervisedDescentAlgorithm):
                                         current_shapes)
 
     def _compute_training_features(self, images, gt_shapes, current_shapes,
-                                   prefix='', verbose=False):
+                                   prefix='', verbose=False,
+                                   features_path=None, n_jobs=1):
+        # The appearance parameters are low dimensional, thus they are always
+        # kept in memory (features_path is ignored) and extracted in this
+        # process (n_jobs is ignored)
 
         if self.appearance_model is None:
             self.appearance_model = build_appearance_model(
                 images, gt_shapes, self.patch_shape, self.patch_features,
-                self.appearance_model_cls, verbose=verbose, prefix=prefix)
+                self.appearance_model_cls,
+                batch_size=self.appearance_batch_size, verbose=verbose,
+                prefix=prefix)
 
         wrap = partial(print_progress,
                        prefix='{}Extracting patches'.format(prefix),
@@ -133,13 +145,18 @@ class ParametricAppearanceNewton(ParametricAppearanceSDAlgorithm):
         The regularization parameter.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True):
+                 alpha=0, bias=True, appearance_batch_size=None):
         super(ParametricAppearanceNewton, self).__init__(
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias)
         self.patch_shape = patch_shape
@@ -173,13 +190,19 @@ class ParametricAppearanceGaussNewton(ParametricAppearanceSDAlgorithm):
         Flag that controls whether to use a bias term.
     alpha2 : `float`, optional
         The regularization parameter of the Hessian matrix.
+    appearance_batch_size : `int` or ``None``, optional
+        If an `int` is provided, then the appearance model is built
+        incrementally, from the ground truth patches of batches of this many
+        images. If ``None``, then it is built from all the patches at once.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, appearance_model_cls=PCAVectorModel,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True, alpha2=0):
+                 alpha=0, bias=True, alpha2=0,
+                 appearance_batch_size=None):
         super(ParametricAppearanceGaussNewton, self).__init__(
-            appearance_model_cls=appearance_model_cls)
+            appearance_model_cls=appearance_model_cls,
+            appearance_batch_size=appearance_batch_size)
 
         self._regressor_cls = partial(IIRLRegression, alpha=alpha, bias=bias,
                                       alpha2=alpha2)
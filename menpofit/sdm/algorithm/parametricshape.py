@@ -50,11 +50,13 @@ class ParametricShapeSDAlgorithm(BaseSupervisedDescentAlgorithm):
                                     current_shapes, self.shape_model)
 
     def _compute_training_features(self, images, gt_shapes, current_shapes,
-                                   prefix='', verbose=False):
+                                   prefix='', verbose=False,
+                                   features_path=None, n_jobs=1):
         # initialize sample counter
         return features_per_image(images, current_shapes, self.patch_shape,
                                   self.patch_features, prefix=prefix,
-                                  verbose=verbose)
+                                  verbose=verbose, features_path=features_path,
+                                  n_jobs=n_jobs)
 
     def _compute_test_features(self, image, current_shape):
         return features_per_patch(image, current_shape,
@@ -122,15 +124,21 @@ class ParametricShapeNewton(ParametricShapeSDAlgorithm):
         The regularization parameter.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    cholesky : `bool`, optional
+        If ``True``, then the regression uses Cholesky factorizations instead
+        of inverses.
+    dtype : `numpy.dtype` or ``None``, optional
+        The dtype in which the regressors are stored, e.g. ``np.float32``.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True):
+                 alpha=0, bias=True, cholesky=False, dtype=None):
         super(ParametricShapeNewton, self).__init__(
             shape_model_cls=shape_model_cls)
 
-        self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias)
+        self._regressor_cls = partial(IRLRegression, alpha=alpha, bias=bias,
+                                      cholesky=cholesky, dtype=dtype)
         self.patch_shape = patch_shape
         self.patch_features = patch_features
         self.n_iterations = n_iterations
@@ -163,16 +171,23 @@ class ParametricShapeGaussNewton(ParametricShapeSDAlgorithm):
         Flag that controls whether to use a bias term.
     alpha2 : `float`, optional
         The regularization parameter of the Hessian matrix.
+    cholesky : `bool`, optional
+        If ``True``, then the regression uses Cholesky factorizations instead
+        of inverses.
+    dtype : `numpy.dtype` or ``None``, optional
+        The dtype in which the regressors are stored, e.g. ``np.float32``.
     """
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  compute_error=euclidean_bb_normalised_error,
-                 alpha=0, bias=True, alpha2=0):
+                 alpha=0, bias=True, alpha2=0, cholesky=False,
+                 dtype=None):
         super(ParametricShapeGaussNewton, self).__init__(
             shape_model_cls=shape_model_cls)
 
         self._regressor_cls = partial(IIRLRegression, alpha=alpha, bias=bias,
-                                      alpha2=alpha2)
+                                      alpha2=alpha2, cholesky=cholesky,
+                                      dtype=dtype)
         self.patch_shape = patch_shape
         self.patch_features = patch_features
         self.n_iterations = n_iterations
@@ -242,6 +257,9 @@ class ParametricShapePCRRegression(ParametricShapeSDAlgorithm):
         The SVD variance.
     bias : `bool`, optional
         Flag that controls whether to use a bias term.
+    n_components : `int` or ``None``, optional
+        If an `int` is provided, then the regression uses a randomized
+        truncated SVD of this many components, instead of the exact SVD.
 
     Raises
     ------
@@ -251,12 +269,13 @@ class ParametricShapePCRRegression(ParametricShapeSDAlgorithm):
     def __init__(self, patch_features=no_op, patch_shape=(17, 17),
                  n_iterations=3, shape_model_cls=OrthoPDM,
                  compute_error=euclidean_bb_normalised_error,
-                 variance=None, bias=True):
+                 variance=None, bias=True, n_components=None):
         super(ParametricShapePCRRegression, self).__init__(
             shape_model_cls=shape_model_cls)
 
         self._regressor_cls = partial(PCRRegression,
-                                      variance=variance, bias=bias)
+                                      variance=variance, bias=bias,
+                                      n_components=n_components)
         self.patch_shape = patch_shape
         self.patch_features = patch_features
         self.n_iterations = n_iterations
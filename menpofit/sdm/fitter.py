@@ -133,6 +133,20 @@ class SupervisedDescentFitter(MultiScaleNonParametricFitter):
         incremental fashion on image batches of size equal to the provided
         value. If ``None``, then the training is performed directly on the
         all the images.
+    features_path : `str` or ``None``, optional
+        If provided, then the training features of each cascade are written to
+        a memory-mapped ``.npy`` scratch file at this path, instead of being
+        stacked in memory, and the regressors are trained on chunks of the
+        file. This bounds the memory required for training with many images
+        and perturbations. The file is deleted after each cascade.
+    chunk_size : `int`, optional
+        The number of training samples per chunk, when `features_path` is
+        provided.
+    n_jobs : `int` or ``None``, optional
+        The number of processes that the training images are sharded across
+        when extracting the patch features. If ``None``, then the number of
+        CPUs is used. Note that with more than one process, the
+        `patch_features` must be picklable.
     verbose : `bool`, optional
         If ``True``, then the progress of the training will be printed.
 
@@ -152,7 +166,8 @@ class SupervisedDescentFitter(MultiScaleNonParametricFitter):
                  patch_shape=(17, 17), scales=(0.5, 1.0), n_iterations=3,
                  n_perturbations=30,
                  perturb_from_gt_bounding_box=noisy_shape_from_bounding_box,
-                 batch_size=None, verbose=False):
+                 batch_size=None, features_path=None, chunk_size=1024,
+                 n_jobs=1, verbose=False):
         if batch_size is not None:
             raise NotImplementedError('Training an SDM with a batch size '
                                       '(incrementally) is not implemented yet.')
@@ -178,6 +193,9 @@ class SupervisedDescentFitter(MultiScaleNonParametricFitter):
         self.n_perturbations = n_perturbations
         self.n_iterations = checks.check_max_iters(n_iterations, n_scales)
         self._perturb_from_gt_bounding_box = perturb_from_gt_bounding_box
+        self.features_path = features_path
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
 
         # Set up algorithms
         self._setup_algorithms()
@@ -330,11 +348,15 @@ class SupervisedDescentFitter(MultiScaleNonParametricFitter):
             if not increment:
                 current_shapes = self.algorithms[j].train(
                     scaled_images, scaled_shapes, current_shapes,
-                    prefix=scale_prefix, verbose=verbose)
+                    prefix=scale_prefix, verbose=verbose,
+                    features_path=self.features_path,
+                    chunk_size=self.chunk_size, n_jobs=self.n_jobs)
             else:
                 current_shapes = self.algorithms[j].increment(
                     scaled_images, scaled_shapes, current_shapes,
-                    prefix=scale_prefix, verbose=verbose)
+                    prefix=scale_prefix, verbose=verbose,
+                    features_path=self.features_path,
+                    chunk_size=self.chunk_size, n_jobs=self.n_jobs)
 
             # Scale the current shape estimations for the next level. This
             # doesn't have to be done for the last scale. The only thing we need
@@ -541,6 +563,20 @@ class SDM(SupervisedDescentFitter):
         incremental fashion on image batches of size equal to the provided
         value. If ``None``, then the training is performed directly on the
         all the images.
+    features_path : `str` or ``None``, optional
+        If provided, then the training features of each cascade are written to
+        a memory-mapped ``.npy`` scratch file at this path, instead of being
+        stacked in memory, and the regressors are trained on chunks of the
+        file. This bounds the memory required for training with many images
+        and perturbations. The file is deleted after each cascade.
+    chunk_size : `int`, optional
+        The number of training samples per chunk, when `features_path` is
+        provided.
+    n_jobs : `int` or ``None``, optional
+        The number of processes that the training images are sharded across
+        when extracting the patch features. If ``None``, then the number of
+        CPUs is used. Note that with more than one process, the
+        `patch_features` must be picklable.
     verbose : `bool`, optional
         If ``True``, then the progress of the training will be printed.
 
@@ -555,7 +591,8 @@ class SDM(SupervisedDescentFitter):
                  patch_features=no_op, patch_shape=(17, 17), scales=(0.5, 1.0),
                  n_iterations=3, n_perturbations=30,
                  perturb_from_gt_bounding_box=noisy_shape_from_bounding_box,
-                 batch_size=None, verbose=False):
+                 batch_size=None, features_path=None, chunk_size=1024,
+                 n_jobs=1, verbose=False):
         super(SDM, self).__init__(
                 images, group=group,
                 bounding_box_group_glob=bounding_box_group_glob,
@@ -566,7 +603,8 @@ class SDM(SupervisedDescentFitter):
                 diagonal=diagonal, scales=scales, n_iterations=n_iterations,
                 n_perturbations=n_perturbations,
                 perturb_from_gt_bounding_box=perturb_from_gt_bounding_box,
-                batch_size=batch_size, verbose=verbose)
+                batch_size=batch_size, features_path=features_path,
+                chunk_size=chunk_size, n_jobs=n_jobs, verbose=verbose)
 
 
 class RegularizedSDM(SupervisedDescentFitter):
@@ -633,6 +671,20 @@ class RegularizedSDM(SupervisedDescentFitter):
         incremental fashion on image batches of size equal to the provided
         value. If ``None``, then the training is performed directly on the
         all the images.
+    features_path : `str` or ``None``, optional
+        If provided, then the training features of each cascade are written to
+        a memory-mapped ``.npy`` scratch file at this path, instead of being
+        stacked in memory, and the regressors are trained on chunks of the
+        file. This bounds the memory required for training with many images
+        and perturbations. The file is deleted after each cascade.
+    chunk_size : `int`, optional
+        The number of training samples per chunk, when `features_path` is
+        provided.
+    n_jobs : `int` or ``None``, optional
+        The number of processes that the training images are sharded across
+        when extracting the patch features. If ``None``, then the number of
+        CPUs is used. Note that with more than one process, the
+        `patch_features` must be picklable.
     verbose : `bool`, optional
         If ``True``, then the progress of the training will be printed.
 
@@ -648,7 +700,8 @@ class RegularizedSDM(SupervisedDescentFitter):
                  patch_shape=(17, 17), scales=(0.5, 1.0), n_iterations=6,
                  n_perturbations=30,
                  perturb_from_gt_bounding_box=noisy_shape_from_bounding_box,
-                 batch_size=None, verbose=False):
+                 batch_size=None, features_path=None, chunk_size=1024,
+                 n_jobs=1, verbose=False):
         super(RegularizedSDM, self).__init__(
             images, group=group,
             bounding_box_group_glob=bounding_box_group_glob,
@@ -658,4 +711,5 @@ class RegularizedSDM(SupervisedDescentFitter):
             patch_shape=patch_shape, diagonal=diagonal, scales=scales,
             n_iterations=n_iterations, n_perturbations=n_perturbations,
             perturb_from_gt_bounding_box=perturb_from_gt_bounding_box,
-            batch_size=batch_size, verbose=verbose)
+            batch_size=batch_size, features_path=features_path,
+            chunk_size=chunk_size, n_jobs=n_jobs, verbose=verbose)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import numpy as np
+from numpy.testing import assert_array_equal
+from menpo.image import Image
+from menpo.shape import PointCloud
+from menpo.feature import no_op
+
+from menpofit.sdm import register_batch_patch_feature, is_batch_patch_feature
+from menpofit.sdm.algorithm.base import (features_per_image,
+                                         features_per_shapes,
+                                         features_per_patch)
+
+
+rng = np.random.RandomState(0)
+images = [Image(rng.uniform(size=(1, 60, 60))) for _ in range(5)]
+shapes = [[PointCloud(rng.uniform(10, 50, (4, 2))) for _ in range(3)]
+          for _ in range(5)]
+
+
+def features_loop(image, shape):
+    # reference implementation, one feature call per patch
+    patches = image.extract_patches(shape, patch_shape=(7, 7),
+                                    as_single_array=True)
+    return np.hstack([no_op(p[0]).ravel() for p in patches])
+
+
+expected = np.vstack([features_loop(i, s)
+                      for i, i_shapes in zip(images, shapes)
+                      for s in i_shapes])
+
+
+def test_features_per_image():
+    assert_array_equal(features_per_image(images, shapes, (7, 7), no_op),
+                       expected)
+
+
+def test_features_per_image_n_jobs():
+    features = features_per_image(images, shapes, (7, 7), no_op, n_jobs=2)
+    assert_array_equal(features, expected)
+
+
+def test_features_per_image_features_path():
+    features_path = os.path.join(tempfile.mkdtemp(), 'features.npy')
+    for n_jobs in [1, 2]:
+        features = features_per_image(images, shapes, (7, 7), no_op,
+                                      features_path=features_path,
+                                      n_jobs=n_jobs)
+        assert_array_equal(features, expected)
+        del features
+        os.remove(features_path)
+
+
+def per_patch_no_op(pixels):
+    return pixels.copy()
+
+
+def test_batch_patch_features():
+    assert is_batch_patch_feature(no_op)
+    assert not is_batch_patch_feature(per_patch_no_op)
+    for s in shapes[0]:
+        assert_array_equal(features_per_patch(images[0], s, (7, 7), no_op),
+                           features_per_patch(images[0], s, (7, 7),
+                                              per_patch_no_op))
+    assert_array_equal(features_per_shapes(images[0], shapes[0], (7, 7),
+                                           per_patch_no_op),
+                       expected[:3])
+
+    def batch_square(pixels):
+        return pixels ** 2
+    register_batch_patch_feature(batch_square)
+    assert is_batch_patch_feature(batch_square)
+    assert_array_equal(features_per_shapes(images[0], shapes[0], (7, 7),
+                                           batch_square),
+                       expected[:3] ** 2)
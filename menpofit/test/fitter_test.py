@@ -0,0 +1,67 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from menpo.feature import no_op
+from menpo.image import Image
+from menpo.shape import PointCloud
+from menpofit.fitter import MultiScaleNonParametricFitter, ResponseMapImage
+
+
+shape = PointCloud(np.array([[10., 12.], [20.5, 30.], [31., 18.], [15., 40.]]))
+
+
+def prepare_both(scales):
+    fitter = MultiScaleNonParametricFitter(
+        scales=scales, reference_shape=shape,
+        holistic_features=[no_op] * len(scales),
+        algorithms=[None] * len(scales))
+    rng = np.random.RandomState(0)
+    image = Image(rng.rand(3, 48, 56))
+    image.path = None
+    image.rspmap_data = rng.rand(1, shape.n_points, 48, 56)
+    return (fitter._prepare_image(image, shape, gt_shape=shape),
+            fitter._prepare_response_map(image, shape, gt_shape=shape))
+
+
+def test_prepare_response_map_matches_prepare_image():
+    pixels, pixel_free = prepare_both((0.5, 1))
+    for im, rm_im in zip(pixels[0], pixel_free[0]):
+        assert isinstance(rm_im, ResponseMapImage)
+        assert rm_im.shape == im.shape
+        assert rm_im.rspmap_data is im.rspmap_data
+    for i in range(1, 3):
+        for s, rm_s in zip(pixels[i], pixel_free[i]):
+            assert_allclose(rm_s.points, s.points)
+    for i in range(3, 5):
+        for t, rm_t in zip(pixels[i], pixel_free[i]):
+            # the pixel-free transforms are exact, the image ones are
+            # estimated (off-diagonal terms of ~1e-16)
+            assert_allclose(rm_t.h_matrix, t.h_matrix, atol=1e-10)
+
+
+class FailingBatchAlgorithm(object):
+    # algorithm that fails to fit all the images of a batch
+    def __init__(self):
+        self.n_batches = 0
+
+    def run_batch(self, images, initial_shapes, **kwargs):
+        self.n_batches += 1
+        return [None] * len(images)
+
+
+def test_fit_batch_from_shapes_stops_when_all_images_fail():
+    algorithms = [FailingBatchAlgorithm(), FailingBatchAlgorithm()]
+    fitter = MultiScaleNonParametricFitter(
+        scales=(0.5, 1), reference_shape=shape,
+        holistic_features=[no_op] * 2, algorithms=algorithms)
+    rng = np.random.RandomState(0)
+    images = []
+    for _ in range(2):
+        image = Image(rng.rand(3, 48, 56))
+        image.path = None
+        image.rspmap_data = rng.rand(1, shape.n_points, 48, 56)
+        images.append(image)
+    results = fitter.fit_batch_from_shapes(images, [shape] * 2,
+                                           response_map_only=True)
+    assert results == [None, None]
+    assert algorithms[0].n_batches == 1
+    assert algorithms[1].n_batches == 0
@@ -0,0 +1,58 @@
+import pickle
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from menpo.shape import PointCloud
+from menpofit.result import (CompactResult, NonParametricIterativeResult,
+                             Result)
+
+
+rng = np.random.RandomState(0)
+gt_shape = PointCloud(rng.uniform(0, 100, (68, 2)))
+initial_shape = PointCloud(gt_shape.points + rng.normal(0, 5, (68, 2)))
+shapes = [PointCloud(gt_shape.points + rng.normal(0, 5. / (i + 2), (68, 2)))
+          for i in range(4)]
+result = NonParametricIterativeResult(shapes, initial_shape=initial_shape,
+                                      gt_shape=gt_shape, costs=[4., 3., 2., 1.])
+
+
+def test_compact_result_init_from_result():
+    compact = CompactResult.init_from_result(result)
+    assert not compact.is_iterative
+    assert compact.shapes is None
+    assert compact.image is None
+    assert compact.n_iters == result.n_iters
+    assert_allclose(compact.costs, result.costs)
+    # the final, initial and ground truth shapes are kept at full precision
+    assert_array_equal(compact.final_shape.points, result.final_shape.points)
+    assert_array_equal(compact.initial_shape.points,
+                       result.initial_shape.points)
+    assert_array_equal(compact.gt_shape.points, result.gt_shape.points)
+    assert compact.final_error() == result.final_error()
+    assert compact.initial_error() == result.initial_error()
+    assert not hasattr(compact, '__dict__')
+
+
+def test_compact_result_keep_shapes():
+    compact = CompactResult.init_from_result(result, keep_shapes=True)
+    assert compact.shape_array.shape == (len(result.shapes), 68, 2)
+    assert compact.shape_array.dtype == np.float32
+    for s, r in zip(compact.shapes, result.shapes):
+        assert_allclose(s.points, r.points, rtol=1e-6)
+
+
+def test_compact_result_to_full_result():
+    full = CompactResult.init_from_result(result,
+                                          keep_shapes=True).to_full_result()
+    assert isinstance(full, NonParametricIterativeResult)
+    assert full.n_iters == result.n_iters
+    assert_array_equal(full.final_shape.points, result.final_shape.points)
+    assert_allclose(full.errors(), result.errors(), rtol=1e-5)
+    final_only = CompactResult.init_from_result(result).to_full_result()
+    assert type(final_only) is Result
+
+
+def test_compact_result_pickle():
+    compact = CompactResult(shapes[-1].points, gt_shape=gt_shape)
+    loaded = pickle.loads(pickle.dumps(compact, protocol=2))
+    assert_allclose(loaded.final_shape.points, compact.final_shape.points)
+    assert loaded.initial_shape is None
@@ -2,6 +2,8 @@ import tensorflow as tf
 from menpofit.visualize import plot_cumulative_error_distribution
 from menpofit.error import compute_cumulative_error
 from scipy.integrate import simps
+from scipy.ndimage import zoom
+import matplotlib.pyplot as plt
 from menpo_functions import load_menpo_image_list, load_bb_dictionary
 from logging_functions import *
 from data_loading_functions import *
@@ -76,7 +78,7 @@ def evaluate_heatmap_fusion_network(model_path, img_path, test_data, batch_size=
 
         print ('\nnum batches: ' + str(num_batches_reminder))
 
-        err = []
+        err = np.zeros(len(test_menpo_img_list))
         for j in range(num_batches):
             print ('batch %d / %d ...' % (j + 1, num_batches_reminder))
             batch_inds = img_inds[j * batch_size:(j + 1) * batch_size]
@@ -92,7 +94,7 @@ def evaluate_heatmap_fusion_network(model_path, img_path, test_data, batch_size=
 
             batch_err = session.run(
                 model.nme_per_image, {model.lms: batch_landmarks_gt, model.pred_lms: batch_pred_landmarks})
-            err = np.hstack((err, batch_err))
+            err[batch_inds] = batch_err
 
         if reminder > 0:
             print ('batch %d / %d ...' % (j + 2, num_batches_reminder))
@@ -109,7 +111,7 @@ def evaluate_heatmap_fusion_network(model_path, img_path, test_data, batch_size=
 
             batch_err = session.run(
                 model.nme_per_image, {model.lms: batch_landmarks_gt, model.pred_lms: batch_pred_landmarks})
-            err = np.hstack((err, batch_err))
+            err[reminder_inds] = batch_err
 
         print ('\ndone!')
         print ('run time: ' + str(time() - t))
@@ -170,7 +172,7 @@ def evaluate_heatmap_primary_network(model_path, img_path, test_data, batch_size
 
         print ('\nnum batches: ' + str(num_batches_reminder))
 
-        err = []
+        err = np.zeros(len(test_menpo_img_list))
         for j in range(num_batches):
             print ('batch %d / %d ...' % (j + 1, num_batches_reminder))
             batch_inds = img_inds[j * batch_size:(j + 1) * batch_size]
@@ -189,7 +191,7 @@ def evaluate_heatmap_primary_network(model_path, img_path, test_data, batch_size
 
             batch_err = session.run(
                 model.nme_per_image, {model.lms_small: batch_landmarks_gt, model.pred_lms_small: batch_pred_landmarks})
-            err = np.hstack((err, batch_err))
+            err[batch_inds] = batch_err
 
         if reminder > 0:
             print ('batch %d / %d ...' % (j + 2, num_batches_reminder))
@@ -209,7 +211,7 @@ def evaluate_heatmap_primary_network(model_path, img_path, test_data, batch_size
 
             batch_err = session.run(
                 model.nme_per_image, {model.lms_small: batch_landmarks_gt, model.pred_lms_small: batch_pred_landmarks})
-            err = np.hstack((err, batch_err))
+            err[reminder_inds] = batch_err
 
         print ('\ndone!')
         print ('run time: ' + str(time() - t))
@@ -44,6 +44,8 @@ class DeepHeatmapsModel(object):
 
         self.compute_nme = True  # compute normalized mean error
 
+        self.shuffle_seed = 0  # random seed for shuffling image indices of each epoch
+
         self.config = tf.ConfigProto()
         self.config.gpu_options.allow_growth = True
 
@@ -175,8 +177,7 @@ class DeepHeatmapsModel(object):
             else:
                 self.val_inds = None
 
-            self.epoch_inds_shuffle = train_val_shuffle_inds_per_epoch(
-                self.val_inds, self.train_inds, train_iter, batch_size, save_log_path)
+            train_val_shuffle_seed_log(self.val_inds, self.train_inds, self.shuffle_seed, save_log_path)
 
     def add_placeholders(self):
 
@@ -612,7 +613,7 @@ class DeepHeatmapsModel(object):
             num_train_images = len(self.img_menpo_list)
             batches_in_epoch = int(float(num_train_images) / float(self.batch_size))
             epoch = int(resume_step / batches_in_epoch)
-            img_inds = self.epoch_inds_shuffle[epoch, :]
+            img_inds = epoch_shuffle_inds(num_train_images, epoch, self.shuffle_seed)
             p_texture = self.p_texture
             p_geom = self.p_geom
             artistic_reload = False
@@ -640,7 +641,7 @@ class DeepHeatmapsModel(object):
 
                 if step > resume_step and j == 0:  # if we finished an epoch and this isn't the first step
                     epoch += 1
-                    img_inds = self.epoch_inds_shuffle[epoch, :]  # get next shuffled image inds
+                    img_inds = epoch_shuffle_inds(num_train_images, epoch, self.shuffle_seed)  # next epoch inds
                     artistic_reload = True
                     log_valid = True
                     log_valid_images = True
@@ -3,8 +3,10 @@ import os
 import numpy as np
 from menpo.shape import PointCloud
 from menpofit.clm import GradientDescentCLMFitter
+from menpofit.fitter import ResponseMapImage
 import pickle
 import math
+import threading
 import rspimage
 
 jaw_line_inds = np.arange(0, 17)
@@ -15,6 +17,11 @@ left_brow_inds = np.arange(17, 22)
 right_brow_inds = np.arange(22, 27)
 mouth_inds = np.arange(48, 68)
 
+# clm fitters are not modified by fitting, so one fitter per model (and early termination tolerances) is shared by all
+# calls (and threads)
+clm_fitters = {}
+clm_fitters_lock = threading.Lock()
+
 
 def sigmoid(x, rate, offset):
     return 1 / (1 + math.exp(-rate * (x - offset)))
@@ -170,8 +177,21 @@ def feature_based_pdm_corr(lms_init, models_dir, train_type='basic', patches=Non
     return new_lms
 
 
-def clm_correct(clm_model_path, image, map, lms_init):
-    """ tune landmarks using clm (constrained local model)"""
+def load_clm_fitter(clm_model_path, landmark_tol=None, stop_tol=None):
+    """ load clm (constrained local model) and create its fitter. fitters are cached per model path and early
+    termination tolerances"""
+
+    key = (clm_model_path, landmark_tol, stop_tol)
+    with clm_fitters_lock:
+        if key not in clm_fitters:
+            clm_fitters[key] = create_clm_fitter(clm_model_path, landmark_tol=landmark_tol, stop_tol=stop_tol)
+        return clm_fitters[key]
+
+
+def create_clm_fitter(clm_model_path, landmark_tol=None, stop_tol=None):
+    """ load clm (constrained local model) from disk and create its fitter. adaptive early termination is opt-in:
+    landmarks that move less than landmark_tol pixels are frozen, and the fit stops when the confidence-weighted
+    landmark update is less than stop_tol pixels (None: disabled)"""
 
     filehandler = open(os.path.join(clm_model_path), "rb")
     try:
@@ -193,12 +213,39 @@ def clm_correct(clm_model_path, image, map, lms_init):
     part_model.opt['ratio1'] = 0.12
     part_model.opt['ratio2'] = 0.08
     part_model.opt['smooth'] = True
+    part_model.opt['landmark_tol'] = landmark_tol
+    part_model.opt['stop_tol'] = stop_tol
+
+    return GradientDescentCLMFitter(part_model, n_shape=30)
+
 
-    fitter = GradientDescentCLMFitter(part_model, n_shape=30)
+def clm_correct(clm_model_path, image, map, lms_init, landmark_tol=None, stop_tol=None):
+    """ tune landmarks using clm (constrained local model). see create_clm_fitter for the early termination
+    tolerances"""
 
-    image.rspmap_data = np.swapaxes(np.swapaxes(map, 1, 3), 2, 3)
+    fitter = load_clm_fitter(clm_model_path, landmark_tol=landmark_tol, stop_tol=stop_tol)
 
-    fr = fitter.fit_from_shape(image=image, initial_shape=PointCloud(lms_init), gt_shape=PointCloud(lms_init))
+    # fcn experts read only the response maps, so image pixels are not needed (and the image is not modified)
+    rsp_image = ResponseMapImage(
+        image.shape, np.swapaxes(np.swapaxes(map, 1, 3), 2, 3), path=getattr(image, 'path', None))
+    fr = fitter.fit_from_shape(image=rsp_image, initial_shape=PointCloud(lms_init), gt_shape=PointCloud(lms_init),
+                               response_map_only=True, compact=True)
     w_pdm_clm = fr.final_shape.points
 
     return w_pdm_clm
+
+
+def clm_correct_batch(clm_model_path, images, maps, lms_inits, landmark_tol=None, stop_tol=None):
+    """ tune landmarks of a batch of images using clm, fitting all images in lockstep. landmarks of images that
+    can't be fitted are returned as is. see create_clm_fitter for the early termination tolerances"""
+
+    fitter = load_clm_fitter(clm_model_path, landmark_tol=landmark_tol, stop_tol=stop_tol)
+
+    rsp_images = [ResponseMapImage(image.shape, np.swapaxes(np.swapaxes(map[None], 1, 3), 2, 3),
+                                   path=getattr(image, 'path', None)) for image, map in zip(images, maps)]
+
+    initial_shapes = [PointCloud(lms_init) for lms_init in lms_inits]
+    frs = fitter.fit_batch_from_shapes(images=rsp_images, initial_shapes=initial_shapes, gt_shapes=initial_shapes,
+                                       response_map_only=True, compact=True)
+
+    return [lms_init.copy() if fr is None else fr.final_shape.points for fr, lms_init in zip(frs, lms_inits)]
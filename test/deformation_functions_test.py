@@ -0,0 +1,129 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+from deformation_functions import (check_deformation_spatial_errors, check_deformation_spatial_errors_batch,
+                                   check_duplicate_points, check_duplicate_points_batch, deform_eyes_batch,
+                                   deform_face_geometric_style_batch, deform_mouth_batch, deform_nose_batch,
+                                   deform_part_batch, deform_scale_face_batch)
+
+
+nose_inds = np.arange(27, 36)
+mouth_inds = np.arange(48, 68)
+right_eye_inds = np.hstack((np.arange(22, 27), np.arange(42, 48)))
+left_eye_inds = np.hstack((np.arange(17, 22), np.arange(36, 42)))
+
+
+def ellipse(center, radius, angles):
+    return np.stack([center[0] + radius[0] * np.sin(angles), center[1] + radius[1] * np.cos(angles)], 1)
+
+
+def synthetic_faces(rng, num_faces):
+    # (num_faces, 68, 2) [y, x] landmarks in the ibug layout, randomly scaled, shifted and jittered
+    angles = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+    inner_angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    eye_angles = np.linspace(np.pi, 3 * np.pi, 6, endpoint=False)
+    face = np.vstack([
+        ellipse((110, 128), (90, 60), np.linspace(np.pi, 0, 17)),  # jaw
+        np.stack([84 - 4 * np.sin(np.linspace(0, np.pi, 5)), np.linspace(80, 116, 5)], 1),  # left brow
+        np.stack([84 - 4 * np.sin(np.linspace(0, np.pi, 5)), np.linspace(140, 176, 5)], 1),  # right brow
+        np.stack([np.linspace(98, 134, 4), 128 * np.ones(4)], 1),  # nose bridge
+        np.stack([138 + 4 * np.sin(np.linspace(0, np.pi, 5)), np.linspace(114, 142, 5)], 1),  # nose bottom
+        ellipse((100, 98), (5, 12), eye_angles),  # left eye
+        ellipse((100, 158), (5, 12), eye_angles),  # right eye
+        ellipse((170, 128), (11, 26), angles + np.pi),  # outer lips
+        ellipse((170, 128), (5, 16), inner_angles + np.pi)])  # inner lips
+    scale = rng.uniform(0.85, 1.1, (num_faces, 1, 1))
+    shift = rng.uniform(-8, 8, (num_faces, 1, 2))
+    return (face - 128) * scale + 128 + shift + rng.normal(0, 0.5, (num_faces, 68, 2))
+
+
+def test_check_deformation_errors_batch_matches_scalar():
+    rng = np.random.RandomState(0)
+    lms = synthetic_faces(rng, 40)
+    for part_inds in [mouth_inds, nose_inds, right_eye_inds, left_eye_inds]:
+        lms_def = deform_part_batch(lms, part_inds, scale_y=rng.uniform(0.5, 2, 40), scale_x=rng.uniform(0.5, 2, 40),
+                                    shift_ver=rng.normal(0, 20, 40), shift_horiz=rng.normal(0, 20, 40))
+        for pad in [0, 5]:
+            error = check_deformation_spatial_errors_batch(lms_def, part_inds, pad=pad)
+            assert_array_equal(error, [check_deformation_spatial_errors(l, part_inds, pad=pad) for l in lms_def])
+            assert np.any(error) and not np.all(error)
+
+    lms[::2, 1] = np.floor(lms[::2, 0]) + 0.5  # second landmark on the pixel of the first
+    assert_array_equal(check_duplicate_points_batch(lms), [check_duplicate_points(l) for l in lms])
+    assert_array_equal(check_duplicate_points_batch(lms), np.arange(40) % 2 == 0)
+
+
+def check_part_deformation_batch(deform_batch, part_inds_list, pad, corrupt_ind):
+    # deformed parts pass their spatial checks, and rejected deformations leave their part unchanged. faces with a
+    # foreign landmark (corrupt_ind) inside the box of the first part make sure that some deformations are rejected
+    rng = np.random.RandomState(1)
+    lms = synthetic_faces(rng, 40)
+    lms[1::2, corrupt_ind] = np.mean(lms[1::2][:, part_inds_list[0]], 1)
+    other_inds = np.setdiff1d(np.arange(68), np.hstack(part_inds_list))
+    num_rejected = 0
+    for p_scale, p_shift in [(1, 0), (0, 1), (1, 1)]:
+        np.random.seed(2)
+        lms_def, rejected = deform_batch(lms, p_scale=p_scale, p_shift=p_shift, pad=pad)
+        assert_array_equal(lms_def[:, other_inds], lms[:, other_inds])
+        num_rejected += np.sum(rejected)
+
+        part_deformed = np.stack([np.any(lms_def[:, part_inds] != lms[:, part_inds], axis=(1, 2))
+                                  for part_inds in part_inds_list], 1)
+        assert np.any(part_deformed)
+        for i, part in zip(*np.nonzero(part_deformed)):
+            assert not check_deformation_spatial_errors(lms_def[i], part_inds_list[part], pad=pad)
+        if p_scale == 0 or p_shift == 0:  # a single accept / reject decision per part
+            assert not np.any(np.all(part_deformed, axis=1) & rejected)
+    assert num_rejected > 0
+
+
+def test_deform_mouth_batch():
+    check_part_deformation_batch(deform_mouth_batch, [mouth_inds], 5, 0)
+
+
+def test_deform_nose_batch():
+    # the upper and lower nose are checked separately
+    check_part_deformation_batch(deform_nose_batch, [nose_inds[4:], nose_inds[:4]], 0, 0)
+
+
+def test_deform_eyes_batch():
+    check_part_deformation_batch(deform_eyes_batch, [right_eye_inds, left_eye_inds], 10, 60)
+
+
+def test_deform_scale_face_batch():
+    rng = np.random.RandomState(3)
+    lms = synthetic_faces(rng, 40)
+    lms[1::2] = (lms[1::2] - 128) * 2.5 + 128  # faces too large to be scaled up inside the image
+    np.random.seed(4)
+    lms_def, rejected = deform_scale_face_batch(lms, p_scale=1, pad=0)
+    assert np.any(rejected)
+    assert_array_equal(lms_def[rejected], lms[rejected])
+    accepted = np.nonzero(~rejected)[0]
+    assert len(accepted) > 0
+    for i in accepted:
+        assert not check_duplicate_points(lms_def[i])
+        assert np.all(lms_def[i] >= 0) and np.all(lms_def[i] < 256)
+
+
+def test_deform_face_geometric_style_batch():
+    rng = np.random.RandomState(5)
+    lms = synthetic_faces(rng, 40)
+    lms[1::2, 60] = np.mean(lms[1::2][:, right_eye_inds], 1)  # some eye deformations are rejected
+    p_scale = rng.rand(40) * 2
+    p_shift = rng.rand(40) * 2
+    np.random.seed(6)
+    lms_def, rejected = deform_face_geometric_style_batch(lms, p_scale=p_scale, p_shift=p_shift,
+                                                          return_rejected=True)
+    assert np.any(rejected)
+    np.random.seed(6)
+    assert_array_equal(deform_face_geometric_style_batch(lms, p_scale=p_scale, p_shift=p_shift), lms_def)
+
+    # the same deformations, one part after the other, with the rejected faces of each part
+    np.random.seed(6)
+    lms_part, rejected_parts = deform_scale_face_batch(lms.copy(), p_scale=p_scale, pad=0)
+    for deform_batch in [deform_nose_batch, deform_mouth_batch, deform_eyes_batch]:
+        lms_part, rejected_part = deform_batch(lms_part, p_scale=p_scale, p_shift=p_shift, pad=0)
+        rejected_parts |= rejected_part
+    assert_array_equal(lms_part, lms_def)
+    assert_array_equal(rejected_parts, rejected)
+    # faces that are not affected by any deformation are unchanged
+    assert_array_equal(lms_def[(p_scale <= 0.5) & (p_shift <= 0.5)], lms[(p_scale <= 0.5) & (p_shift <= 0.5)])
@@ -25,6 +25,7 @@ flags.DEFINE_integer('sample_grid', 4, 'number of training images in sample')
 flags.DEFINE_bool('sample_to_log', True, 'samples will be saved to tensorboard log')
 flags.DEFINE_integer('valid_size', 20, 'number of validation images to run')
 flags.DEFINE_integer('log_valid_every', 10, 'evaluate on valid set every X epochs')
+flags.DEFINE_integer('trace_every', 0, 'save chrome trace of a training step to log every X steps (0: never)')
 flags.DEFINE_integer('debug_data_size', 20, 'subset data size to test in debug mode')
 flags.DEFINE_bool('debug', False, 'run in debug mode - use subset of the data')
 
@@ -104,7 +105,8 @@ def main(_):
         log_valid_every=FLAGS.log_valid_every, train_crop_dir=FLAGS.train_crop_dir, img_dir_ns=FLAGS.img_dir_ns,
         print_every=FLAGS.print_every, save_every=FLAGS.save_every, sample_every=FLAGS.sample_every,
         sample_grid=FLAGS.sample_grid, sample_to_log=FLAGS.sample_to_log, debug_data_size=FLAGS.debug_data_size,
-        debug=FLAGS.debug, use_epoch_data=FLAGS.use_epoch_data, epoch_data_dir=FLAGS.epoch_data_dir)
+        debug=FLAGS.debug, use_epoch_data=FLAGS.use_epoch_data, epoch_data_dir=FLAGS.epoch_data_dir,
+        trace_every=FLAGS.trace_every)
 
     model.train()
 